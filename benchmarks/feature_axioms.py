@@ -0,0 +1,97 @@
+"""
+Compare the time to rerank with feature axioms,
+extracting features per document pair or once per document.
+
+Run from the repository root with:
+python -m benchmarks.feature_axioms
+"""
+
+from itertools import combinations
+from random import Random
+from timeit import repeat
+from typing import List, Callable
+
+from grimjack.model import RankedDocument
+from grimjack.model.axiom import FeatureAxiom
+from grimjack.model.axiom.argumentative import (
+    ArgumentCountAxiom, AverageSentenceLengthAxiom, ArgumentQualityAxiom
+)
+from grimjack.model.axiom.testing import (
+    StandInRerankingContext, random_ranking, QUERY
+)
+
+
+class _Uncached:
+    # Extract features on every pairwise call, like before.
+    def cached_feature(self, context, query, document):
+        return self.feature(context, query, document)
+
+
+class _UncachedArgumentCountAxiom(_Uncached, ArgumentCountAxiom):
+    pass
+
+
+class _UncachedAverageSentenceLengthAxiom(
+    _Uncached, AverageSentenceLengthAxiom
+):
+    pass
+
+
+class _UncachedArgumentQualityAxiom(_Uncached, ArgumentQualityAxiom):
+    pass
+
+
+def _uncached_axioms() -> List[FeatureAxiom]:
+    return [
+        _UncachedArgumentCountAxiom(),
+        _UncachedAverageSentenceLengthAxiom(),
+        _UncachedArgumentQualityAxiom(),
+    ]
+
+
+def _cached_axioms() -> List[FeatureAxiom]:
+    return [
+        ArgumentCountAxiom(),
+        AverageSentenceLengthAxiom(),
+        ArgumentQualityAxiom(),
+    ]
+
+
+def _pairwise(
+        axioms: Callable[[], List[FeatureAxiom]],
+        ranking: List[RankedDocument]
+) -> Callable[[], None]:
+    def run() -> None:
+        # New axioms and context, so that no features are cached yet.
+        context = StandInRerankingContext()
+        for axiom in axioms():
+            for document1, document2 in combinations(ranking, 2):
+                axiom.preference(context, QUERY, document1, document2)
+    return run
+
+
+def _matrix(
+        axioms: Callable[[], List[FeatureAxiom]],
+        ranking: List[RankedDocument]
+) -> Callable[[], None]:
+    def run() -> None:
+        context = StandInRerankingContext()
+        for axiom in axioms():
+            axiom.preference_matrix(context, QUERY, ranking)
+    return run
+
+
+def main(size: int = 50, repetitions: int = 5) -> None:
+    ranking = random_ranking(Random(0), size)
+    for name, run in (
+            ("pairwise, uncached", _pairwise(_uncached_axioms, ranking)),
+            ("pairwise, cached", _pairwise(_cached_axioms, ranking)),
+            ("matrix, uncached", _matrix(_uncached_axioms, ranking)),
+            ("matrix, cached", _matrix(_cached_axioms, ranking)),
+    ):
+        seconds = min(repeat(run, number=1, repeat=repetitions))
+        print(f"{name}: {seconds:.3f}s for {size} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,11 @@ from random import Random
 from typing import Optional, Union, Set, List, Dict, Callable
 
 from grimjack import logger
+from grimjack.api.cache import (
+    inspect_result_cache, open_result_cache, compact_result_cache,
+    prune_result_cache, migrate_legacy_caches, close_caches
+)
+from grimjack.api.huggingface import HuggingfaceTransport
 from grimjack.constants import (
     DEFAULT_DOCUMENTS_URL, DEFAULT_TOPICS_URL,
     DEFAULT_HUGGINGFACE_API_TOKEN_PATH, DEFAULT_DEBATER_API_TOKEN_PATH,
@@ -20,6 +25,9 @@ from grimjack.model.axiom.argumentative import (
     ComparativeObjectTermsInArgumentAxiom, AverageSentenceLengthAxiom,
     QueryTermPositionInArgumentAxiom, QueryTermsInArgumentAxiom
 )
+from grimjack.model.axiom.proximity import (
+    AverageSmallestSpanAxiom, SmallestCoveringSpanAxiom
+)
 from grimjack.modules.options import (
     RetrievalModel, RerankerType, Metric, StanceTaggerType, QualityTaggerType,
     Stemmer, QueryExpanderType
@@ -92,6 +100,13 @@ _METRICS: Dict[str, Callable[[], Metric]] = {
 _QUALITY_TAGGER_TYPES: Dict[str, Callable[[], QualityTaggerType]] = {
     "debater": lambda: QualityTaggerType.DEBATER,
     "t0pp": lambda: QualityTaggerType.HUGGINGFACE_T0PP,
+    "roberta-argument": lambda: QualityTaggerType.ROBERTA_ARGUMENT,
+}
+
+_HUGGINGFACE_TRANSPORTS: Dict[str, Callable[[], HuggingfaceTransport]] = {
+    "request": lambda: HuggingfaceTransport.REQUEST,
+    "socket": lambda: HuggingfaceTransport.SOCKET,
+    "local": lambda: HuggingfaceTransport.LOCAL,
 }
 
 _STANCE_TAGGER_TYPES: Dict[str, Callable[[], StanceTaggerType]] = {
@@ -100,6 +115,7 @@ _STANCE_TAGGER_TYPES: Dict[str, Callable[[], StanceTaggerType]] = {
     "debater-sentiment": lambda: StanceTaggerType.DEBATER_SENTIMENT,
     "sentiment": lambda: StanceTaggerType.DEBATER_SENTIMENT,
     "t0pp": lambda: StanceTaggerType.T0PP,
+    "distilroberta-nli": lambda: StanceTaggerType.DISTILROBERTA_NLI,
 }
 
 _AXIOMS: Dict[str, Callable[[], Axiom]] = {
@@ -110,6 +126,8 @@ _AXIOMS: Dict[str, Callable[[], Axiom]] = {
     "CompArg": lambda: ComparativeObjectTermsInArgumentAxiom(),
     "CompPArg": lambda: ComparativeObjectTermPositionInArgumentAxiom(),
     "ArgQ": lambda: ArgumentQualityAxiom(),
+    "QTSpan": lambda: AverageSmallestSpanAxiom(),
+    "QTCover": lambda: SmallestCoveringSpanAxiom(),
 }
 
 
@@ -222,6 +240,37 @@ def _prepare_parser(parser: ArgumentParser) -> ArgumentParser:
         type=str,
         default=None,
     )
+    parser.add_argument(
+        "--huggingface-transport",
+        dest="huggingface_transport",
+        type=str,
+        choices=_HUGGINGFACE_TRANSPORTS.keys(),
+        default="request",
+    )
+    parser.add_argument(
+        "--huggingface-in-flight",
+        dest="huggingface_in_flight",
+        type=positive(int),
+        default=8,
+    )
+    parser.add_argument(
+        "--huggingface-rate-limit",
+        dest="huggingface_rate_limit",
+        type=positive(float),
+        default=None,
+    )
+    parser.add_argument(
+        "--huggingface-batch-size",
+        dest="huggingface_batch_size",
+        type=positive(int),
+        default=16,
+    )
+    parser.add_argument(
+        "--torch-threads",
+        dest="torch_threads",
+        type=positive(int),
+        default=None,
+    )
     parser.add_argument(
         "--reranker", "--rerank", "-r",
         dest="rerankers",
@@ -288,6 +337,24 @@ def _prepare_parser(parser: ArgumentParser) -> ArgumentParser:
         action="store_const",
         const={}
     )
+    parser.add_argument(
+        "--targer-batch-length",
+        dest="targer_max_batch_length",
+        type=positive(int),
+        default=None,
+    )
+    parser.add_argument(
+        "--no-targer-batch",
+        dest="targer_max_batch_length",
+        action="store_const",
+        const=None
+    )
+    parser.add_argument(
+        "--targer-rate-limit",
+        dest="targer_rate_limit",
+        type=positive(float),
+        default=None,
+    )
     parser.add_argument(
         "--ibm-api-token-file",
         dest="debater_api_token",
@@ -300,12 +367,48 @@ def _prepare_parser(parser: ArgumentParser) -> ArgumentParser:
         type=str,
         default=None,
     )
+    parser.add_argument(
+        "--debater-chunk-size",
+        dest="debater_chunk_size",
+        type=positive(int),
+        default=500,
+    )
+    parser.add_argument(
+        "--debater-workers",
+        dest="debater_workers",
+        type=positive(int),
+        default=4,
+    )
+    parser.add_argument(
+        "--debater-rate-limit",
+        dest="debater_rate_limit",
+        type=positive(float),
+        default=None,
+    )
     parser.add_argument(
         "--cache-path",
         dest="cache_path",
         type=Optional[Path],
         default=DEFAULT_CACHE_DIR
     )
+    parser.add_argument(
+        "--cache-size-limit",
+        dest="cache_size_limit",
+        type=positive(float),
+        default=None,
+    )
+    parser.add_argument(
+        "--cache-only",
+        dest="cache_only",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--fallback-quality",
+        dest="fallback_quality",
+        type=float,
+        default=0.5,
+    )
     parser.add_argument(
         "--quality-tagger",
         dest="quality_tagger",
@@ -356,6 +459,12 @@ def _prepare_parser(parser: ArgumentParser) -> ArgumentParser:
         "evaluate-all",
         aliases=["evaluate", "eval"]
     ))
+    _prepare_parser_pretag_all(parsers.add_parser(
+        "pretag-all",
+        aliases=["pretag"]
+    ))
+    _prepare_parser_plan_all(parsers.add_parser("plan"))
+    _prepare_parser_cache(parsers.add_parser("cache"))
 
     return parser
 
@@ -457,6 +566,58 @@ def _prepare_parser_evaluate_all(parser: ArgumentParser):
     )
 
 
+def _prepare_parser_pretag_all(parser: ArgumentParser):
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=positive(int),
+        default=16,
+    )
+
+
+def _prepare_parser_plan_all(_: ArgumentParser):
+    pass
+
+
+def _prepare_parser_cache(parser: ArgumentParser):
+    parser.add_argument(
+        dest="cache_action",
+        type=str,
+        choices=["stats", "compact", "prune", "migrate"],
+    )
+    parser.add_argument(
+        "--namespace",
+        dest="cache_namespace",
+        type=str,
+        default=None,
+    )
+
+
+def _manage_cache(
+        action: str,
+        cache_path: Path,
+        size_limit: Optional[int],
+        namespace: Optional[str],
+):
+    if action == "stats":
+        for name, count in sorted(inspect_result_cache(cache_path).items()):
+            print(f"{name}: {count} results")
+        cache = open_result_cache(cache_path)
+        print(
+            f"Total: {cache.volume() / 2 ** 20:.1f} MiB "
+            f"of {cache.size_limit / 2 ** 20:.1f} MiB"
+        )
+    elif action == "compact":
+        compact_result_cache(cache_path)
+    elif action == "prune":
+        removed = prune_result_cache(cache_path, size_limit, namespace)
+        print(f"Removed {removed} results.")
+    elif action == "migrate":
+        for name, count in migrate_legacy_caches(cache_path).items():
+            print(f"Migrated {count} results for {name}.")
+    close_caches()
+
+
 def _parse_stemmer(stemmer: str) -> Optional[Stemmer]:
     if stemmer is None:
         return None
@@ -546,6 +707,13 @@ def _parse_metric(metric: str) -> Metric:
         raise Exception(f"Unknown metric: {metric}")
 
 
+def _parse_huggingface_transport(transport: str) -> HuggingfaceTransport:
+    if transport in _HUGGINGFACE_TRANSPORTS.keys():
+        return _HUGGINGFACE_TRANSPORTS[transport]()
+    else:
+        raise Exception(f"Unknown Huggingface transport: {transport}")
+
+
 def _parse_quality_tagger(quality_tagger: str) -> QualityTaggerType:
     if quality_tagger in _QUALITY_TAGGER_TYPES.keys():
         return _QUALITY_TAGGER_TYPES[quality_tagger]()
@@ -595,17 +763,48 @@ def main():
     hugging_face_api_token = _parse_api_token(
         args.huggingface_api_token
     )
+    huggingface_transport = _parse_huggingface_transport(
+        args.huggingface_transport
+    )
+    huggingface_in_flight: int = args.huggingface_in_flight
+    huggingface_rate_limit: Optional[float] = args.huggingface_rate_limit
+    huggingface_batch_size: int = args.huggingface_batch_size
+    torch_threads: Optional[int] = args.torch_threads
     targer_api_url: str = args.targer_api_url
     targer_models: Set[str] = set(args.targer_models)
+    targer_max_batch_length: Optional[int] = args.targer_max_batch_length
+    targer_rate_limit: Optional[float] = args.targer_rate_limit
     debater_api_token = _parse_api_token(
         args.debater_api_token
     )
-    if debater_api_token is None:
+    uses_debater = (
+            _parse_quality_tagger(args.quality_tagger) ==
+            QualityTaggerType.DEBATER or
+            _parse_stance_tagger(args.stance_tagger) in [
+                StanceTaggerType.DEBATER_OBJECT,
+                StanceTaggerType.DEBATER_SENTIMENT,
+            ]
+    )
+    if debater_api_token is None and uses_debater and \
+            not args.cache_only and \
+            args.command not in ["pretag-all", "pretag", "cache", "plan"]:
         raise ValueError(
             f"Must specify IBM Debater API token in the command line "
             f"or in '{DEFAULT_DEBATER_API_TOKEN_PATH.relative_to(getcwd())}'."
         )
+    debater_chunk_size: int = args.debater_chunk_size
+    debater_workers: int = args.debater_workers
+    debater_rate_limit: Optional[float] = args.debater_rate_limit
     cache_path: Optional[Path] = args.cache_path
+    cache_only: bool = args.cache_only
+    fallback_quality: float = args.fallback_quality
+    if cache_only and args.command in ["pretag-all", "pretag"]:
+        raise ValueError("Cannot pre-tag arguments in cache-only mode.")
+    cache_size_limit: Optional[int] = (
+        int(args.cache_size_limit * 2 ** 30)
+        if args.cache_size_limit is not None
+        else None
+    )
     quality_tagger: QualityTaggerType = _parse_quality_tagger(
         args.quality_tagger
     )
@@ -623,6 +822,17 @@ def main():
     else:
         raise ValueError("Cannot log quietly and verbosely at the same time.")
 
+    if args.command == "cache":
+        if cache_path is None:
+            raise ValueError("Must specify a cache path.")
+        _manage_cache(
+            args.cache_action,
+            cache_path,
+            cache_size_limit,
+            args.cache_namespace,
+        )
+        return
+
     pipeline = Pipeline(
         documents_source=documents_source,
         topics_source=topics_source,
@@ -632,41 +842,60 @@ def main():
         query_expanders=query_expanders,
         retrieval_model=retrieval_model,
         huggingface_api_token=hugging_face_api_token,
+        huggingface_transport=huggingface_transport,
+        huggingface_in_flight=huggingface_in_flight,
+        huggingface_rate_limit=huggingface_rate_limit,
+        huggingface_batch_size=huggingface_batch_size,
         rerankers=rerankers,
         rerank_hits=rerank_hits,
         axioms=axioms,
         targer_api_url=targer_api_url,
         targer_models=targer_models,
+        targer_max_batch_length=targer_max_batch_length,
+        targer_rate_limit=targer_rate_limit,
         debater_api_token=debater_api_token,
+        debater_chunk_size=debater_chunk_size,
+        debater_workers=debater_workers,
+        debater_rate_limit=debater_rate_limit,
         cache_path=cache_path,
+        cache_size_limit=cache_size_limit,
+        cache_only=cache_only,
+        fallback_quality=fallback_quality,
         quality_tagger=quality_tagger,
         stance_tagger=stance_tagger,
         stance_threshold=stance_threshold,
         num_hits=num_hits,
+        torch_threads=torch_threads,
         random=random,
     )
 
-    if args.command == "search":
-        query: str = args.query
-        pipeline.print_search(query)
-    elif args.command == "search-all":
-        pipeline.print_search_all()
-    elif args.command in ["run-all", "run"]:
-        output_file: Path = args.output_file
-        tag: Optional[str] = args.tag
-        pipeline.run_search_all(output_file, tag)
-    elif args.command in ["evaluate-all", "evaluate", "eval"]:
-        metric: Metric = _parse_metric(args.metric)
-        qrels_source: Union[Path, str] = args.qrels_source
-        depth: int = args.depth
-        if depth > num_hits:
-            raise ValueError(
-                "Cannot evaluate more hits than are being retrieved."
-            )
-        per_query: bool = args.per_query
-        pipeline.evaluate_all(metric, qrels_source, depth, per_query)
-    else:
-        parser.print_help()
+    with pipeline:
+        if args.command == "search":
+            query: str = args.query
+            pipeline.print_search(query)
+        elif args.command == "search-all":
+            pipeline.print_search_all()
+        elif args.command in ["run-all", "run"]:
+            output_file: Path = args.output_file
+            tag: Optional[str] = args.tag
+            pipeline.run_search_all(output_file, tag)
+        elif args.command in ["evaluate-all", "evaluate", "eval"]:
+            metric: Metric = _parse_metric(args.metric)
+            qrels_source: Union[Path, str] = args.qrels_source
+            depth: int = args.depth
+            if depth > num_hits:
+                raise ValueError(
+                    "Cannot evaluate more hits than are being retrieved."
+                )
+            per_query: bool = args.per_query
+            pipeline.evaluate_all(metric, qrels_source, depth, per_query)
+        elif args.command in ["pretag-all", "pretag"]:
+            workers: int = args.workers
+            pipeline.pretag_all(workers)
+        elif args.command == "plan":
+            pipeline.plan_all()
+        else:
+            parser.print_help()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,510 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from hashlib import md5
+from os import getpid
+from pathlib import Path
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from sqlite3 import connect
+from threading import Lock, Event
+from typing import (
+    Iterable, Dict, Any, Mapping, TypeVar, Tuple, Optional, Counter, List,
+    Set, Iterator, Callable
+)
+from zlib import compress, decompress
+
+from diskcache import Cache
+from diskcache.core import DBNAME
+
+_MISSING = object()
+
+K = TypeVar("K")
+
+# Open caches by process ID and directory.
+# Cache handles must not be shared with forked worker processes,
+# so each process opens its own handles.
+_caches: Dict[Tuple[int, Optional[str]], Cache] = {}
+_caches_lock = Lock()
+
+
+def open_cache(directory: Optional[Path], **settings) -> Cache:
+    """
+    Open the cache in the given directory, or reuse the handle
+    that was already opened by this process.
+    If no directory is given, a temporary cache is used.
+    Settings are only applied when the handle is first opened.
+    Shared handles are closed with close_caches().
+    """
+    key = (
+        getpid(),
+        str(directory.absolute()) if directory is not None else None
+    )
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = Cache(key[1], **settings)
+            _caches[key] = cache
+        return cache
+
+
+def close_caches() -> None:
+    """
+    Close all cache handles that were opened by this process.
+    """
+    pid = getpid()
+    with _caches_lock:
+        for key in [key for key in _caches.keys() if key[0] == pid]:
+            _caches.pop(key).close()
+
+
+def get_many(cache: Cache, keys: Mapping[K, str]) -> Dict[K, Any]:
+    """
+    Look up many cache keys in a single transaction.
+    Keys are given as a mapping from items to precomputed cache keys.
+    Returns the values of all items that are found in the cache.
+    """
+    values: Dict[K, Any] = {}
+    with cache.transact():
+        for item, key in keys.items():
+            value = cache.get(key, default=_MISSING)
+            if value is not _MISSING:
+                values[item] = value
+    return values
+
+
+def set_many(
+        cache: Cache,
+        items: Iterable[Tuple[str, Any]],
+        tag: Optional[str] = None,
+) -> None:
+    """
+    Write many key-value pairs to the cache in a single transaction.
+    """
+    with cache.transact():
+        for key, value in items:
+            cache.set(key, value, tag=tag)
+
+
+def md5_hash(text: str) -> str:
+    return md5(text.encode()).hexdigest()
+
+
+# Cap the result cache at 8 GiB by default.
+DEFAULT_RESULT_CACHE_SIZE_LIMIT = 8 * 2 ** 30
+
+
+def open_result_cache(
+        cache_dir: Optional[Path],
+        size_limit: Optional[int] = None,
+) -> Cache:
+    """
+    Open the result cache shared by all external services.
+    Least recently used results are evicted
+    when the cache exceeds its size limit.
+    """
+    settings = {
+        "eviction_policy": "least-recently-used",
+        "tag_index": True,
+    }
+    directory = cache_dir / "results" if cache_dir is not None else None
+    if size_limit is None and (
+            directory is None or not (directory / DBNAME).exists()
+    ):
+        # Otherwise, keep the size limit stored in the cache.
+        size_limit = DEFAULT_RESULT_CACHE_SIZE_LIMIT
+    if size_limit is not None:
+        settings["size_limit"] = size_limit
+    return open_cache(directory, **settings)
+
+
+@dataclass
+class CacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    # Keys that were fetched by a concurrent caller instead.
+    coalesced: int = 0
+
+
+# Statistics of this process by service and model.
+_statistics: Dict[str, CacheStatistics] = {}
+_statistics_lock = Lock()
+
+
+def cache_statistics() -> Dict[str, CacheStatistics]:
+    with _statistics_lock:
+        return dict(_statistics)
+
+
+# In cache-only mode, external services are never called.
+# Cache misses are recorded by service and model instead.
+_cache_only = False
+_misses: Dict[str, Set[str]] = {}
+
+
+def set_cache_only(cache_only: bool) -> None:
+    global _cache_only
+    _cache_only = cache_only
+
+
+def is_cache_only() -> bool:
+    return _cache_only
+
+
+_planning = False
+
+
+@contextmanager
+def planning() -> Iterator[None]:
+    """
+    Switch to cache-only mode to enumerate the requests of a run,
+    without calling external services or running local models.
+    Afterwards, the previous mode is restored and cache misses
+    recorded while planning are discarded.
+    """
+    global _cache_only, _planning
+    cache_only = _cache_only
+    was_planning = _planning
+    misses = cache_misses()
+    _cache_only = True
+    _planning = True
+    try:
+        yield
+    finally:
+        _cache_only = cache_only
+        _planning = was_planning
+        with _statistics_lock:
+            _misses.clear()
+            _misses.update(misses)
+
+
+def is_planning() -> bool:
+    return _planning
+
+
+# Keys whose results are currently being fetched by this process.
+_in_flight: Dict[str, Event] = {}
+_in_flight_lock = Lock()
+
+
+@contextmanager
+def single_flight(keys: Iterable[str]) -> Iterator[Set[str]]:
+    """
+    Claim cache keys for fetching their results,
+    so that concurrent callers don't fetch the same keys twice.
+    Yields the keys claimed by this caller.
+    Keys claimed by other callers are waited for when leaving the context,
+    such that their results can be read from the cache afterwards.
+    """
+    claimed: Dict[str, Event] = {}
+    waiting: List[Event] = []
+    with _in_flight_lock:
+        for key in keys:
+            if key in claimed:
+                continue
+            event = _in_flight.get(key)
+            if event is None:
+                event = Event()
+                _in_flight[key] = event
+                claimed[key] = event
+            else:
+                waiting.append(event)
+    try:
+        yield set(claimed.keys())
+    finally:
+        # Release own keys before waiting, to never wait for each other.
+        with _in_flight_lock:
+            for key in claimed.keys():
+                del _in_flight[key]
+        for event in claimed.values():
+            event.set()
+    for event in waiting:
+        event.wait()
+
+
+def cache_misses() -> Dict[str, Set[str]]:
+    with _statistics_lock:
+        return {
+            namespace: set(keys)
+            for namespace, keys in _misses.items()
+        }
+
+
+@dataclass
+class ResultCache:
+    """
+    Content-addressed cache for the results of an external service's model.
+    Keys are derived from the hashes of the inputs,
+    values are pickled and compressed.
+    """
+    service: str
+    model: str
+    cache_dir: Optional[Path] = None
+    compress_level: int = 6
+
+    _cache: Cache = field(init=False, repr=False)
+
+    @property
+    def namespace(self) -> str:
+        return f"{self.service}/{self.model}"
+
+    @property
+    def statistics(self) -> CacheStatistics:
+        with _statistics_lock:
+            if self.namespace not in _statistics:
+                _statistics[self.namespace] = CacheStatistics()
+            return _statistics[self.namespace]
+
+    def key(self, *inputs: str) -> str:
+        hashes = "-".join(md5_hash(text) for text in inputs)
+        return f"{self.namespace}/{hashes}"
+
+    def record_misses(self, keys: Iterable[str]) -> None:
+        with _statistics_lock:
+            if self.namespace not in _misses:
+                _misses[self.namespace] = set()
+            _misses[self.namespace].update(keys)
+
+    @contextmanager
+    def single_flight(self, keys: Mapping[K, str]) -> Iterator[List[K]]:
+        """
+        Claim the keys of the given items for fetching their results.
+        Yields the items that this caller has to fetch and write.
+        """
+        with single_flight(keys.values()) as claimed:
+            items = [item for item, key in keys.items() if key in claimed]
+            statistics = self.statistics
+            with _statistics_lock:
+                statistics.coalesced += len(keys) - len(items)
+            yield items
+
+    def get_many(self, keys: Mapping[K, str]) -> Dict[K, Any]:
+        data: Dict[K, bytes] = get_many(self._cache, keys)
+        statistics = self.statistics
+        with _statistics_lock:
+            statistics.hits += len(data)
+            statistics.misses += len(keys) - len(data)
+            statistics.bytes_read += sum(len(value) for value in data.values())
+        return {
+            item: loads(decompress(value))
+            for item, value in data.items()
+        }
+
+    def get_or_fetch_many(
+            self,
+            keys: Mapping[K, str],
+            fetch: Callable[[List[K]], None],
+            attempts: int = 3,
+    ) -> Dict[K, Any]:
+        """
+        Look up the results of the given items, and let fetch() write
+        the results of unknown items to the cache.
+        Results that are still missing, e.g., because a concurrent caller
+        failed to fetch them, are fetched again.
+        In cache-only mode, missing results are left out.
+        """
+        values = self.get_many(keys)
+        for _ in range(attempts):
+            unknown = {
+                item: key
+                for item, key in keys.items()
+                if item not in values
+            }
+            if len(unknown) == 0:
+                break
+            fetch(list(unknown.keys()))
+            values.update(self.get_many(unknown))
+            if is_cache_only():
+                break
+        else:
+            if len(values) < len(keys):
+                raise RuntimeError(
+                    f"Failed to fetch {len(keys) - len(values)} results "
+                    f"from {self.namespace}."
+                )
+        return values
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        data = [
+            (
+                key,
+                compress(
+                    dumps(value, protocol=HIGHEST_PROTOCOL),
+                    self.compress_level,
+                )
+            )
+            for key, value in items
+        ]
+        set_many(self._cache, data, tag=self.namespace)
+        statistics = self.statistics
+        with _statistics_lock:
+            statistics.bytes_written += sum(len(value) for _, value in data)
+
+    def __post_init__(self):
+        self._cache = open_result_cache(self.cache_dir)
+
+
+class CachedPairScorer(ABC):
+    """
+    Score topic-sentence pairs, with scores cached in a result cache.
+    Pairs that are being scored concurrently are only scored once.
+    """
+    _cache: ResultCache
+    # Score for pairs that are not scored, e.g., in cache-only mode.
+    fallback: float
+
+    def _can_score(self) -> bool:
+        """
+        Whether unknown pairs may be scored now,
+        or only recorded as cache misses.
+        """
+        return not is_cache_only()
+
+    @abstractmethod
+    def _preload_claimed(self, unknown: List[Tuple[str, str]]) -> None:
+        """
+        Score the pairs and write their scores to the cache.
+        """
+        pass
+
+    def _preload_unknown(self, unknown: List[Tuple[str, str]]) -> None:
+        if len(unknown) == 0:
+            return
+        if not self._can_score():
+            self._cache.record_misses(
+                self._cache.key(topic, sentence)
+                for topic, sentence in unknown
+            )
+            return
+        # Pairs that are being scored concurrently are not scored again.
+        with self._cache.single_flight({
+            (topic, sentence): self._cache.key(topic, sentence)
+            for topic, sentence in unknown
+        }) as claimed:
+            if len(claimed) > 0:
+                self._preload_claimed(claimed)
+
+    def _preload_pairs(self, pairs: List[Tuple[str, str]]) -> None:
+        # Pairs we don't know yet, without duplicates.
+        keys = {
+            (topic, sentence): self._cache.key(topic, sentence)
+            for topic, sentence in pairs
+        }
+        known = self._cache.get_many(keys)
+        self._preload_unknown([
+            pair
+            for pair in keys.keys()
+            if pair not in known
+        ])
+
+    def _scores(
+            self,
+            pairs: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], float]:
+        # Hash each pair only once.
+        keys = {
+            (topic, sentence): self._cache.key(topic, sentence)
+            for topic, sentence in pairs
+        }
+        scores = self._cache.get_or_fetch_many(keys, self._preload_unknown)
+        if len(scores) < len(keys):
+            # Pairs are only missing if they may not be scored.
+            scores.update({
+                pair: self.fallback
+                for pair in keys.keys()
+                if pair not in scores
+            })
+        return scores
+
+    def _score(self, topic: str, sentence: str) -> float:
+        return self._scores([(topic, sentence)])[topic, sentence]
+
+
+def inspect_result_cache(cache_dir: Path) -> Dict[str, int]:
+    """
+    Count cached results by service and model.
+    """
+    cache = open_result_cache(cache_dir)
+    counts: Counter[str] = Counter()
+    for key in cache.iterkeys():
+        namespace, _ = key.rsplit("/", maxsplit=1)
+        counts[namespace] += 1
+    return dict(counts)
+
+
+def prune_result_cache(
+        cache_dir: Path,
+        size_limit: Optional[int] = None,
+        namespace: Optional[str] = None,
+) -> int:
+    """
+    Remove all results of a service's model, if given,
+    and evict results until the cache fits into the size limit.
+    Returns the number of removed results.
+    """
+    cache = open_result_cache(cache_dir)
+    if size_limit is not None:
+        cache.reset("size_limit", size_limit)
+    removed = 0
+    if namespace is not None:
+        removed += cache.evict(namespace)
+    removed += cache.cull()
+    return removed
+
+
+def compact_result_cache(cache_dir: Path) -> None:
+    """
+    Repair the result cache and reclaim unused disk space.
+    """
+    cache = open_result_cache(cache_dir)
+    cache.check(fix=True)
+    close_caches()
+    with connect(cache_dir / "results" / DBNAME) as connection:
+        connection.execute("VACUUM")
+
+
+def migrate_legacy_cache(legacy_dir: Path, cache: ResultCache) -> int:
+    """
+    Import results from a legacy per-service cache directory.
+    Legacy keys are hashes of the inputs, like result cache keys.
+    Returns the number of imported results.
+    """
+    if not legacy_dir.exists():
+        return 0
+    legacy = open_cache(legacy_dir)
+    migrated = 0
+    batch: List[Tuple[str, Any]] = []
+    for legacy_key in legacy.iterkeys():
+        batch.append((
+            f"{cache.namespace}/{legacy_key}",
+            legacy.get(legacy_key),
+        ))
+        if len(batch) >= 1000:
+            cache.set_many(batch)
+            migrated += len(batch)
+            batch.clear()
+    cache.set_many(batch)
+    migrated += len(batch)
+    return migrated
+
+
+def migrate_legacy_caches(cache_dir: Path) -> Dict[str, int]:
+    """
+    Import results from the legacy TARGER, Debater and Huggingface caches.
+    Returns the number of imported results by service and model.
+    """
+    migrated: Dict[str, int] = {}
+    for service in ("targer", "debater", "huggingface"):
+        service_dir = cache_dir / service
+        if not service_dir.exists():
+            continue
+        # Model names may contain slashes, e.g., for Huggingface models.
+        for database in sorted(service_dir.rglob(DBNAME)):
+            legacy_dir = database.parent
+            model = legacy_dir.relative_to(service_dir).as_posix()
+            cache = ResultCache(service, model, cache_dir)
+            migrated[cache.namespace] = migrate_legacy_cache(
+                legacy_dir, cache
+            )
+    return migrated
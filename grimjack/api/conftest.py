@@ -0,0 +1,14 @@
+from pytest import fixture, MonkeyPatch
+
+from grimjack.api import cache
+
+
+@fixture(autouse=True)
+def reset_cache_mode(monkeypatch: MonkeyPatch) -> None:
+    """
+    Start each test outside cache-only mode and without cache misses,
+    and restore the previous mode afterwards.
+    """
+    monkeypatch.setattr(cache, "_cache_only", False)
+    monkeypatch.setattr(cache, "_planning", False)
+    monkeypatch.setattr(cache, "_misses", {})
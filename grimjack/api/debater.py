@@ -1,117 +1,159 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from functools import cached_property
-from hashlib import md5
+from itertools import product
 from pathlib import Path
-from typing import Optional, List, ContextManager
+from typing import Optional, List, ContextManager, Tuple, Dict
 
+from debater_python_api.api.clients.abstract_client import AbstractClient
 from debater_python_api.api.clients.argument_quality_client import (
     ArgumentQualityClient
 )
 from debater_python_api.api.clients.pro_con_client import ProConClient
 from debater_python_api.api.debater_api import DebaterApi
-from diskcache import Cache
+from tqdm import tqdm
 
-
-def md5_hash(text: str) -> str:
-    return md5(text.encode()).hexdigest()
+from grimjack import logger
+from grimjack.api.cache import ResultCache, CachedPairScorer
+from grimjack.api.rate_limit import RateLimiter
 
 
 @dataclass
-class CachedDebaterArgumentQualityScorer(ContextManager):
+class _CachedDebaterScorer(CachedPairScorer, ContextManager, ABC):
     api_token: str
     cache_dir: Optional[Path] = None
+    # Number of topic-sentence pairs to send per request.
+    chunk_size: int = 500
+    # Number of concurrent requests.
+    max_workers: int = 4
+    rate_limiter: Optional[RateLimiter] = None
+    # Score for pairs that are not cached in cache-only mode.
+    fallback: float = 0
 
     @cached_property
     def _api(self) -> DebaterApi:
         return DebaterApi(self.api_token)
 
-    @cached_property
-    def _client(self) -> ArgumentQualityClient:
-        return self._api.get_argument_quality_client()
+    @property
+    @abstractmethod
+    def _client(self) -> AbstractClient:
+        pass
 
-    _cache: Cache = field(init=False)
+    @property
+    @abstractmethod
+    def _cache_name(self) -> str:
+        pass
 
-    def preload(self, topic: str, sentences: List[str]) -> None:
-        # Sentences we don't know yet.
-        unknown = [
-            sentence
-            for sentence in sentences
-            if f"{md5_hash(topic)}-{md5_hash(sentence)}" not in self._cache
-        ]
-        if len(unknown) == 0:
-            return
+    _cache: ResultCache = field(init=False)
 
-        # Prefetch scores
+    def _preload_chunk(
+            self,
+            pairs: List[Tuple[str, str]],
+    ) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
         scores = self._client.run([
             {
                 "topic": topic,
                 "sentence": sentence,
             }
-            for sentence in unknown
+            for topic, sentence in pairs
         ])
-        for sentence, score in zip(unknown, scores):
-            self._cache[f"{md5_hash(topic)}-{md5_hash(sentence)}"] = score
-
-    def score(self, topic: str, sentence: str) -> float:
-        if f"{md5_hash(topic)}-{md5_hash(sentence)}" not in self._cache:
-            self.preload(topic, [sentence])
-        return self._cache[f"{md5_hash(topic)}-{md5_hash(sentence)}"]
+        self._cache.set_many(
+            (self._cache.key(topic, sentence), score)
+            for (topic, sentence), score in zip(pairs, scores)
+        )
+
+    def _preload_claimed(self, unknown: List[Tuple[str, str]]) -> None:
+        # Prefetch scores in chunks, caching each chunk when it is done.
+        self._client.set_show_process(False)
+        chunks = [
+            unknown[i:i + self.chunk_size]
+            for i in range(0, len(unknown), self.chunk_size)
+        ]
+        progress = tqdm(
+            total=len(unknown),
+            desc=f"Scoring {self._cache_name} with Debater API",
+            unit="pairs",
+        )
+        errors: List[Exception] = []
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = {
+                executor.submit(self._preload_chunk, chunk): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    logger.warning(
+                        f"Failed to score {len(futures[future])} pairs "
+                        f"with Debater API: {error}"
+                    )
+                    errors.append(error)
+                progress.update(len(futures[future]))
+        progress.close()
+        if len(errors) > 0:
+            raise errors[0]
 
     def __post_init__(self):
-        cache_subdir = self.cache_dir / "debater" / "quality"
-        self._cache = Cache(str(cache_subdir.absolute()))
+        self._cache = ResultCache("debater", self._cache_name, self.cache_dir)
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._cache.close()
         return None
 
 
 @dataclass
-class CachedDebaterArgumentStanceScorer(ContextManager):
-    api_token: str
-    cache_dir: Optional[Path] = None
+class CachedDebaterArgumentQualityScorer(_CachedDebaterScorer):
 
     @cached_property
-    def _api(self) -> DebaterApi:
-        return DebaterApi(self.api_token)
+    def _client(self) -> ArgumentQualityClient:
+        return self._api.get_argument_quality_client()
+
+    @property
+    def _cache_name(self) -> str:
+        return "quality"
+
+    def preload(self, topic: str, sentences: List[str]) -> None:
+        self._preload_pairs([(topic, sentence) for sentence in sentences])
+
+    def score(self, topic: str, sentence: str) -> float:
+        return self._score(topic, sentence)
+
+    def scores(self, topic: str, sentences: List[str]) -> Dict[str, float]:
+        scores = self._scores([(topic, sentence) for sentence in sentences])
+        return {
+            sentence: score
+            for (_, sentence), score in scores.items()
+        }
+
+
+@dataclass
+class CachedDebaterArgumentStanceScorer(_CachedDebaterScorer):
 
     @cached_property
     def _client(self) -> ProConClient:
         return self._api.get_pro_con_client()
 
-    _cache: Cache = field(init=False)
+    @property
+    def _cache_name(self) -> str:
+        return "stance"
 
     def preload(self, topics: List[str], sentences: List[str]) -> None:
-        # Sentences we don't know yet.
-        unknown = [
-            (topic, sentence)
-            for topic in topics
-            for sentence in sentences
-            if f"{md5_hash(topic)}-{md5_hash(sentence)}" not in self._cache
-        ]
-        if len(unknown) == 0:
-            return
-
-        # Prefetch scores
-        scores = self._client.run([
-            {
-                "topic": topic,
-                "sentence": sentence,
-            }
-            for topic, sentence in unknown
-        ])
-        for (topic, sentence), score in zip(unknown, scores):
-            self._cache[f"{md5_hash(topic)}-{md5_hash(sentence)}"] = score
+        self._preload_pairs(list(product(
+            dict.fromkeys(topics),
+            dict.fromkeys(sentences),
+        )))
 
     def score(self, topic: str, sentence: str) -> float:
-        if f"{md5_hash(topic)}-{md5_hash(sentence)}" not in self._cache:
-            self.preload([topic], [sentence])
-        return self._cache[f"{md5_hash(topic)}-{md5_hash(sentence)}"]
-
-    def __post_init__(self):
-        cache_subdir = self.cache_dir / "debater" / "stance"
-        self._cache = Cache(str(cache_subdir.absolute()))
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        self._cache.close()
-        return None
+        return self._score(topic, sentence)
+
+    def scores(
+            self,
+            topics: List[str],
+            sentences: List[str]
+    ) -> Dict[Tuple[str, str], float]:
+        return self._scores(list(product(
+            dict.fromkeys(topics),
+            dict.fromkeys(sentences),
+        )))
@@ -1,30 +1,56 @@
+from asyncio import (
+    run, Queue, Semaphore, gather, create_task, Future, get_running_loop
+)
 from dataclasses import dataclass, field
+from enum import Enum
 from functools import cached_property
-from hashlib import md5
+from itertools import islice
 from json import dumps, loads
 from pathlib import Path
-from time import sleep
-from typing import ContextManager, Optional, List
+from threading import Lock
+from typing import ContextManager, Optional, List, Dict, Tuple, Iterable
 
-from diskcache import Cache
-from requests import post, HTTPError
+from aiohttp import (
+    ClientSession, TCPConnector, ClientResponseError, ClientConnectionError
+)
+from diskcache import Index
 from tqdm import tqdm
-from websockets.legacy.client import connect
+from websockets.legacy.client import connect, WebSocketClientProtocol
 
 from grimjack import logger
+from grimjack.api.cache import ResultCache, is_cache_only, open_cache
+from grimjack.api.rate_limit import (
+    AdaptiveRateLimiter, RateLimiter, backoff_delay, parse_retry_after
+)
 
 
-def md5_hash(text: str) -> str:
-    return md5(text.encode()).hexdigest()
+class HuggingfaceTransport(Enum):
+    # One HTTP request per text, with several requests in flight.
+    REQUEST = 1
+    # Bulk stream over a single websocket, with several messages in flight.
+    SOCKET = 2
+    # No API, but a local model (see TransformersTextGenerator).
+    LOCAL = 3
 
 
-def _sleep_with_progress(seconds: int):
-    progress = tqdm(
-        range(seconds),
-        desc="Waiting"
-    )
-    for _ in progress:
-        sleep(1)
+class _RetryableError(Exception):
+    retry_after: Optional[float]
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Learned rate limits by API URL.
+_rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_rate_limiters_lock = Lock()
+
+
+def _shared_rate_limiter(api_url: str) -> AdaptiveRateLimiter:
+    with _rate_limiters_lock:
+        if api_url not in _rate_limiters:
+            _rate_limiters[api_url] = AdaptiveRateLimiter()
+        return _rate_limiters[api_url]
 
 
 @dataclass
@@ -32,107 +58,329 @@ class CachedHuggingfaceTextGenerator(ContextManager):
     model: str
     api_key: str
     cache_dir: Optional[Path] = None
+    # Number of generated texts to write to the cache at once.
+    flush_size: int = 32
+    # Text for inputs that are not cached in cache-only mode.
+    fallback: str = ""
+    transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST
+    # Number of texts that are sent but not yet generated.
+    max_in_flight: int = 8
+    api_url: str = "https://api-inference.huggingface.co"
+    socket_url: str = "wss://api-inference.huggingface.co"
+    # Learned rate limit, shared by all generators for the same model,
+    # if not given.
+    adaptive_rate_limiter: Optional[AdaptiveRateLimiter] = None
+    # Fixed rate limit, e.g., shared with other processes.
+    rate_limiter: Optional[RateLimiter] = None
+    max_retries: int = 10
 
     @cached_property
     def _api_url_socket(self) -> str:
-        return (
-            f"wss://api-inference.huggingface.co/"
-            f"bulk/stream/cpu/{self.model}"
-        )
+        return f"{self.socket_url}/bulk/stream/cpu/{self.model}"
 
     @cached_property
     def _api_url_request(self) -> str:
-        return f"https://api-inference.huggingface.co/models/{self.model}"
+        return f"{self.api_url}/models/{self.model}"
 
-    _cache: Cache = field(init=False)
+    _cache: ResultCache = field(init=False)
 
-    async def _preload_socket(self, texts: List[str]) -> None:
-        # Texts we haven't generated yet.
-        unknown = [
-            text
-            for text in texts
-            if md5_hash(text) not in self._cache
-        ]
-        if len(unknown) == 0:
-            return
+    def _unknown(self, texts: List[str]) -> List[str]:
+        keys = {text: self._cache.key(text) for text in texts}
+        known = self._cache.get_many(keys)
+        return [text for text in keys.keys() if text not in known]
 
-        # Prefetch generated texts
-        async with connect(self._api_url_socket) as socket:
-            await socket.send(f"Bearer {self.api_key}".encode("utf-8"))
-            for text in tqdm(
-                    unknown,
-                    desc="Generating texts with Huggingface API",
-                    unit="texts"
-            ):
-                payload = {"inputs": text}
-                await socket.send(dumps(payload))
-                data = await socket.recv()
-                response_json = loads(data)
-                generated_text: str = response_json["outputs"]
-                self._cache[md5_hash(text)] = generated_text
+    @cached_property
+    def _pending(self) -> Optional[Index]:
+        # Texts that were requested but not yet generated, by cache key.
+        # Without a cache directory, interrupted runs can't be resumed.
+        if self.cache_dir is None:
+            return None
+        return Index.fromcache(open_cache(
+            self.cache_dir / "huggingface-pending" / self.model
+        ))
 
-    def _preload_request(self, texts: List[str]) -> None:
-        # Texts we haven't generated yet.
-        unknown = [
-            text
-            for text in texts
-            if md5_hash(text) not in self._cache
-        ]
-        if len(unknown) == 0:
+    def _add_pending(self, texts: Iterable[str]) -> None:
+        if self._pending is None:
+            return
+        with self._pending.transact():
+            for text in texts:
+                self._pending[self._cache.key(text)] = text
+
+    def _remove_pending(self, texts: Iterable[str]) -> None:
+        if self._pending is None:
             return
+        with self._pending.transact():
+            for text in texts:
+                self._pending.pop(self._cache.key(text), None)
 
-        # Prefetch generated texts
-        for text in tqdm(
-                unknown,
-                desc="Generating texts with Huggingface API",
-                unit="texts"
-        ):
-            self._fetch_single_request(text)
-
-    def _fetch_single_request(self, text: str) -> None:
-        payload = {"inputs": text}
-        response = post(
-            url=self._api_url_request,
-            headers={"Authorization": f"Bearer {self.api_key}"},
-            json=payload
+    def _resumable(self, requested: List[str]) -> List[str]:
+        # Resume at most as many pending texts as are requested,
+        # so that small calls don't generate the whole backlog.
+        if self._pending is None:
+            return []
+        excluded = set(requested)
+        candidates = list(islice(
+            (
+                text
+                for text in self._pending.values()
+                if text not in excluded
+            ),
+            len(requested)
+        ))
+        resumable = self._unknown(candidates)
+        # Texts that were generated by another run are no longer pending.
+        self._remove_pending(set(candidates) - set(resumable))
+        return resumable
+
+    def _flush(self, generated: List[Tuple[str, str]]) -> None:
+        self._cache.set_many(
+            (self._cache.key(text), generated_text)
+            for text, generated_text in generated
         )
-        if response.status_code // 100 != 2:
-            if response.status_code == 429:
-                logger.warning(
-                    f"Hit Huggingface rate limit for model {self.model}."
+        self._remove_pending(text for text, _ in generated)
+        generated.clear()
+
+    def _add_generated(
+            self,
+            generated: List[Tuple[str, str]],
+            text: str,
+            generated_text: str,
+            progress: tqdm,
+    ) -> None:
+        generated.append((text, generated_text))
+        if len(generated) >= self.flush_size:
+            self._flush(generated)
+        progress.update()
+
+    async def _receive_socket(
+            self,
+            socket: WebSocketClientProtocol,
+            pending: Dict[str, Future],
+    ) -> None:
+        try:
+            async for data in socket:
+                response_json = loads(data)
+                future = pending.pop(response_json["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(response_json["outputs"])
+        finally:
+            # Fail texts that are still waiting when the stream is closed.
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(
+                        "Huggingface bulk stream closed unexpectedly."
+                    ))
+
+    async def _preload_socket(self, unknown: List[str]) -> None:
+        # Prefetch generated texts over a single bulk stream.
+        generated: List[Tuple[str, str]] = []
+        progress = tqdm(
+            total=len(unknown),
+            desc="Generating texts with Huggingface API",
+            unit="texts"
+        )
+        in_flight = Semaphore(self.max_in_flight)
+        pending: Dict[str, Future] = {}
+        loop = get_running_loop()
+        try:
+            async with connect(self._api_url_socket) as socket:
+                await socket.send(f"Bearer {self.api_key}".encode("utf-8"))
+                receiver = create_task(self._receive_socket(socket, pending))
+
+                async def generate(index: int, text: str) -> None:
+                    async with in_flight:
+                        if self.rate_limiter is not None:
+                            await self.rate_limiter.acquire_async()
+                        message_id = str(index)
+                        future = loop.create_future()
+                        pending[message_id] = future
+                        await socket.send(dumps({
+                            "id": message_id,
+                            "inputs": text,
+                        }))
+                        generated_text: str = await future
+                    self._add_generated(
+                        generated, text, generated_text, progress
+                    )
+
+                tasks = [
+                    create_task(generate(index, text))
+                    for index, text in enumerate(unknown)
+                ]
+                try:
+                    await gather(*tasks)
+                finally:
+                    # If a text failed, stop generating the others
+                    # and wait for them before the stream is closed.
+                    receiver.cancel()
+                    for task in tasks:
+                        task.cancel()
+                    await gather(receiver, *tasks, return_exceptions=True)
+                    # Failures of cancelled texts are not raised.
+                    for future in pending.values():
+                        if future.done() and not future.cancelled():
+                            future.exception()
+        finally:
+            self._flush(generated)
+            progress.close()
+
+    async def _fetch_request(
+            self,
+            session: ClientSession,
+            text: str
+    ) -> str:
+        reserved = await self.adaptive_rate_limiter.acquire()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        async with session.post(
+                self._api_url_request,
+                json={"inputs": text},
+        ) as response:
+            retry_after = parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            if response.status == 429:
+                self.adaptive_rate_limiter.throttle(retry_after, reserved)
+                raise _RetryableError(
+                    f"Hit Huggingface rate limit for model {self.model}.",
+                    retry_after,
                 )
-                logger.info("Retrying in 1h.")
-                _sleep_with_progress(1 * 60 * 60)
-                return self._fetch_single_request(text)
-            elif response.status_code // 100 == 5:
-                logger.warning("Huggingface server error.")
-                logger.info("Retrying in 1m.")
-                _sleep_with_progress(1 * 60)
-                return self._fetch_single_request(text)
-            else:
-                raise HTTPError(
-                    f"Failed to generate text '{text}' with Huggingface API. "
-                    f"Check if you are authenticated. "
-                    f"Got response {response.status_code} {response.reason}",
-                    response=response,
+            elif response.status // 100 == 5:
+                raise _RetryableError(
+                    f"Huggingface server error {response.status}.",
+                    retry_after,
+                )
+            elif response.status // 100 != 2:
+                raise ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=(
+                        f"Failed to generate text '{text}' "
+                        f"with Huggingface API. "
+                        f"Check if you are authenticated. "
+                        f"Got response {response.status} "
+                        f"{response.reason}"
+                    ),
                 )
-        response_json = response.json()
+            response_json = await response.json()
+        self.adaptive_rate_limiter.success()
         generated_text: str = response_json[0]["generated_text"]
-        self._cache[md5_hash(text)] = generated_text
+        return generated_text
+
+    async def _preload_request(self, unknown: List[str]) -> None:
+        # Prefetch generated texts with a pool of persistent connections.
+        # Failed texts are retried with backoff after the other texts
+        # in the queue, so that one throttled text does not block others.
+        generated: List[Tuple[str, str]] = []
+        progress = tqdm(
+            total=len(unknown),
+            desc="Generating texts with Huggingface API",
+            unit="texts"
+        )
+        queue: Queue = Queue()
+        for text in unknown:
+            queue.put_nowait((text, 0))
+        errors: List[Exception] = []
+        loop = get_running_loop()
+
+        def retry(text: str, attempt: int) -> None:
+            queue.put_nowait((text, attempt))
+            queue.task_done()
+
+        async def worker(session: ClientSession) -> None:
+            while True:
+                text, attempt = await queue.get()
+                try:
+                    generated_text = await self._fetch_request(session, text)
+                except (_RetryableError, ClientConnectionError) as error:
+                    if attempt >= self.max_retries:
+                        errors.append(error)
+                        queue.task_done()
+                        continue
+                    delay = getattr(error, "retry_after", None)
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    logger.warning(f"{error} Retrying in {delay:.1f}s.")
+                    loop.call_later(delay, retry, text, attempt + 1)
+                    continue
+                except Exception as error:
+                    errors.append(error)
+                    queue.task_done()
+                    continue
+                self._add_generated(generated, text, generated_text, progress)
+                queue.task_done()
+
+        try:
+            async with ClientSession(
+                    connector=TCPConnector(limit=self.max_in_flight),
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+            ) as session:
+                workers = [
+                    create_task(worker(session))
+                    for _ in range(min(self.max_in_flight, len(unknown)))
+                ]
+                try:
+                    await queue.join()
+                finally:
+                    for task in workers:
+                        task.cancel()
+        finally:
+            self._flush(generated)
+            progress.close()
+        if len(errors) > 0:
+            raise errors[0]
 
     def preload(self, texts: List[str]) -> None:
-        # run(self._preload_socket(texts))
-        self._preload_request(texts)
+        # Texts we haven't generated yet.
+        unknown = self._unknown(texts)
+        if len(unknown) == 0:
+            return
+        if is_cache_only():
+            self._cache.record_misses(
+                self._cache.key(text)
+                for text in unknown
+            )
+            return
+        # Resume texts that are still pending from interrupted runs.
+        resumed = self._resumable(unknown)
+        if len(resumed) > 0:
+            logger.info(f"Resuming {len(resumed)} pending texts.")
+        unknown = resumed + unknown
+        # Texts that are being generated concurrently are not requested again.
+        with self._cache.single_flight({
+            text: self._cache.key(text)
+            for text in unknown
+        }) as claimed:
+            if len(claimed) == 0:
+                return
+            self._add_pending(claimed)
+            if self.transport == HuggingfaceTransport.SOCKET:
+                run(self._preload_socket(claimed))
+            else:
+                run(self._preload_request(claimed))
 
     def generate(self, text: str) -> str:
-        if md5_hash(text) not in self._cache:
-            self.preload([text])
-        return self._cache[md5_hash(text)]
+        return self.generate_many([text])[text]
+
+    def generate_many(self, texts: List[str]) -> Dict[str, str]:
+        keys = {text: self._cache.key(text) for text in texts}
+        generated = self._cache.get_or_fetch_many(keys, self.preload)
+        if len(generated) < len(keys):
+            # Texts are only missing in cache-only mode.
+            generated.update({
+                text: self.fallback
+                for text in keys.keys()
+                if text not in generated
+            })
+        return generated
 
     def __post_init__(self):
-        cache_subdir = self.cache_dir / "huggingface" / self.model
-        self._cache = Cache(str(cache_subdir.absolute()))
+        self._cache = ResultCache("huggingface", self.model, self.cache_dir)
+        if self.adaptive_rate_limiter is None:
+            self.adaptive_rate_limiter = _shared_rate_limiter(
+                self._api_url_request
+            )
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._cache.close()
         return None
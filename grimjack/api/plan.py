@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from math import ceil
+from typing import Dict, Set, List, Optional
+
+# Rough latency of a single request to each service, in seconds.
+TARGER_REQUEST_SECONDS = 1.0
+DEBATER_REQUEST_SECONDS = 5.0
+HUGGINGFACE_REQUEST_SECONDS = 1.0
+# Rough time to process a single text or pair with a local model.
+TRANSFORMERS_ITEM_SECONDS = 0.5
+
+
+@dataclass
+class RequestEstimate:
+    namespace: str
+    uncached: int
+    requests: int
+    seconds: float
+
+
+def estimate_requests(
+        misses: Dict[str, Set[str]],
+        targer_passages_per_request: int = 1,
+        debater_chunk_size: int = 500,
+        debater_workers: int = 4,
+        debater_rate_limit: Optional[float] = None,
+        targer_rate_limit: Optional[float] = None,
+        huggingface_rate_limit: Optional[float] = None,
+        huggingface_in_flight: int = 8,
+) -> List[RequestEstimate]:
+    """
+    Estimate the number of requests and the time needed
+    to fill the cache misses of each service and model.
+    """
+    estimates = []
+    for namespace, keys in sorted(misses.items()):
+        service = namespace.split("/", maxsplit=1)[0]
+        uncached = len(keys)
+        if service == "targer":
+            # Passages are tagged sequentially.
+            requests = ceil(uncached / targer_passages_per_request)
+            seconds = requests * TARGER_REQUEST_SECONDS
+            if targer_rate_limit is not None:
+                seconds = max(seconds, requests / targer_rate_limit)
+        elif service == "debater":
+            # Chunks of pairs are scored concurrently.
+            requests = ceil(uncached / debater_chunk_size)
+            seconds = (
+                    ceil(requests / debater_workers) *
+                    DEBATER_REQUEST_SECONDS
+            )
+            if debater_rate_limit is not None:
+                seconds = max(seconds, requests / debater_rate_limit)
+        elif service == "huggingface":
+            # Up to the given number of texts are generated concurrently.
+            requests = uncached
+            seconds = (
+                    ceil(requests / huggingface_in_flight) *
+                    HUGGINGFACE_REQUEST_SECONDS
+            )
+            if huggingface_rate_limit is not None:
+                seconds = max(seconds, requests / huggingface_rate_limit)
+        elif service == "transformers":
+            # Texts or pairs are processed locally, without requests.
+            requests = 0
+            seconds = uncached * TRANSFORMERS_ITEM_SECONDS
+        else:
+            raise ValueError(f"Unknown service: {service}")
+        estimates.append(RequestEstimate(
+            namespace, uncached, requests, seconds
+        ))
+    return estimates
@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+from asyncio import sleep as async_sleep, get_running_loop
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from fcntl import flock, LOCK_EX, LOCK_UN
+from json import dumps, loads
+from math import inf
+from pathlib import Path
+from random import Random
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Optional, Tuple
+
+
+class RateLimiter(ABC):
+    @abstractmethod
+    def acquire(self) -> None:
+        """
+        Block until the next request may be sent.
+        """
+        pass
+
+    async def acquire_async(self) -> None:
+        # Wait in a worker thread to not block the event loop.
+        await get_running_loop().run_in_executor(None, self.acquire)
+
+
+@dataclass
+class ThreadRateLimiter(RateLimiter):
+    """
+    Thread-safe token bucket that allows a number of requests per second,
+    with bursts of up to a fixed number of requests.
+    """
+    requests_per_second: float
+    burst: int = 1
+
+    _tokens: float = field(init=False, repr=False)
+    _updated: float = field(init=False, repr=False)
+    _lock: Lock = field(init=False, repr=False, default_factory=Lock)
+
+    def __post_init__(self):
+        if self.requests_per_second <= 0:
+            raise ValueError("Rate limit must be positive.")
+        self._tokens = self.burst
+        self._updated = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.burst,
+            self._tokens + (now - self._updated) * self.requests_per_second
+        )
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.requests_per_second
+            sleep(wait)
+
+
+@dataclass
+class FileRateLimiter(RateLimiter):
+    """
+    Token bucket for a service that is shared by all processes
+    using the same directory. The bucket is stored in a file
+    that is locked while taking a token.
+    """
+    directory: Path
+    service: str
+    requests_per_second: float
+    burst: int = 1
+
+    _path: Path = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if self.requests_per_second <= 0:
+            raise ValueError("Rate limit must be positive.")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path = self.directory / f"{self.service}.json"
+
+    def _take(self) -> float:
+        # Take a token, or return the seconds to wait for the next token.
+        with self._path.open("a+") as file:
+            flock(file.fileno(), LOCK_EX)
+            try:
+                file.seek(0)
+                content = file.read()
+                # Wall clock time, as monotonic time is not shared
+                # between processes.
+                now = time()
+                tokens: float = self.burst
+                if len(content) > 0:
+                    state = loads(content)
+                    tokens = min(
+                        self.burst,
+                        state["tokens"] +
+                        max(0.0, now - state["updated"]) *
+                        self.requests_per_second
+                    )
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.requests_per_second
+                file.seek(0)
+                file.truncate()
+                file.write(dumps({"tokens": tokens, "updated": now}))
+                file.flush()
+                return wait
+            finally:
+                flock(file.fileno(), LOCK_UN)
+
+    def acquire(self) -> None:
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            sleep(wait)
+
+
+@dataclass
+class AdaptiveRateLimiter:
+    """
+    Rate limiter that learns the allowed rate from a service's responses.
+    The rate increases additively after each successful request and
+    decreases multiplicatively when the service throttles requests,
+    at most once for all requests that were reserved at the same rate.
+    Requests are spaced evenly and can be awaited from coroutines.
+    """
+    requests_per_second: float = 10
+    min_requests_per_second: float = 0.01
+    max_requests_per_second: float = 100
+    # Requests per second to add after each successful request.
+    increase: float = 0.1
+    # Factor to multiply the rate with when throttled.
+    decrease: float = 0.5
+
+    _next: float = field(init=False, repr=False, default=0)
+    _blocked_until: float = field(init=False, repr=False, default=0)
+    # When the rate was last decreased.
+    _decreased: float = field(init=False, repr=False, default=-inf)
+    _lock: Lock = field(init=False, repr=False, default_factory=Lock)
+
+    def __post_init__(self):
+        if self.requests_per_second <= 0:
+            raise ValueError("Rate limit must be positive.")
+
+    def _reserve(self) -> Tuple[float, float]:
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next, self._blocked_until)
+            self._next = start + 1 / self.requests_per_second
+            return now, start - now
+
+    async def acquire(self) -> float:
+        """
+        Wait until the next request may be sent.
+        Returns when the request was reserved, to pass to throttle().
+        """
+        reserved, wait = self._reserve()
+        if wait > 0:
+            await async_sleep(wait)
+        return reserved
+
+    def success(self) -> None:
+        with self._lock:
+            self.requests_per_second = min(
+                self.max_requests_per_second,
+                self.requests_per_second + self.increase
+            )
+
+    def throttle(
+            self,
+            retry_after: Optional[float] = None,
+            reserved: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            now = monotonic()
+            # Requests reserved before the last decrease were sent
+            # at the higher rate, so they don't decrease it again.
+            if reserved is None or reserved >= self._decreased:
+                self.requests_per_second = max(
+                    self.min_requests_per_second,
+                    self.requests_per_second * self.decrease
+                )
+                self._decreased = now
+            if retry_after is not None:
+                self._blocked_until = max(
+                    self._blocked_until,
+                    now + retry_after
+                )
+            self._next = max(
+                self._next,
+                now + 1 / self.requests_per_second
+            )
+
+
+def backoff_delay(
+        attempt: int,
+        base: float = 1,
+        maximum: float = 60 * 60,
+        random: Random = Random(),
+) -> float:
+    """
+    Exponential backoff with full jitter for the given retry attempt.
+    """
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse the seconds to wait from a Retry-After header,
+    given either as seconds or as an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
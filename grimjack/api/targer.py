@@ -0,0 +1,290 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from json import dumps, loads
+from pathlib import Path
+from typing import ContextManager, Optional, Set, List, Dict, Iterator
+from zlib import compress, decompress
+
+from diskcache import Cache
+from requests import Session
+from requests.adapters import HTTPAdapter
+from targer_api import (
+    ArgumentSentences, ArgumentSentence, ArgumentModelSentences,
+    ArgumentLabel
+)
+from targer_api.parse import parse_argument_sentences
+from tqdm import tqdm
+
+from grimjack import logger
+from grimjack.api.cache import open_cache, ResultCache, is_cache_only
+from grimjack.api.rate_limit import RateLimiter
+from grimjack.model.arguments import (
+    PackedArgumentSentences, PackedArgumentModelSentences
+)
+
+
+# Marker sentence that separates passages packed into a single request.
+_SEPARATOR_TOKEN = "GRIMJACKPASSAGESEPARATOR"
+_SEPARATOR = f"\n\n{_SEPARATOR_TOKEN}.\n\n"
+
+
+def _is_separator(token: str) -> bool:
+    return token.rstrip(".") == _SEPARATOR_TOKEN
+
+
+def _join_batch(texts: List[str]) -> str:
+    return _SEPARATOR.join(texts)
+
+
+def _split_batch(
+        sentences: ArgumentSentences,
+        size: int
+) -> Optional[List[ArgumentSentences]]:
+    """
+    Split the tagged sentences of a packed request back per passage.
+    Returns None if the separators could not be recovered.
+    """
+    documents: List[ArgumentSentences] = [[]]
+    for sentence in sentences:
+        current: ArgumentSentence = []
+        skip_period = False
+        for tag in sentence:
+            if _is_separator(tag.token):
+                if len(current) > 0:
+                    documents[-1].append(current)
+                current = []
+                documents.append([])
+                # The period may have been split into its own token.
+                skip_period = tag.token == _SEPARATOR_TOKEN
+                continue
+            if skip_period and tag.token == ".":
+                skip_period = False
+                continue
+            skip_period = False
+            current.append(tag)
+        if len(current) > 0:
+            documents[-1].append(current)
+    if len(documents) != size:
+        return None
+    return documents
+
+
+@dataclass
+class CachedTargerArgumentAnalyzer(ContextManager):
+    api_url: str
+    models: Set[str]
+    cache_dir: Optional[Path] = None
+    # Maximum number of characters to pack into a single request.
+    # If None, each passage is sent in its own request.
+    max_batch_length: Optional[int] = None
+    # Number of connections to keep open for concurrent requests.
+    pool_size: int = 10
+    rate_limiter: Optional[RateLimiter] = None
+
+    @cached_property
+    def _session(self) -> Session:
+        session = Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    _caches: Dict[str, ResultCache] = field(init=False)
+
+    def _fetch(self, model: str, text: str) -> ArgumentSentences:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        response = self._session.post(
+            self.api_url + model,
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "text/plain",
+            },
+            data=text.encode("utf-8"),
+        )
+        response.raise_for_status()
+        return parse_argument_sentences(response.json())
+
+    def batches(self, texts: List[str]) -> Iterator[List[str]]:
+        if self.max_batch_length is None:
+            for text in texts:
+                yield [text]
+            return
+
+        batch: List[str] = []
+        batch_length = 0
+        for text in texts:
+            if (
+                    len(batch) > 0 and
+                    batch_length + len(_SEPARATOR) + len(text) >
+                    self.max_batch_length
+            ):
+                yield batch
+                batch = []
+                batch_length = 0
+            if len(batch) > 0:
+                batch_length += len(_SEPARATOR)
+            batch_length += len(text)
+            batch.append(text)
+        if len(batch) > 0:
+            yield batch
+
+    def fetch_batch(
+            self,
+            model: str,
+            texts: List[str]
+    ) -> List[ArgumentSentences]:
+        if len(texts) == 1:
+            return [self._fetch(model, texts[0])]
+
+        sentences = self._fetch(model, _join_batch(texts))
+        documents = _split_batch(sentences, len(texts))
+        if documents is None:
+            logger.warning(
+                f"Could not split batched TARGER response "
+                f"for {len(texts)} passages. "
+                f"Falling back to one request per passage."
+            )
+            return [self._fetch(model, text) for text in texts]
+        return documents
+
+    def preload(self, texts: List[str]) -> None:
+        for model in self.models:
+            self._preload_model(model, texts)
+
+    def _preload_model(self, model: str, texts: List[str]) -> None:
+        cache = self._caches[model]
+        # Texts we haven't tagged yet.
+        keys = {text: cache.key(text) for text in texts}
+        known = cache.get_many(keys)
+        unknown = [text for text in keys.keys() if text not in known]
+        if len(unknown) == 0:
+            return
+        if is_cache_only():
+            cache.record_misses(keys[text] for text in unknown)
+            return
+        # Texts that are being tagged concurrently are not requested again.
+        with cache.single_flight({
+            text: keys[text]
+            for text in unknown
+        }) as claimed:
+            if len(claimed) > 0:
+                self._preload_claimed(model, cache, claimed)
+
+    def _preload_claimed(
+            self,
+            model: str,
+            cache: ResultCache,
+            unknown: List[str]
+    ) -> None:
+        # Prefetch tagged sentences.
+        progress = tqdm(
+            total=len(unknown),
+            desc=f"Tagging arguments with TARGER model {model}",
+            unit="passages",
+        )
+        for batch in self.batches(unknown):
+            documents = self.fetch_batch(model, batch)
+            cache.set_many(
+                (cache.key(text), sentences)
+                for text, sentences in zip(batch, documents)
+            )
+            progress.update(len(batch))
+        progress.close()
+
+    def analyze(self, text: str) -> ArgumentModelSentences:
+        arguments: ArgumentModelSentences = {}
+        for model in self.models:
+            cache = self._caches[model]
+            arguments.update(cache.get_or_fetch_many(
+                {model: cache.key(text)},
+                lambda _: self._preload_model(model, [text]),
+            ))
+        # Fall back to no arguments for uncached texts in cache-only mode.
+        return {
+            model: arguments.get(model, [])
+            for model in self.models
+        }
+
+    def __post_init__(self):
+        self._caches = {
+            model: ResultCache("targer", model, self.cache_dir)
+            for model in self.models
+        }
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._session.close()
+        return None
+
+
+def _pack_sentences(sentences: ArgumentSentences) -> bytes:
+    # Serialize the tags directly, without adding the tokens
+    # to the shared argument vocabulary.
+    return compress(dumps([
+        [
+            [tag.token, tag.label.value, tag.probability]
+            for tag in sentence
+        ]
+        for sentence in sentences
+    ]).encode("utf-8"))
+
+
+def _unpack_sentences(data: bytes) -> PackedArgumentSentences:
+    return PackedArgumentSentences.from_tags(
+        (
+            (token, ArgumentLabel(label), probability)
+            for token, label, probability in sentence
+        )
+        for sentence in loads(decompress(data).decode("utf-8"))
+    )
+
+
+@dataclass
+class TargerArgumentStore(ContextManager):
+    """
+    Compressed store of tagged sentences keyed by passage ID,
+    e.g., for pre-tagging the whole corpus offline.
+    """
+    store_dir: Path
+    models: Set[str]
+
+    _caches: Dict[str, Cache] = field(init=False)
+
+    def missing_models(self, document_id: str) -> Set[str]:
+        return {
+            model
+            for model in self.models
+            if document_id not in self._caches[model]
+        }
+
+    def get(
+            self,
+            document_id: str
+    ) -> Optional[PackedArgumentModelSentences]:
+        arguments: PackedArgumentModelSentences = {}
+        for model in self.models:
+            data: Optional[bytes] = self._caches[model].get(document_id)
+            if data is None:
+                return None
+            arguments[model] = _unpack_sentences(data)
+        return arguments
+
+    def put(
+            self,
+            document_id: str,
+            model: str,
+            sentences: ArgumentSentences
+    ) -> None:
+        self._caches[model][document_id] = _pack_sentences(sentences)
+
+    def __post_init__(self):
+        self._caches = {
+            model: open_cache(self.store_dir / model)
+            for model in self.models
+        }
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
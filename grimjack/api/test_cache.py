@@ -0,0 +1,135 @@
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Thread
+from typing import List
+
+from pytest import raises
+
+from grimjack.api.cache import (
+    open_cache, close_caches, ResultCache, inspect_result_cache,
+    prune_result_cache, migrate_legacy_caches, single_flight, set_cache_only,
+    planning, is_cache_only, is_planning, cache_misses
+)
+
+
+def _child_handle_id(directory: Path) -> int:
+    cache = open_cache(directory)
+    cache["child"] = True
+    return id(cache)
+
+
+def test_open_cache_shared(tmp_path: Path) -> None:
+    cache = open_cache(tmp_path / "cache")
+    assert open_cache(tmp_path / "cache") is cache
+    assert open_cache(tmp_path / "other") is not cache
+    close_caches()
+    assert open_cache(tmp_path / "cache") is not cache
+    close_caches()
+
+
+def test_open_cache_forked(tmp_path: Path) -> None:
+    cache = open_cache(tmp_path)
+    with get_context("fork").Pool(1) as pool:
+        pool.apply(_child_handle_id, (tmp_path,))
+    # The child opened its own handle and its writes are visible.
+    assert cache.get("child") is True
+    close_caches()
+
+
+def test_result_cache_round_trip(tmp_path: Path) -> None:
+    cache = ResultCache("service", "model", tmp_path)
+    key = cache.key("topic", "sentence")
+    assert cache.get_many({"a": key}) == {}
+    cache.set_many([(key, [1.0, "value"])])
+    assert cache.get_many({"a": key}) == {"a": [1.0, "value"]}
+    assert cache.statistics.hits >= 1
+    assert cache.statistics.misses >= 1
+    assert cache.statistics.bytes_written > 0
+    assert inspect_result_cache(tmp_path) == {"service/model": 1}
+
+    assert prune_result_cache(tmp_path, namespace="service/model") == 1
+    assert inspect_result_cache(tmp_path) == {}
+    close_caches()
+
+
+def test_migrate_legacy_cache(tmp_path: Path) -> None:
+    legacy = open_cache(tmp_path / "debater" / "stance")
+    legacy["legacy-key"] = 0.5
+    legacy = open_cache(tmp_path / "huggingface" / "bigscience" / "T0pp")
+    legacy["legacy-key"] = "text"
+    assert migrate_legacy_caches(tmp_path) == {
+        "debater/stance": 1,
+        "huggingface/bigscience/T0pp": 1,
+    }
+    cache = ResultCache("huggingface", "bigscience/T0pp", tmp_path)
+    assert cache.get_many({
+        "a": "huggingface/bigscience/T0pp/legacy-key"
+    }) == {"a": "text"}
+    close_caches()
+
+
+def test_single_flight() -> None:
+    events = []
+    with single_flight(["a", "b", "a"]) as claimed:
+        assert claimed == {"a", "b"}
+
+        def claim_concurrently() -> None:
+            with single_flight(["b", "c"]) as concurrently_claimed:
+                events.append(concurrently_claimed)
+            events.append("done")
+
+        thread = Thread(target=claim_concurrently)
+        thread.start()
+        thread.join(0.2)
+        # Only the new key is claimed, and the thread waits for "b".
+        assert events == [{"c"}]
+    thread.join()
+    assert events == [{"c"}, "done"]
+    with single_flight(["a", "b"]) as claimed:
+        assert claimed == {"a", "b"}
+
+
+def test_get_or_fetch_many(tmp_path: Path) -> None:
+    cache = ResultCache("service", "model", tmp_path)
+    key = cache.key("a")
+    fetched: List[List[str]] = []
+
+    def fetch_on_retry(items: List[str]) -> None:
+        # The first fetch fails silently, e.g., in a concurrent caller.
+        fetched.append(items)
+        if len(fetched) > 1:
+            cache.set_many([(key, 1)])
+
+    assert cache.get_or_fetch_many({"a": key}, fetch_on_retry) == {"a": 1}
+    assert fetched == [["a"], ["a"]]
+    with raises(RuntimeError):
+        cache.get_or_fetch_many({"b": cache.key("b")}, lambda _: None)
+    set_cache_only(True)
+    # Missing results are left out in cache-only mode.
+    assert cache.get_or_fetch_many({
+        "a": key,
+        "b": cache.key("b"),
+    }, lambda _: None) == {"a": 1}
+    close_caches()
+
+
+def test_cache_mode_reset() -> None:
+    # The cache mode and misses of other tests don't leak.
+    assert not is_cache_only()
+    assert not is_planning()
+    assert cache_misses() == {}
+    set_cache_only(True)
+
+
+def test_planning(tmp_path: Path) -> None:
+    cache = ResultCache("service", "planned", tmp_path)
+    with planning():
+        assert is_cache_only()
+        assert is_planning()
+        cache.record_misses([cache.key("a")])
+        assert cache_misses()["service/planned"] == {cache.key("a")}
+    # The previous mode is restored and planned misses are not reported.
+    assert not is_cache_only()
+    assert not is_planning()
+    assert "service/planned" not in cache_misses()
+    close_caches()
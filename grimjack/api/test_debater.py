@@ -0,0 +1,153 @@
+from pathlib import Path
+from threading import Lock, Thread
+from time import sleep
+from typing import List, Dict
+
+from pytest import raises
+
+from grimjack.api.cache import set_cache_only, cache_misses
+from grimjack.api.debater import (
+    CachedDebaterArgumentQualityScorer, CachedDebaterArgumentStanceScorer
+)
+
+
+class _StandInDebaterClient:
+    def __init__(self, fail_on: str = None, delay: float = 0):
+        self.fail_on = fail_on
+        self.delay = delay
+        self.requests: List[List[Dict[str, str]]] = []
+        self._lock = Lock()
+
+    def set_show_process(self, _: bool) -> None:
+        pass
+
+    def run(self, pairs: List[Dict[str, str]]) -> List[float]:
+        with self._lock:
+            self.requests.append(pairs)
+        sleep(self.delay)
+        if any(pair["sentence"] == self.fail_on for pair in pairs):
+            raise ConnectionError("Stand-in server error.")
+        return [len(pair["sentence"]) / 100 for pair in pairs]
+
+
+def test_quality_preload_chunked_deduplicated(tmp_path: Path) -> None:
+    client = _StandInDebaterClient()
+    with CachedDebaterArgumentQualityScorer(
+            "token", tmp_path, chunk_size=2, max_workers=3
+    ) as scorer:
+        scorer.__dict__["_client"] = client
+        sentences = ["a", "bb", "a", "ccc", "bb", "dddd", "eeeee"]
+        scorer.preload("topic", sentences)
+        assert all(len(request) <= 2 for request in client.requests)
+        sent = [pair["sentence"] for request in client.requests
+                for pair in request]
+        assert sorted(sent) == ["a", "bb", "ccc", "dddd", "eeeee"]
+        assert scorer.score("topic", "ccc") == 0.03
+
+        # Known pairs are not requested again.
+        scorer.preload("topic", sentences)
+        assert len(client.requests) == 3
+
+
+def test_stance_preload_partial_failure(tmp_path: Path) -> None:
+    client = _StandInDebaterClient(fail_on="fail")
+    with CachedDebaterArgumentStanceScorer(
+            "token", tmp_path, chunk_size=1, max_workers=2
+    ) as scorer:
+        scorer.__dict__["_client"] = client
+        with raises(ConnectionError):
+            scorer.preload(["x", "y", "x"], ["ok", "fail", "ok"])
+        # Successful chunks are cached despite the failure.
+        assert len(client.requests) == 4
+        assert scorer.score("x", "ok") == 0.02
+        assert scorer.score("y", "ok") == 0.02
+        assert len(client.requests) == 4
+
+
+def test_stance_scores_batch(tmp_path: Path) -> None:
+    client = _StandInDebaterClient()
+    with CachedDebaterArgumentStanceScorer(
+            "token", tmp_path, chunk_size=10
+    ) as scorer:
+        scorer.__dict__["_client"] = client
+        scorer.preload(["x"], ["a"])
+        scores = scorer.scores(["x", "y"], ["a", "bb", "a"])
+        assert scores == {
+            ("x", "a"): 0.01,
+            ("x", "bb"): 0.02,
+            ("y", "a"): 0.01,
+            ("y", "bb"): 0.02,
+        }
+        # Only the unknown pairs are requested.
+        assert len(client.requests) == 2
+        assert len(client.requests[1]) == 3
+
+
+def test_quality_cache_only_fallback(tmp_path: Path) -> None:
+    client = _StandInDebaterClient()
+    with CachedDebaterArgumentQualityScorer(
+            "token", tmp_path, fallback=0.5
+    ) as scorer:
+        scorer.__dict__["_client"] = client
+        scorer.preload("topic", ["a"])
+        set_cache_only(True)
+        scores = scorer.scores("topic", ["a", "bb"])
+        assert scores == {"a": 0.01, "bb": 0.5}
+        assert len(client.requests) == 1
+        assert cache_misses()["debater/quality"] == {
+            scorer._cache.key("topic", "bb")
+        }
+
+
+def test_stance_concurrent_preload_coalesced(tmp_path: Path) -> None:
+    client = _StandInDebaterClient(delay=0.2)
+    scorers = [
+        CachedDebaterArgumentStanceScorer("token", tmp_path)
+        for _ in range(3)
+    ]
+    for scorer in scorers:
+        scorer.__dict__["_client"] = client
+    threads = [
+        Thread(target=scorer.preload, args=(["x"], ["a", "bb"]))
+        for scorer in scorers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Concurrent requests for the same pairs share a single request.
+    assert len(client.requests) == 1
+    for scorer in scorers:
+        assert scorer.scores(["x"], ["a", "bb"]) == {
+            ("x", "a"): 0.01,
+            ("x", "bb"): 0.02,
+        }
+
+
+def test_stance_concurrent_failure_raised(tmp_path: Path) -> None:
+    client = _StandInDebaterClient(fail_on="a", delay=0.2)
+    scorers = [
+        CachedDebaterArgumentStanceScorer("token", tmp_path, fallback=0.5)
+        for _ in range(2)
+    ]
+    errors: List[Exception] = []
+
+    def score(scorer: CachedDebaterArgumentStanceScorer) -> None:
+        scorer.__dict__["_client"] = client
+        try:
+            scorer.scores(["x"], ["a"])
+        except ConnectionError as error:
+            errors.append(error)
+
+    threads = [
+        Thread(target=score, args=(scorer,))
+        for scorer in scorers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Callers that waited for the failed request retry it,
+    # instead of falling back silently.
+    assert len(errors) == 2
+    assert len(client.requests) == 2
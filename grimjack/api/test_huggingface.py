@@ -0,0 +1,258 @@
+from asyncio import (
+    new_event_loop, sleep as async_sleep, Event, create_task, run, Task,
+    all_tasks, current_task
+)
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from json import dumps, loads
+from pathlib import Path
+from threading import Thread, Lock
+from time import sleep
+from typing import Iterator, List, Tuple, Dict, Callable, Awaitable
+
+from pytest import fixture, raises
+from websockets.exceptions import ConnectionClosed
+from websockets.legacy.server import serve, WebSocketServerProtocol
+
+from grimjack.api.cache import close_caches
+from grimjack.api.huggingface import (
+    CachedHuggingfaceTextGenerator, HuggingfaceTransport
+)
+from grimjack.api.rate_limit import AdaptiveRateLimiter
+
+_TEXTS = [f"text {i}" for i in range(20)]
+
+
+class _Concurrency:
+    def __init__(self):
+        self.current = 0
+        self.maximum = 0
+        self.total = 0
+        self._lock = Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.total += 1
+            self.maximum = max(self.maximum, self.current)
+
+    def __exit__(self, *_):
+        with self._lock:
+            self.current -= 1
+
+
+class _StandInHuggingfaceHandler(BaseHTTPRequestHandler):
+    concurrency = _Concurrency()
+    # Error statuses to respond with before succeeding, by text.
+    failures: Dict[str, List[int]] = {}
+    generated: List[str] = []
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        text = loads(self.rfile.read(length))["inputs"]
+        with self.concurrency:
+            sleep(0.05)
+        statuses = self.failures.get(text, [])
+        if len(statuses) > 0:
+            self.send_response(statuses.pop(0))
+            self.send_header("Retry-After", "0.2")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.generated.append(text)
+        body = dumps([{"generated_text": text.upper()}]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+@fixture
+def request_api_url() -> Iterator[str]:
+    _StandInHuggingfaceHandler.concurrency = _Concurrency()
+    _StandInHuggingfaceHandler.failures = {}
+    _StandInHuggingfaceHandler.generated = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHuggingfaceHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@contextmanager
+def _socket_server(
+        handle: Callable[[WebSocketServerProtocol], Awaitable[None]]
+) -> Iterator[str]:
+    loop = new_event_loop()
+    stopped = Event()
+    ports: List[int] = []
+
+    async def run_server():
+        async with serve(handle, "127.0.0.1", 0) as server:
+            ports.append(server.sockets[0].getsockname()[1])
+            await stopped.wait()
+
+    thread = Thread(target=loop.run_until_complete, args=(run_server(),))
+    thread.start()
+    while len(ports) == 0:
+        sleep(0.01)
+    yield f"ws://127.0.0.1:{ports[0]}"
+    loop.call_soon_threadsafe(stopped.set)
+    thread.join()
+    loop.close()
+
+
+@fixture
+def socket_url() -> Iterator[Tuple[str, _Concurrency]]:
+    concurrency = _Concurrency()
+
+    async def respond(socket: WebSocketServerProtocol, message: dict):
+        with concurrency:
+            await async_sleep(0.05)
+        await socket.send(dumps({
+            "id": message["id"],
+            "outputs": message["inputs"].upper(),
+        }))
+
+    async def handle(socket: WebSocketServerProtocol):
+        await socket.recv()  # Authorization.
+        tasks = []
+        async for data in socket:
+            tasks.append(create_task(respond(socket, loads(data))))
+
+    with _socket_server(handle) as url:
+        yield url, concurrency
+
+
+# Number of texts that are generated before the stream is dropped.
+_GENERATED_BEFORE_DROP = 3
+
+
+@fixture
+def dropping_socket_url() -> Iterator[str]:
+    async def handle(socket: WebSocketServerProtocol):
+        await socket.recv()  # Authorization.
+        received = 0
+        async for data in socket:
+            received += 1
+            if received > _GENERATED_BEFORE_DROP:
+                await socket.close()
+                return
+            message = loads(data)
+            await socket.send(dumps({
+                "id": message["id"],
+                "outputs": message["inputs"].upper(),
+            }))
+
+    with _socket_server(handle) as url:
+        yield url
+
+
+def test_request_transport(request_api_url: str, tmp_path: Path) -> None:
+    with CachedHuggingfaceTextGenerator(
+            "model", "key", tmp_path,
+            transport=HuggingfaceTransport.REQUEST,
+            max_in_flight=4,
+            api_url=request_api_url,
+            adaptive_rate_limiter=AdaptiveRateLimiter(1000),
+    ) as generator:
+        generated = generator.generate_many(_TEXTS)
+    assert generated == {text: text.upper() for text in _TEXTS}
+    concurrency = _StandInHuggingfaceHandler.concurrency
+    assert concurrency.total == len(_TEXTS)
+    assert 1 < concurrency.maximum <= 4
+    close_caches()
+
+
+def test_request_retry_interleaved(
+        request_api_url: str,
+        tmp_path: Path
+) -> None:
+    _StandInHuggingfaceHandler.failures = {
+        _TEXTS[0]: [429],
+        _TEXTS[1]: [503, 503],
+    }
+    rate_limiter = AdaptiveRateLimiter(1000)
+    with CachedHuggingfaceTextGenerator(
+            "model", "key", tmp_path,
+            max_in_flight=2,
+            api_url=request_api_url,
+            adaptive_rate_limiter=rate_limiter,
+    ) as generator:
+        generated = generator.generate_many(_TEXTS)
+    assert generated == {text: text.upper() for text in _TEXTS}
+    # The throttled texts did not block the others.
+    order = _StandInHuggingfaceHandler.generated
+    assert order.index(_TEXTS[0]) > order.index(_TEXTS[2])
+    assert order.index(_TEXTS[1]) > order.index(_TEXTS[2])
+    assert rate_limiter.requests_per_second < 1000
+    close_caches()
+
+
+def test_request_resume_pending(
+        request_api_url: str,
+        tmp_path: Path
+) -> None:
+    with CachedHuggingfaceTextGenerator(
+            "model", "key", tmp_path,
+            api_url=request_api_url,
+            adaptive_rate_limiter=AdaptiveRateLimiter(1000),
+    ) as generator:
+        # Texts of an interrupted run.
+        generator._add_pending(_TEXTS[1:6])
+        assert generator.generate(_TEXTS[0]) == _TEXTS[0].upper()
+        # Only as many pending texts are resumed as were requested.
+        generated = _StandInHuggingfaceHandler.generated
+        assert sorted(generated) == sorted([_TEXTS[0], _TEXTS[1]])
+        assert sorted(generator._pending.values()) == _TEXTS[2:6]
+
+        generator.generate_many(_TEXTS[6:10])
+        assert len(generated) == 2 + 4 + 4
+        assert len(generator._pending) == 0
+    close_caches()
+
+
+def test_socket_transport(
+        socket_url: Tuple[str, _Concurrency],
+        tmp_path: Path
+) -> None:
+    url, concurrency = socket_url
+    with CachedHuggingfaceTextGenerator(
+            "model", "key", tmp_path,
+            transport=HuggingfaceTransport.SOCKET,
+            max_in_flight=4,
+            socket_url=url,
+    ) as generator:
+        generated = generator.generate_many(_TEXTS)
+        # Generated texts are cached.
+        assert generator.generate(_TEXTS[0]) == _TEXTS[0].upper()
+    assert generated == {text: text.upper() for text in _TEXTS}
+    assert concurrency.total == len(_TEXTS)
+    assert 1 < concurrency.maximum <= 4
+    close_caches()
+
+
+def test_socket_dropped(dropping_socket_url: str, tmp_path: Path) -> None:
+    with CachedHuggingfaceTextGenerator(
+            "model", "key", tmp_path,
+            transport=HuggingfaceTransport.SOCKET,
+            max_in_flight=2,
+            socket_url=dropping_socket_url,
+    ) as generator:
+        async def preload() -> List[Task]:
+            with raises((ConnectionError, ConnectionClosed)):
+                await generator._preload_socket(_TEXTS)
+            # No texts are still being generated after the stream closed.
+            return [task for task in all_tasks() if task is not current_task()]
+
+        assert run(preload()) == []
+        # Texts generated before the stream was dropped are cached.
+        assert len(generator._unknown(_TEXTS)) == (
+                len(_TEXTS) - _GENERATED_BEFORE_DROP
+        )
+    close_caches()
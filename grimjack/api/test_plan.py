@@ -0,0 +1,62 @@
+from grimjack.api.plan import (
+    estimate_requests, DEBATER_REQUEST_SECONDS, HUGGINGFACE_REQUEST_SECONDS,
+    TRANSFORMERS_ITEM_SECONDS
+)
+
+
+def test_estimate_requests() -> None:
+    estimates = estimate_requests(
+        {
+            "targer/model": {str(i) for i in range(10)},
+            "debater/stance": {str(i) for i in range(1001)},
+            "huggingface/bigscience/T0pp": {"a", "b"},
+            "transformers/bigscience/T0pp": {"a", "b", "c"},
+        },
+        targer_passages_per_request=4,
+        debater_chunk_size=500,
+        debater_workers=2,
+    )
+    by_namespace = {estimate.namespace: estimate for estimate in estimates}
+    assert by_namespace["targer/model"].requests == 3
+    assert by_namespace["debater/stance"].requests == 3
+    assert by_namespace["debater/stance"].seconds == (
+            2 * DEBATER_REQUEST_SECONDS
+    )
+    # Both texts are generated concurrently.
+    assert by_namespace["huggingface/bigscience/T0pp"].seconds == (
+        HUGGINGFACE_REQUEST_SECONDS
+    )
+    # Local models don't make requests.
+    assert by_namespace["transformers/bigscience/T0pp"].requests == 0
+    assert by_namespace["transformers/bigscience/T0pp"].seconds == (
+            3 * TRANSFORMERS_ITEM_SECONDS
+    )
+
+
+def test_estimate_requests_rate_limit() -> None:
+    estimates = estimate_requests(
+        {"debater/quality": {str(i) for i in range(100)}},
+        debater_chunk_size=10,
+        debater_workers=10,
+        debater_rate_limit=0.5,
+    )
+    assert estimates[0].requests == 10
+    assert estimates[0].seconds == 20
+
+
+def test_estimate_requests_in_flight() -> None:
+    misses = {"huggingface/bigscience/T0pp": {str(i) for i in range(16)}}
+    for in_flight, seconds in ((1, 16), (4, 4), (8, 2), (32, 1)):
+        estimates = estimate_requests(
+            misses,
+            huggingface_in_flight=in_flight,
+        )
+        assert estimates[0].requests == 16
+        assert estimates[0].seconds == seconds * HUGGINGFACE_REQUEST_SECONDS
+    # Concurrent requests are still bound by the rate limit.
+    estimates = estimate_requests(
+        misses,
+        huggingface_rate_limit=2,
+        huggingface_in_flight=8,
+    )
+    assert estimates[0].seconds == 8
@@ -0,0 +1,65 @@
+from asyncio import run
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime
+from multiprocessing import get_context
+from pathlib import Path
+from random import Random
+from time import monotonic
+from typing import List
+
+from grimjack.api.rate_limit import (
+    AdaptiveRateLimiter, FileRateLimiter, backoff_delay, parse_retry_after
+)
+
+
+def test_backoff_delay() -> None:
+    random = Random(0)
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=1, maximum=60, random=random)
+        assert 0 <= delay <= min(60, 2 ** attempt)
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("invalid") is None
+    date = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 50 < parse_retry_after(format_datetime(date, usegmt=True)) <= 60
+
+
+def test_adaptive_rate_limiter() -> None:
+    rate_limiter = AdaptiveRateLimiter(10, increase=1, decrease=0.5)
+    rate_limiter.success()
+    assert rate_limiter.requests_per_second == 11
+    rate_limiter.throttle()
+    assert rate_limiter.requests_per_second == 5.5
+
+
+def test_adaptive_rate_limiter_concurrent_throttles() -> None:
+    rate_limiter = AdaptiveRateLimiter(1000, decrease=0.5)
+
+    async def reserve() -> List[float]:
+        return [await rate_limiter.acquire() for _ in range(4)]
+
+    reserved = run(reserve())
+    # Requests that were in flight together only decrease the rate once.
+    for time in reserved:
+        rate_limiter.throttle(reserved=time)
+    assert rate_limiter.requests_per_second == 500
+    # Requests reserved after the decrease decrease it again.
+    rate_limiter.throttle(reserved=run(reserve())[0])
+    assert rate_limiter.requests_per_second == 250
+
+
+def _acquire_file_rate_limiter(directory: Path) -> None:
+    rate_limiter = FileRateLimiter(directory, "service", 50)
+    for _ in range(10):
+        rate_limiter.acquire()
+
+
+def test_file_rate_limiter_shared_by_processes(tmp_path: Path) -> None:
+    start = monotonic()
+    with get_context("fork").Pool(4) as pool:
+        pool.map(_acquire_file_rate_limiter, [tmp_path] * 4)
+    # 40 requests at 50 requests per second, after a burst of 1 request.
+    assert monotonic() - start >= 39 / 50 * 0.9
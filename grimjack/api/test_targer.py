@@ -0,0 +1,125 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from json import dumps
+from pathlib import Path
+from re import findall, split
+from threading import Thread
+from typing import Iterator, List
+
+from pytest import fixture
+
+from grimjack.api.targer import (
+    CachedTargerArgumentAnalyzer, TargerArgumentStore
+)
+from grimjack.model.arguments import ARGUMENT_VOCABULARY
+
+_PASSAGES = [
+    "Laptops are better than desktops. They are portable.",
+    "A desktop is cheaper! You can upgrade it easily.",
+    "Gaming on a desktop PC is more fun",
+    "",
+    "Which is better? It depends on your situation.",
+]
+
+
+class _StandInTargerHandler(BaseHTTPRequestHandler):
+    requests: List[str] = []
+
+    @staticmethod
+    def _tag(token: str) -> dict:
+        label = "C-B" if len(token) > 6 else "P-I" if len(token) > 3 else "O"
+        return {"token": token, "label": label, "prob": 0.75}
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        text = self.rfile.read(length).decode("utf-8")
+        self.requests.append(text)
+        sentences = [
+            findall(r"\w+|[^\w\s]", sentence)
+            for sentence in split(r"(?<=[.!?])\s+", text.strip())
+        ]
+        body = dumps([
+            [self._tag(token) for token in sentence]
+            for sentence in sentences
+            if len(sentence) > 0
+        ]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@fixture
+def targer_api_url() -> Iterator[str]:
+    _StandInTargerHandler.requests = []
+    server = ThreadingHTTPServer(("localhost", 0), _StandInTargerHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _analyze_all(
+        targer_api_url: str,
+        cache_dir: Path,
+        max_batch_length=None,
+):
+    with CachedTargerArgumentAnalyzer(
+            targer_api_url,
+            {"tag-ibm-fasttext"},
+            cache_dir,
+            max_batch_length,
+    ) as analyzer:
+        analyzer.preload(_PASSAGES)
+        return [analyzer.analyze(passage) for passage in _PASSAGES]
+
+
+def test_batched_equals_single(targer_api_url: str, tmp_path: Path) -> None:
+    single = _analyze_all(targer_api_url, tmp_path / "single")
+    single_requests = len(_StandInTargerHandler.requests)
+    batched = _analyze_all(targer_api_url, tmp_path / "batched", 1000)
+    batched_requests = (
+            len(_StandInTargerHandler.requests) - single_requests
+    )
+    assert single == batched
+    assert single_requests == len(_PASSAGES)
+    assert batched_requests == 1
+
+
+def test_batch_length_limit(targer_api_url: str, tmp_path: Path) -> None:
+    single = _analyze_all(targer_api_url, tmp_path / "single")
+    _StandInTargerHandler.requests = []
+    batched = _analyze_all(targer_api_url, tmp_path / "batched", 120)
+    assert single == batched
+    assert 1 < len(_StandInTargerHandler.requests) < len(_PASSAGES)
+    assert all(
+        len(request) <= 120 or "GRIMJACKPASSAGESEPARATOR" not in request
+        for request in _StandInTargerHandler.requests
+    )
+
+
+def test_store_round_trip(targer_api_url: str, tmp_path: Path) -> None:
+    arguments = _analyze_all(targer_api_url, tmp_path / "cache")
+    with TargerArgumentStore(
+            tmp_path / "store",
+            {"tag-ibm-fasttext"}
+    ) as store:
+        vocabulary_size = len(ARGUMENT_VOCABULARY)
+        for i, document_arguments in enumerate(arguments):
+            assert store.missing_models(str(i)) == {"tag-ibm-fasttext"}
+            for model, sentences in document_arguments.items():
+                store.put(str(i), model, sentences)
+        # Storing doesn't add tokens to the shared vocabulary.
+        assert len(ARGUMENT_VOCABULARY) == vocabulary_size
+        assert store.get("unknown") is None
+    with TargerArgumentStore(
+            tmp_path / "store",
+            {"tag-ibm-fasttext"}
+    ) as store:
+        for i, document_arguments in enumerate(arguments):
+            assert store.missing_models(str(i)) == set()
+            assert store.get(str(i)) == document_arguments
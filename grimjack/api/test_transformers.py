@@ -0,0 +1,416 @@
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from pytest import raises, importorskip, approx, MonkeyPatch
+
+from grimjack.api.cache import planning, cache_misses, set_cache_only
+from grimjack.api.huggingface import (
+    HuggingfaceTransport, CachedHuggingfaceTextGenerator
+)
+from grimjack.model import Query
+
+# Local models need PyTorch and Huggingface Transformers.
+importorskip("torch")
+importorskip("transformers")
+from grimjack.api import transformers  # noqa: E402
+from grimjack.api.transformers import (  # noqa: E402
+    TransformersTextGenerator, text_generator,
+    CachedTransformersArgumentQualityScorer,
+    CachedTransformersArgumentStanceScorer,
+)
+from grimjack.model.quality import (  # noqa: E402
+    ArgumentQualityRankedDocument
+)
+from grimjack.modules.argument_quality_tagger import (  # noqa: E402
+    TransformersArgumentQualityTagger
+)
+from grimjack.modules.argument_quality_stance_tagger import (  # noqa: E402
+    TransformersArgumentQualityStanceTagger
+)
+
+
+class _StandInTokenizer:
+    """
+    Encode texts as character codes, padded with zeros.
+    """
+
+    def __init__(self):
+        self.padded: List[List[List[int]]] = []
+
+    def __call__(self, texts: List[str]) -> Dict[str, List[List[int]]]:
+        return {"input_ids": [[ord(char) for char in text] for text in texts]}
+
+    def pad(
+            self,
+            encodings: Dict[str, List[List[int]]],
+            padding: str,
+            return_tensors: str
+    ) -> Dict[str, List[List[int]]]:
+        assert padding == "longest"
+        length = max(len(encoding) for encoding in encodings["input_ids"])
+        padded = [
+            encoding + [0] * (length - len(encoding))
+            for encoding in encodings["input_ids"]
+        ]
+        self.padded.append(padded)
+        return {"input_ids": padded}
+
+    def batch_decode(
+            self,
+            outputs: List[List[int]],
+            skip_special_tokens: bool
+    ) -> List[str]:
+        return [
+            "".join(chr(token) for token in output if token != 0)
+            for output in outputs
+        ]
+
+
+class _StandInLanguageModel:
+    """
+    Generate upper-cased texts.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches: List[List[List[int]]] = []
+
+    def generate(
+            self,
+            input_ids: List[List[int]],
+            **_: Any
+    ) -> List[List[int]]:
+        self.batches.append(input_ids)
+        if self.fail:
+            raise ValueError("Stand-in model error.")
+        return [
+            [ord(chr(token).upper()) if token != 0 else 0 for token in ids]
+            for ids in input_ids
+        ]
+
+
+def _generator(
+        cache_dir: Path,
+        language_model: _StandInLanguageModel,
+        batch_size: int = 2,
+) -> TransformersTextGenerator:
+    generator = TransformersTextGenerator(
+        "stand-in", cache_dir=cache_dir, batch_size=batch_size
+    )
+    generator.__dict__["_tokenizer"] = _StandInTokenizer()
+    generator.__dict__["_language_model"] = language_model
+    return generator
+
+
+def test_generate_many_bucketed(tmp_path: Path) -> None:
+    language_model = _StandInLanguageModel()
+    generator = _generator(tmp_path, language_model)
+    texts = ["aaaa", "b", "cc", "ddddd", "e", "b"]
+    assert generator.generate_many(texts) == {
+        text: text.upper()
+        for text in texts
+    }
+    # Texts of similar length are generated together,
+    # padded only to the longest text in each batch.
+    assert [
+        [len(ids) for ids in batch]
+        for batch in generator._tokenizer.padded
+    ] == [[1, 1], [4, 4], [5]]
+    assert sum(len(batch) for batch in language_model.batches) == 5
+
+    # Generated texts are read from the cache, e.g., in another run.
+    other_model = _StandInLanguageModel()
+    other = _generator(tmp_path, other_model)
+    assert other.generate("ddddd") == "DDDDD"
+    assert other.generate_many(["b", "ff"]) == {"b": "B", "ff": "FF"}
+    assert other_model.batches == [[[ord("f"), ord("f")]]]
+
+
+def test_generate_failure(tmp_path: Path) -> None:
+    generator = _generator(tmp_path, _StandInLanguageModel(fail=True))
+    with raises(ValueError):
+        generator.generate("a")
+
+
+def test_generate_planning(tmp_path: Path) -> None:
+    language_model = _StandInLanguageModel()
+    generator = _generator(tmp_path, language_model)
+    with planning():
+        # Local models are not run while planning.
+        assert generator.generate("a") == ""
+        assert cache_misses()["transformers/stand-in"] == {
+            generator._cache.key("a")
+        }
+    assert language_model.batches == []
+
+
+def test_text_generator_transport(tmp_path: Path) -> None:
+    with text_generator(
+            "stand-in", None, tmp_path,
+            transport=HuggingfaceTransport.LOCAL,
+            batch_size=4,
+    ) as generator:
+        assert isinstance(generator, TransformersTextGenerator)
+        assert generator.batch_size == 4
+    with text_generator(
+            "stand-in", "token", tmp_path,
+            transport=HuggingfaceTransport.SOCKET,
+    ) as generator:
+        assert isinstance(generator, CachedHuggingfaceTextGenerator)
+        assert generator.transport == HuggingfaceTransport.SOCKET
+
+
+class _StandInPairTokenizer:
+    """
+    Pass texts (and text pairs) through to the classifier.
+    """
+
+    def __call__(
+            self,
+            texts: List[str],
+            text_pairs: Optional[List[str]] = None,
+            **_: Any
+    ) -> Dict[str, Any]:
+        return {"texts": texts, "text_pairs": text_pairs}
+
+
+class _StandInLogits:
+    def __init__(self, probabilities: List[List[float]]):
+        self.probabilities = probabilities
+
+    def softmax(self, _: int) -> "_StandInLogits":
+        return self
+
+    def tolist(self) -> List[List[float]]:
+        return self.probabilities
+
+
+class _StandInOutput:
+    def __init__(self, probabilities: List[List[float]]):
+        self.logits = _StandInLogits(probabilities)
+
+
+class _StandInConfig:
+    def __init__(self, id2label: Dict[int, str]):
+        self.id2label = id2label
+
+
+class _StandInClassifier:
+    """
+    Classify arguments by the word "because"
+    and entailment by the hypothesis' first word in the premise.
+    """
+
+    def __init__(self, id2label: Dict[int, str]):
+        self.config = _StandInConfig(id2label)
+        self.batches: List[List[str]] = []
+
+    def _probabilities(
+            self,
+            text: str,
+            text_pair: Optional[str]
+    ) -> List[float]:
+        labels = {
+            label: index
+            for index, label in self.config.id2label.items()
+        }
+        probabilities = [0.0] * len(labels)
+        if text_pair is None:
+            argument = 0.9 if "because" in text else 0.2
+            probabilities[labels["ARGUMENT"]] = argument
+            probabilities[labels["NON-ARGUMENT"]] = 1 - argument
+        elif text_pair.split()[0] in text:
+            probabilities[labels["ENTAILMENT"]] = 0.75
+            probabilities[labels["NEUTRAL"]] = 0.25
+        else:
+            probabilities[labels["CONTRADICTION"]] = 0.5
+            probabilities[labels["NEUTRAL"]] = 0.5
+        return probabilities
+
+    def __call__(
+            self,
+            texts: List[str],
+            text_pairs: Optional[List[str]]
+    ) -> _StandInOutput:
+        self.batches.append(texts)
+        if text_pairs is None:
+            text_pairs = [None] * len(texts)
+        return _StandInOutput([
+            self._probabilities(text, text_pair)
+            for text, text_pair in zip(texts, text_pairs)
+        ])
+
+
+_QUALITY_LABELS = {1: "NON-ARGUMENT", 0: "ARGUMENT"}
+_NLI_LABELS = {0: "CONTRADICTION", 1: "ENTAILMENT", 2: "NEUTRAL"}
+
+
+def _stand_in_classifier(
+        monkeypatch: MonkeyPatch,
+        id2label: Dict[int, str]
+) -> _StandInClassifier:
+    classifier = _StandInClassifier(id2label)
+
+    def _classifier(_: str, __: bool, ___: bool) -> Tuple[Any, Any]:
+        return _StandInPairTokenizer(), classifier
+
+    monkeypatch.setattr(transformers, "_classifier", _classifier)
+    return classifier
+
+
+def test_quality_scores(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    classifier = _stand_in_classifier(monkeypatch, _QUALITY_LABELS)
+    sentences = ["good because cheap", "no", "fast because new", "a b"]
+    with CachedTransformersArgumentQualityScorer(
+            "stand-in", tmp_path, batch_size=3
+    ) as scorer:
+        assert scorer.scores("topic", sentences) == approx({
+            "good because cheap": 0.9,
+            "no": 0.2,
+            "fast because new": 0.9,
+            "a b": 0.2,
+        })
+    # Sentences of similar length are classified together.
+    assert classifier.batches == [
+        ["no", "a b", "fast because new"],
+        ["good because cheap"],
+    ]
+
+    # Scores are read from the cache.
+    with CachedTransformersArgumentQualityScorer(
+            "stand-in", tmp_path
+    ) as scorer:
+        assert scorer.scores("topic", ["no", "because"]) == approx({
+            "no": 0.2,
+            "because": 0.9,
+        })
+    assert classifier.batches[2:] == [["because"]]
+
+
+def test_stance_scores(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    classifier = _stand_in_classifier(monkeypatch, _NLI_LABELS)
+    with CachedTransformersArgumentStanceScorer(
+            "stand-in", tmp_path
+    ) as scorer:
+        assert scorer.scores(
+            ["cats are good", "dogs are good"],
+            ["cats purr", "dogs bark", "cats purr"]
+        ) == approx({
+            ("cats are good", "cats purr"): 0.75,
+            ("cats are good", "dogs bark"): -0.5,
+            ("dogs are good", "cats purr"): -0.5,
+            ("dogs are good", "dogs bark"): 0.75,
+        })
+    # Each pair is classified once.
+    assert sum(len(batch) for batch in classifier.batches) == 4
+
+
+def test_scores_planning(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    classifier = _stand_in_classifier(monkeypatch, _QUALITY_LABELS)
+    with CachedTransformersArgumentQualityScorer(
+            "stand-in", tmp_path, fallback=0.5
+    ) as scorer:
+        with planning():
+            # Local models are not run while planning.
+            assert scorer.scores("topic", ["because"]) == {"because": 0.5}
+            assert cache_misses()["transformers/stand-in/quality/int8"] == {
+                scorer._cache.key("topic", "because")
+            }
+    assert classifier.batches == []
+
+
+class _StandInLoader:
+    """
+    Model that is not available locally and may not be downloaded.
+    """
+
+    def __init__(self):
+        self.local_files_only: List[bool] = []
+
+    def from_pretrained(self, model: str, local_files_only: bool) -> Any:
+        self.local_files_only.append(local_files_only)
+        if local_files_only:
+            raise OSError(f"{model} is not available locally.")
+        raise AssertionError("The model may not be downloaded.")
+
+
+def test_scores_cache_only(
+        tmp_path: Path,
+        monkeypatch: MonkeyPatch
+) -> None:
+    loader = _StandInLoader()
+    monkeypatch.setattr(transformers, "AutoTokenizer", loader)
+    monkeypatch.setattr(
+        transformers, "AutoModelForSequenceClassification", loader
+    )
+    transformers._classifier.cache_clear()
+    set_cache_only(True)
+    with CachedTransformersArgumentQualityScorer(
+            "stand-in", tmp_path, fallback=0.5
+    ) as scorer:
+        # The model is only looked up locally.
+        assert scorer.scores("topic", ["because"]) == {"because": 0.5}
+        assert cache_misses()["transformers/stand-in/quality/int8"] == {
+            scorer._cache.key("topic", "because")
+        }
+    assert loader.local_files_only == [True]
+
+
+def test_generate_cache_only(
+        tmp_path: Path,
+        monkeypatch: MonkeyPatch
+) -> None:
+    loader = _StandInLoader()
+    monkeypatch.setattr(transformers, "AutoTokenizer", loader)
+    monkeypatch.setattr(transformers, "AutoModelForSeq2SeqLM", loader)
+    set_cache_only(True)
+    generator = TransformersTextGenerator(
+        "stand-in", cache_dir=tmp_path, fallback="?"
+    )
+    # The model is only looked up locally.
+    assert generator.generate_many(["a", "b"]) == {"a": "?", "b": "?"}
+    assert cache_misses()["transformers/stand-in"] == {
+        generator._cache.key("a"), generator._cache.key("b")
+    }
+    assert loader.local_files_only == [True]
+
+
+def _document(sentences: List[str]) -> ArgumentQualityRankedDocument:
+    return ArgumentQualityRankedDocument(
+        id="doc",
+        content=" ".join(sentences),
+        fields={},
+        score=1,
+        rank=1,
+        sentences=sentences,
+        arguments={},
+        qualities=[],
+    )
+
+
+def test_taggers(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    query = Query(1, "cats or dogs", ("cats", "dogs"), "", "")
+    document = _document(["cats purr because", "dogs bark"])
+
+    _stand_in_classifier(monkeypatch, _QUALITY_LABELS)
+    quality_tagger = TransformersArgumentQualityTagger(
+        "stand-in", "non-argument", tmp_path
+    )
+    tagged = quality_tagger.tag_ranking(query, [document])[0]
+    assert [
+        (quality.content, quality.quality)
+        for quality in tagged.qualities
+    ] == [("cats purr because", approx(0.1)), ("dogs bark", approx(0.8))]
+
+    _stand_in_classifier(monkeypatch, _NLI_LABELS)
+    stance_tagger = TransformersArgumentQualityStanceTagger(
+        "stand-in", tmp_path
+    )
+    tagged = stance_tagger.tag_document(query, tagged)
+    assert [
+        (stance.content, stance.stance)
+        for stance in tagged.stances
+    ] == [
+        ("cats purr because", approx(1.25)),
+        ("dogs bark", approx(-1.25)),
+    ]
@@ -1,31 +1,405 @@
-from dataclasses import dataclass
-from functools import cached_property
-from typing import ContextManager, List, Any
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from itertools import product
+from pathlib import Path
+from typing import (
+    ContextManager, List, Any, Optional, Dict, Iterator, Union, Tuple
+)
 
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from torch import inference_mode, qint8
+from torch.ao.quantization import quantize_dynamic
+from torch.nn import Linear
+from tqdm import tqdm
+from transformers import (
+    AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForSequenceClassification
+)
+
+from grimjack.api.cache import (
+    ResultCache, CachedPairScorer, is_planning, is_cache_only
+)
+from grimjack.api.huggingface import (
+    CachedHuggingfaceTextGenerator, HuggingfaceTransport
+)
+from grimjack.api.rate_limit import RateLimiter
 
 
 @dataclass
 class TransformersTextGenerator(ContextManager):
+    """
+    Generate texts locally with a sequence-to-sequence model,
+    as an offline replacement for the Huggingface API.
+    """
     model: str
     api_key: Any = None
-    cache_dir: Any = None
+    cache_dir: Optional[Path] = None
+    # Number of texts to generate in a single forward pass.
+    batch_size: int = 16
+    # Maximum number of tokens to generate, if not the model's default.
+    max_new_tokens: Optional[int] = None
+    # Text for inputs that are not generated while planning.
+    fallback: str = ""
 
+    # In cache-only mode, models are only loaded from local files.
     @cached_property
     def _tokenizer(self):
-        return AutoTokenizer.from_pretrained(self.model)
+        return AutoTokenizer.from_pretrained(
+            self.model,
+            local_files_only=is_cache_only(),
+        )
 
     @cached_property
     def _language_model(self):
-        return AutoModelForSeq2SeqLM.from_pretrained(self.model)
+        language_model = AutoModelForSeq2SeqLM.from_pretrained(
+            self.model,
+            local_files_only=is_cache_only(),
+        )
+        language_model.eval()
+        return language_model
+
+    def _can_load(self) -> bool:
+        try:
+            return (
+                    self._tokenizer is not None and
+                    self._language_model is not None
+            )
+        except OSError:
+            if not is_cache_only():
+                raise
+            # The model is not available locally.
+            return False
+
+    _cache: ResultCache = field(init=False)
+
+    def _unknown(self, texts: List[str]) -> List[str]:
+        keys = {text: self._cache.key(text) for text in texts}
+        known = self._cache.get_many(keys)
+        return [text for text in keys.keys() if text not in known]
+
+    def _batches(
+            self,
+            texts: List[str]
+    ) -> Iterator[Tuple[List[List[int]], List[int]]]:
+        # Bucket texts of similar length, so that batches need less padding.
+        encodings: List[List[int]] = self._tokenizer(texts)["input_ids"]
+        indices = sorted(
+            range(len(texts)),
+            key=lambda index: len(encodings[index])
+        )
+        for start in range(0, len(indices), self.batch_size):
+            batch = indices[start:start + self.batch_size]
+            yield [encodings[index] for index in batch], batch
+
+    def _generate_batch(self, encodings: List[List[int]]) -> List[str]:
+        # Pad only to the longest text in the batch.
+        inputs = self._tokenizer.pad(
+            {"input_ids": encodings},
+            padding="longest",
+            return_tensors="pt",
+        )
+        with inference_mode():
+            if self.max_new_tokens is not None:
+                outputs = self._language_model.generate(
+                    **inputs,
+                    max_new_tokens=self.max_new_tokens,
+                )
+            else:
+                outputs = self._language_model.generate(**inputs)
+        return self._tokenizer.batch_decode(
+            outputs,
+            skip_special_tokens=True,
+        )
 
     def preload(self, texts: List[str]) -> None:
-        pass
+        # Texts we haven't generated yet.
+        unknown = self._unknown(texts)
+        if len(unknown) == 0:
+            return
+        if is_planning() or not self._can_load():
+            self._cache.record_misses(
+                self._cache.key(text)
+                for text in unknown
+            )
+            return
+        # In cache-only mode, the model is only loaded from local files,
+        # so texts are generated without calling external services.
+        with self._cache.single_flight({
+            text: self._cache.key(text)
+            for text in unknown
+        }) as claimed:
+            if len(claimed) == 0:
+                return
+            progress = tqdm(
+                total=len(claimed),
+                desc=f"Generating texts with {self.model}",
+                unit="texts"
+            )
+            for encodings, batch in self._batches(claimed):
+                generated = self._generate_batch(encodings)
+                self._cache.set_many(
+                    (self._cache.key(claimed[index]), generated_text)
+                    for index, generated_text in zip(batch, generated)
+                )
+                progress.update(len(batch))
+            progress.close()
 
     def generate(self, text: str) -> str:
-        inputs = self._tokenizer.encode(text, return_tensors="pt")
-        outputs = self._language_model.generate(inputs)
-        return self._tokenizer.decode(outputs[0])
+        return self.generate_many([text])[text]
+
+    def generate_many(self, texts: List[str]) -> Dict[str, str]:
+        keys = {text: self._cache.key(text) for text in texts}
+        generated = self._cache.get_or_fetch_many(keys, self.preload)
+        if len(generated) < len(keys):
+            # Texts are only missing while planning
+            # or if the model is not available locally in cache-only mode.
+            generated.update({
+                text: self.fallback
+                for text in keys.keys()
+                if text not in generated
+            })
+        return generated
+
+    def __post_init__(self):
+        self._cache = ResultCache("transformers", self.model, self.cache_dir)
 
     def __exit__(self, exc_type, exc_value, traceback):
         return None
+
+
+TextGenerator = Union[
+    CachedHuggingfaceTextGenerator,
+    TransformersTextGenerator,
+]
+
+
+@contextmanager
+def text_generator(
+        model: str,
+        api_key: Optional[str],
+        cache_dir: Optional[Path] = None,
+        transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST,
+        max_in_flight: int = 8,
+        rate_limiter: Optional[RateLimiter] = None,
+        batch_size: int = 16,
+) -> TextGenerator:
+    """
+    Open a text generator for the model,
+    either locally or with the Huggingface API.
+    """
+    generator: TextGenerator
+    if transport == HuggingfaceTransport.LOCAL:
+        generator = TransformersTextGenerator(
+            model=model,
+            cache_dir=cache_dir,
+            batch_size=batch_size,
+        )
+    else:
+        generator = CachedHuggingfaceTextGenerator(
+            model=model,
+            api_key=api_key,
+            cache_dir=cache_dir,
+            transport=transport,
+            max_in_flight=max_in_flight,
+            rate_limiter=rate_limiter,
+        )
+    with generator:
+        yield generator
+
+
+@lru_cache(maxsize=None)
+def _classifier(
+        model: str,
+        quantize: bool,
+        local_files_only: bool = False
+) -> Tuple[Any, Any]:
+    """
+    Load a sequence classification model only once per process,
+    with linear layers quantized to 8-bit integers for faster CPU inference.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(
+        model,
+        local_files_only=local_files_only,
+    )
+    classifier = AutoModelForSequenceClassification.from_pretrained(
+        model,
+        local_files_only=local_files_only,
+    )
+    classifier.eval()
+    if quantize:
+        classifier = quantize_dynamic(classifier, {Linear}, dtype=qint8)
+    return tokenizer, classifier
+
+
+@dataclass
+class _CachedTransformersScorer(CachedPairScorer, ContextManager, ABC):
+    model: str
+    cache_dir: Optional[Path] = None
+    # Number of topic-sentence pairs to classify in a single forward pass.
+    batch_size: int = 64
+    quantize: bool = True
+    # Score for pairs that are not classified while planning.
+    fallback: float = 0
+
+    @property
+    @abstractmethod
+    def _cache_name(self) -> str:
+        pass
+
+    @abstractmethod
+    def _encode(self, tokenizer, pairs: List[Tuple[str, str]]) -> Any:
+        pass
+
+    @abstractmethod
+    def _label_score(
+            self,
+            probabilities: List[float],
+            labels: Dict[str, int]
+    ) -> float:
+        pass
+
+    _cache: ResultCache = field(init=False)
+
+    def _classify(
+            self,
+            tokenizer,
+            classifier,
+            pairs: List[Tuple[str, str]]
+    ) -> List[float]:
+        labels = {
+            label.lower(): index
+            for index, label in classifier.config.id2label.items()
+        }
+        # Bucket pairs of similar length, so that batches need less padding.
+        indices = sorted(
+            range(len(pairs)),
+            key=lambda index: len(pairs[index][0]) + len(pairs[index][1])
+        )
+        scores: List[float] = [0] * len(pairs)
+        for start in range(0, len(indices), self.batch_size):
+            batch = indices[start:start + self.batch_size]
+            inputs = self._encode(tokenizer, [pairs[index] for index in batch])
+            with inference_mode():
+                probabilities = classifier(**inputs).logits.softmax(-1)
+            for index, pair_probabilities in zip(
+                    batch, probabilities.tolist()
+            ):
+                scores[index] = self._label_score(pair_probabilities, labels)
+        return scores
+
+    def _can_score(self) -> bool:
+        # In cache-only mode, the model is only loaded from local files,
+        # so pairs are scored without calling external services.
+        # Pairs are never scored while planning.
+        return not is_planning()
+
+    def _preload_claimed(self, unknown: List[Tuple[str, str]]) -> None:
+        try:
+            tokenizer, classifier = _classifier(
+                self.model,
+                self.quantize,
+                is_cache_only(),
+            )
+        except OSError:
+            if not is_cache_only():
+                raise
+            # The model is not available locally.
+            self._cache.record_misses(
+                self._cache.key(topic, sentence)
+                for topic, sentence in unknown
+            )
+            return
+        self._cache.set_many(
+            (self._cache.key(topic, sentence), score)
+            for (topic, sentence), score in zip(
+                unknown, self._classify(tokenizer, classifier, unknown)
+            )
+        )
+
+    def __post_init__(self):
+        model = f"{self.model}/{self._cache_name}"
+        if self.quantize:
+            model += "/int8"
+        self._cache = ResultCache("transformers", model, self.cache_dir)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+@dataclass
+class CachedTransformersArgumentQualityScorer(_CachedTransformersScorer):
+    """
+    Score argument quality by the probability of the given label
+    from a sentence classification model, e.g., for argument detection.
+    """
+    model: str = "chkla/roberta-argument"
+    label: str = "argument"
+
+    @property
+    def _cache_name(self) -> str:
+        return "quality"
+
+    def _encode(self, tokenizer, pairs: List[Tuple[str, str]]) -> Any:
+        return tokenizer(
+            [sentence for _, sentence in pairs],
+            padding="longest",
+            truncation=True,
+            return_tensors="pt",
+        )
+
+    def _label_score(
+            self,
+            probabilities: List[float],
+            labels: Dict[str, int]
+    ) -> float:
+        return probabilities[labels[self.label]]
+
+    def scores(self, topic: str, sentences: List[str]) -> Dict[str, float]:
+        scores = self._scores([(topic, sentence) for sentence in sentences])
+        return {
+            sentence: score
+            for (_, sentence), score in scores.items()
+        }
+
+
+@dataclass
+class CachedTransformersArgumentStanceScorer(_CachedTransformersScorer):
+    """
+    Score the stance of sentences towards claims with a natural language
+    inference model, from -1 (contradiction) to 1 (entailment).
+    """
+    model: str = "cross-encoder/nli-distilroberta-base"
+
+    @property
+    def _cache_name(self) -> str:
+        return "stance"
+
+    def _encode(self, tokenizer, pairs: List[Tuple[str, str]]) -> Any:
+        # The sentence is the premise and the claim is the hypothesis.
+        return tokenizer(
+            [sentence for _, sentence in pairs],
+            [claim for claim, _ in pairs],
+            padding="longest",
+            truncation=True,
+            return_tensors="pt",
+        )
+
+    def _label_score(
+            self,
+            probabilities: List[float],
+            labels: Dict[str, int]
+    ) -> float:
+        return (
+                probabilities[labels["entailment"]] -
+                probabilities[labels["contradiction"]]
+        )
+
+    def scores(
+            self,
+            topics: List[str],
+            sentences: List[str]
+    ) -> Dict[Tuple[str, str], float]:
+        return self._scores(list(product(
+            dict.fromkeys(topics),
+            dict.fromkeys(sentences),
+        )))
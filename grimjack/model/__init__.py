@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, List
 
 
 @dataclass
@@ -22,3 +22,5 @@ class Document:
 class RankedDocument(Document):
     score: float
     rank: int
+    # Sentences of the content, segmented once after retrieval.
+    sentences: List[str]
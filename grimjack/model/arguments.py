@@ -1,11 +1,176 @@
 from dataclasses import dataclass
+from functools import cached_property
+from threading import Lock
+from typing import List, Dict, Sequence, Union, Iterator, Iterable, Tuple
 
-from targer_api import ArgumentModelSentences
+from numpy import ndarray, array, arange, uint8, uint32, float32, diff
+from targer_api import (
+    ArgumentModelSentences, ArgumentSentences, ArgumentSentence,
+    ArgumentTag, ArgumentLabel
+)
 
 from grimjack.model import RankedDocument
 
+ARGUMENT_LABELS: List[ArgumentLabel] = list(ArgumentLabel)
+ARGUMENT_LABEL_CODES: Dict[ArgumentLabel, int] = {
+    label: code
+    for code, label in enumerate(ARGUMENT_LABELS)
+}
+
+
+class ArgumentVocabulary:
+    """
+    Vocabulary of argument tokens, shared by all packed sentences.
+    """
+    _ids: Dict[str, int]
+    _tokens: List[str]
+    _lock: Lock
+
+    def __init__(self):
+        self._ids = {}
+        self._tokens = []
+        self._lock = Lock()
+
+    def id(self, token: str) -> int:
+        token_id = self._ids.get(token)
+        if token_id is not None:
+            return token_id
+        with self._lock:
+            # Another thread might have added the token in the meantime.
+            token_id = self._ids.get(token)
+            if token_id is None:
+                token_id = len(self._tokens)
+                self._tokens.append(token)
+                self._ids[token] = token_id
+            return token_id
+
+    def token(self, token_id: int) -> str:
+        return self._tokens[token_id]
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+
+ARGUMENT_VOCABULARY = ArgumentVocabulary()
+
+
+@dataclass(eq=False)
+class PackedArgumentSentences(Sequence[ArgumentSentence]):
+    """
+    Tagged argument sentences packed into flat arrays.
+    The tokens of sentence i are stored between offsets i and i + 1.
+    Probabilities are stored with single precision.
+    Can be used like a list of argument sentences,
+    which are converted to tag objects lazily.
+    """
+    token_ids: ndarray
+    labels: ndarray
+    probabilities: ndarray
+    sentence_offsets: ndarray
+    vocabulary: ArgumentVocabulary = ARGUMENT_VOCABULARY
+
+    @staticmethod
+    def from_tags(
+            sentences: Iterable[Iterable[Tuple[str, ArgumentLabel, float]]],
+            vocabulary: ArgumentVocabulary = ARGUMENT_VOCABULARY,
+    ) -> "PackedArgumentSentences":
+        token_ids: List[int] = []
+        labels: List[int] = []
+        probabilities: List[float] = []
+        sentence_offsets: List[int] = [0]
+        for sentence in sentences:
+            for token, label, probability in sentence:
+                token_ids.append(vocabulary.id(token))
+                labels.append(ARGUMENT_LABEL_CODES[label])
+                probabilities.append(probability)
+            sentence_offsets.append(len(token_ids))
+        return PackedArgumentSentences(
+            token_ids=array(token_ids, dtype=uint32),
+            labels=array(labels, dtype=uint8),
+            probabilities=array(probabilities, dtype=float32),
+            sentence_offsets=array(sentence_offsets, dtype=uint32),
+            vocabulary=vocabulary,
+        )
+
+    @staticmethod
+    def from_sentences(
+            sentences: ArgumentSentences,
+            vocabulary: ArgumentVocabulary = ARGUMENT_VOCABULARY,
+    ) -> "PackedArgumentSentences":
+        if isinstance(sentences, PackedArgumentSentences):
+            return sentences
+        return PackedArgumentSentences.from_tags(
+            (
+                (
+                    (tag.token, tag.label, tag.probability)
+                    for tag in sentence
+                )
+                for sentence in sentences
+            ),
+            vocabulary,
+        )
+
+    @property
+    def tokens(self) -> List[str]:
+        return [
+            self.vocabulary.token(token_id)
+            for token_id in self.token_ids.tolist()
+        ]
+
+    @property
+    def sentence_ids(self) -> ndarray:
+        """
+        Index of the sentence of each token.
+        """
+        lengths = diff(self.sentence_offsets)
+        return arange(len(lengths)).repeat(lengths)
+
+    @cached_property
+    def sentences(self) -> ArgumentSentences:
+        tokens = self.tokens
+        labels = self.labels.tolist()
+        probabilities = self.probabilities.tolist()
+        offsets = self.sentence_offsets.tolist()
+        return [
+            [
+                ArgumentTag(
+                    ARGUMENT_LABELS[labels[i]],
+                    probabilities[i],
+                    tokens[i],
+                )
+                for i in range(start, end)
+            ]
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+    def __getitem__(self, index):
+        return self.sentences[index]
+
+    def __len__(self) -> int:
+        return len(self.sentence_offsets) - 1
+
+    def __iter__(self) -> Iterator[ArgumentSentence]:
+        return iter(self.sentences)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+
+PackedArgumentModelSentences = Dict[str, PackedArgumentSentences]
+
+
+def pack_arguments(
+        arguments: ArgumentModelSentences
+) -> PackedArgumentModelSentences:
+    return {
+        model: PackedArgumentSentences.from_sentences(sentences)
+        for model, sentences in arguments.items()
+    }
+
 
 @dataclass
 class ArgumentRankedDocument(RankedDocument):
     # Store tagged sentences per TARGER model.
-    arguments: ArgumentModelSentences
+    arguments: Union[ArgumentModelSentences, PackedArgumentModelSentences]
@@ -1,11 +1,51 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import Iterable, Dict, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace, is_dataclass, fields
+from enum import Enum
+from functools import cached_property
+from hashlib import md5
+from json import dumps
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Dict, Tuple, Optional, List, Any
 
+from numpy import (
+    ndarray, zeros, array, isnan, sign, nan, ones, logical_and, eye,
+    flatnonzero, ix_, where, unique, argsort, empty, arange, uint32
+)
+
+from diskcache import Cache
+
+from grimjack.api.cache import open_cache, md5_hash, get_many, set_many
 from grimjack.model import RankedDocument, Query
+from grimjack.model.arguments import PackedArgumentSentences
+from grimjack.model.axiom.utils import strictly_greater
 from grimjack.modules import RerankingContext
 
 
+@dataclass
+class EvaluationStatistics:
+    # Preferences of aggregated axioms that were computed or skipped,
+    # counted by axiom and pair of documents.
+    evaluated: int = 0
+    skipped: int = 0
+
+
+_statistics = EvaluationStatistics()
+_statistics_lock = Lock()
+
+
+def evaluation_statistics() -> EvaluationStatistics:
+    with _statistics_lock:
+        return replace(_statistics)
+
+
+def _record_evaluations(evaluated: int, skipped: int) -> None:
+    with _statistics_lock:
+        _statistics.evaluated += evaluated
+        _statistics.skipped += skipped
+
+
 class Axiom(ABC):
 
     @abstractmethod
@@ -18,6 +58,60 @@ class Axiom(ABC):
     ) -> float:
         pass
 
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        """
+        Preferences for all pairs of documents, as an n×n matrix.
+        Preferences are assumed to be antisymmetric.
+        """
+        matrix = zeros((len(documents), len(documents)))
+        for i, document1 in enumerate(documents):
+            for j in range(i + 1, len(documents)):
+                preference = self.preference(
+                    context,
+                    query,
+                    document1,
+                    documents[j]
+                )
+                matrix[i, j] = preference
+                matrix[j, i] = -preference
+        return matrix
+
+    @property
+    def cost(self) -> float:
+        """
+        Relative cost of computing preferences, to evaluate cheap axioms first.
+        """
+        return 1
+
+    @property
+    def bound(self) -> float:
+        """
+        Upper bound of the absolute preference.
+        """
+        return 1
+
+    def preference_sign(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document1: RankedDocument,
+            document2: RankedDocument
+    ) -> float:
+        return sign(self.preference(context, query, document1, document2))
+
+    def preference_sign_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        return sign(self.preference_matrix(context, query, documents))
+
     def weighted(self, weight: float) -> "Axiom":
         return WeightedAxiom(self, weight)
 
@@ -33,8 +127,121 @@ class Axiom(ABC):
     def normalized(self) -> "Axiom":
         return NormalizedAxiom(self)
 
-    def cached(self) -> "Axiom":
-        return CachedAxiom(self)
+    def cached(
+            self,
+            cache_dir: Optional[Path] = None,
+            max_size: int = 100_000,
+    ) -> "Axiom":
+        return CachedAxiom(self, cache_dir, max_size)
+
+    def __repr__(self) -> str:
+        # Axioms without parameters are identified by their type.
+        return f"{type(self).__name__}()"
+
+
+class FeatureAxiom(Axiom, ABC):
+    """
+    Axiom that compares a feature of both documents.
+    Features are extracted only once per query and document.
+    """
+
+    _feature_query: Optional[Query] = None
+    _features: Dict[str, Optional[float]]
+
+    @abstractmethod
+    def feature(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document: RankedDocument
+    ) -> Optional[float]:
+        """
+        Extract the document's feature, or None if the axiom does not apply.
+        """
+        pass
+
+    def applicable(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document1: RankedDocument,
+            document2: RankedDocument
+    ) -> bool:
+        return True
+
+    def applicable_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        return ones((len(documents), len(documents)), dtype=bool)
+
+    def compare(self, feature1: float, feature2: float) -> float:
+        return strictly_greater(feature1, feature2)
+
+    def compare_matrix(self, features: ndarray) -> ndarray:
+        return sign(features[:, None] - features[None, :])
+
+    def _query_features(self, query: Query) -> Dict[str, Optional[float]]:
+        # Only keep the features for the current query.
+        if self._feature_query != query:
+            self._feature_query = query
+            self._features = {}
+        return self._features
+
+    def cached_feature(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document: RankedDocument
+    ) -> Optional[float]:
+        features = self._query_features(query)
+        if document.id not in features:
+            features[document.id] = self.feature(
+                context,
+                query,
+                document
+            )
+        return features[document.id]
+
+    def preference(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document1: RankedDocument,
+            document2: RankedDocument
+    ) -> float:
+        if not self.applicable(context, query, document1, document2):
+            return 0
+        feature1 = self.cached_feature(context, query, document1)
+        feature2 = self.cached_feature(context, query, document2)
+        if feature1 is None or feature2 is None:
+            return 0
+        return self.compare(feature1, feature2)
+
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        features = [
+            self.cached_feature(context, query, document)
+            for document in documents
+        ]
+        vector = array(
+            [nan if feature is None else feature for feature in features],
+            dtype=float
+        )
+        known = ~isnan(vector)
+        mask = logical_and(
+            self.applicable_matrix(context, query, documents),
+            known[:, None] & known[None, :]
+        )
+        matrix = zeros((len(documents), len(documents)))
+        matrix[mask] = self.compare_matrix(vector)[mask]
+        return matrix
 
 
 @dataclass
@@ -42,6 +249,14 @@ class WeightedAxiom(Axiom):
     axiom: Axiom
     weight: float
 
+    @property
+    def cost(self) -> float:
+        return self.axiom.cost
+
+    @property
+    def bound(self) -> float:
+        return abs(self.weight) * self.axiom.bound
+
     def preference(
             self,
             context: RerankingContext,
@@ -56,11 +271,43 @@ class WeightedAxiom(Axiom):
             document2
         )
 
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        return self.weight * self.axiom.preference_matrix(
+            context,
+            query,
+            documents
+        )
+
 
 @dataclass
 class AggregatedAxiom(Axiom):
+    """
+    Sum the preferences of all axioms.
+    If only the sign is needed, cheap axioms are evaluated first
+    and evaluation stops once the remaining axioms
+    cannot change the sign anymore.
+    """
     axioms: Iterable[Axiom]
 
+    @property
+    def cost(self) -> float:
+        return sum(axiom.cost for axiom in self.axioms)
+
+    @property
+    def bound(self) -> float:
+        return sum(axiom.bound for axiom in self.axioms)
+
+    def _evaluation_order(self) -> List[Axiom]:
+        return sorted(
+            self.axioms,
+            key=lambda axiom: (axiom.cost, -axiom.bound)
+        )
+
     def preference(
             self,
             context: RerankingContext,
@@ -73,11 +320,82 @@ class AggregatedAxiom(Axiom):
             for axiom in self.axioms
         )
 
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        matrix = zeros((len(documents), len(documents)))
+        for axiom in self.axioms:
+            matrix += axiom.preference_matrix(context, query, documents)
+        return matrix
+
+    def preference_sign(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document1: RankedDocument,
+            document2: RankedDocument
+    ) -> float:
+        axioms = self._evaluation_order()
+        remaining = sum(axiom.bound for axiom in axioms)
+        preference = 0.0
+        evaluated = 0
+        for axiom in axioms:
+            if abs(preference) > remaining:
+                break
+            preference += axiom.preference(
+                context,
+                query,
+                document1,
+                document2
+            )
+            remaining -= axiom.bound
+            evaluated += 1
+        _record_evaluations(evaluated, len(axioms) - evaluated)
+        return sign(preference)
+
+    def preference_sign_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        axioms = self._evaluation_order()
+        remaining = sum(axiom.bound for axiom in axioms)
+        matrix = zeros((len(documents), len(documents)))
+        undecided = ~eye(len(documents), dtype=bool)
+        pairs = len(documents) * (len(documents) - 1) // 2
+        evaluated = 0
+        for axiom in axioms:
+            # Only compare documents with an undecided pair.
+            indices = flatnonzero(undecided.any(axis=1))
+            if len(indices) == 0:
+                break
+            subset = ix_(indices, indices)
+            preferences = axiom.preference_matrix(
+                context,
+                query,
+                [documents[index] for index in indices]
+            )
+            matrix[subset] += where(undecided[subset], preferences, 0)
+            evaluated += int(undecided.sum()) // 2
+            remaining -= axiom.bound
+            # Allow for rounding errors of the remaining bound.
+            undecided &= abs(matrix) <= remaining + 1e-9
+        _record_evaluations(evaluated, pairs * len(axioms) - evaluated)
+        return sign(matrix)
+
 
 @dataclass
 class NormalizedAxiom(Axiom):
     axiom: Axiom
 
+    @property
+    def cost(self) -> float:
+        return self.axiom.cost
+
     def preference(
             self,
             context: RerankingContext,
@@ -85,7 +403,7 @@ class NormalizedAxiom(Axiom):
             document1: RankedDocument,
             document2: RankedDocument
     ) -> float:
-        preference = self.axiom.preference(
+        preference = self.axiom.preference_sign(
             context,
             query,
             document1,
@@ -98,16 +416,180 @@ class NormalizedAxiom(Axiom):
         else:
             return 0
 
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        return self.axiom.preference_sign_matrix(context, query, documents)
+
+
+def _packed_fingerprint(sentences: PackedArgumentSentences) -> str:
+    # Vocabulary IDs depend on the order in which tokens were first seen,
+    # so renumber the tokens by their sorted strings before hashing.
+    # The tags are never unpacked.
+    token_ids, inverse = unique(sentences.token_ids, return_inverse=True)
+    tokens = [
+        sentences.vocabulary.token(token_id)
+        for token_id in token_ids.tolist()
+    ]
+    order = argsort(array(tokens, dtype=object), kind="stable")
+    ranks = empty(len(order), dtype=uint32)
+    ranks[order] = arange(len(order), dtype=uint32)
+    digest = md5()
+    digest.update("\0".join(tokens[index] for index in order).encode())
+    for packed in (
+            ranks[inverse.reshape(-1)],
+            sentences.labels,
+            sentences.probabilities,
+            sentences.sentence_offsets,
+    ):
+        digest.update(packed.tobytes())
+    return digest.hexdigest()
+
+
+def _stable_data(value: Any) -> Any:
+    """
+    JSON data of the value that is the same in every process,
+    e.g., argument tags by token instead of by vocabulary ID.
+    """
+    if isinstance(value, PackedArgumentSentences):
+        return {
+            "type": type(value).__name__,
+            "md5": _packed_fingerprint(value),
+        }
+    if is_dataclass(value):
+        return {
+            "type": type(value).__name__,
+            **{
+                value_field.name: _stable_data(
+                    getattr(value, value_field.name)
+                )
+                for value_field in fields(value)
+            },
+        }
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, dict):
+        return {str(key): _stable_data(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stable_data(item) for item in value]
+    return value
+
+
+# Fingerprints by the ID of the document.
+# Documents are kept with their fingerprint, so that their ID is not reused.
+_fingerprints: "OrderedDict[int, Tuple[RankedDocument, str]]" = OrderedDict()
+_fingerprints_lock = Lock()
+_MAX_FINGERPRINTS = 10_000
+
 
 @dataclass
 class CachedAxiom(Axiom):
+    """
+    Cache preferences by query, axiom configuration and document pair.
+    Documents are identified by their contents, including rank and tags,
+    because preferences also depend on, e.g., tagged argument quality.
+    The most recently used preferences are kept in memory and,
+    if a cache directory is given, on disk.
+    """
     axiom: Axiom
-    _cache: Dict[Tuple[str, str], float] = field(
-        default_factory=lambda: {},
+    cache_dir: Optional[Path] = None
+    # Maximum number of preferences to keep in memory.
+    max_size: int = 100_000
+    # Maximum size of preferences on disk, in bytes.
+    max_disk_size: int = 2 ** 30
+
+    _memory: "OrderedDict[str, float]" = field(
+        default_factory=OrderedDict,
         init=False,
         repr=False
     )
 
+    @property
+    def cost(self) -> float:
+        return self.axiom.cost
+
+    @property
+    def bound(self) -> float:
+        return self.axiom.bound
+
+    @cached_property
+    def _disk(self) -> Optional[Cache]:
+        if self.cache_dir is None:
+            return None
+        return open_cache(
+            self.cache_dir / "preferences",
+            eviction_policy="least-recently-used",
+            size_limit=self.max_disk_size,
+        )
+
+    @cached_property
+    def _configuration(self) -> str:
+        return md5_hash(repr(self.axiom))
+
+    def _prefix(self, query: Query) -> str:
+        return f"{self._configuration}/{md5_hash(repr(query))}"
+
+    @staticmethod
+    def _fingerprint(document: RankedDocument) -> str:
+        with _fingerprints_lock:
+            entry = _fingerprints.get(id(document))
+            if entry is not None and entry[0] is document:
+                _fingerprints.move_to_end(id(document))
+                return entry[1]
+        fingerprint = md5_hash(dumps(
+            _stable_data(document),
+            sort_keys=True,
+            default=str
+        ))
+        with _fingerprints_lock:
+            _fingerprints[id(document)] = (document, fingerprint)
+            while len(_fingerprints) > _MAX_FINGERPRINTS:
+                _fingerprints.popitem(last=False)
+        return fingerprint
+
+    @staticmethod
+    def _key(
+            prefix: str,
+            fingerprint1: str,
+            fingerprint2: str
+    ) -> Tuple[str, int]:
+        # Preferences are antisymmetric, so store only one orientation.
+        if fingerprint1 <= fingerprint2:
+            return f"{prefix}/{fingerprint1}-{fingerprint2}", 1
+        else:
+            return f"{prefix}/{fingerprint2}-{fingerprint1}", -1
+
+    def _get_many(self, keys: Dict[str, str]) -> Dict[str, float]:
+        preferences: Dict[str, float] = {}
+        for key in keys.keys():
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                preferences[key] = self._memory[key]
+        if self._disk is not None and len(preferences) < len(keys):
+            found = get_many(self._disk, {
+                key: key
+                for key in keys.keys()
+                if key not in preferences
+            })
+            self._remember(found.items())
+            preferences.update(found)
+        return preferences
+
+    def _remember(self, items: Iterable[Tuple[str, float]]) -> None:
+        for key, preference in items:
+            self._memory[key] = preference
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _set_many(self, items: Dict[str, float]) -> None:
+        self._remember(items.items())
+        if self._disk is not None:
+            set_many(self._disk, items.items())
+
     def preference(
             self,
             context: RerankingContext,
@@ -115,23 +597,61 @@ class CachedAxiom(Axiom):
             document1: RankedDocument,
             document2: RankedDocument
     ) -> float:
-        if (document1.id, document2.id) in self._cache:
-            return self._cache[document1.id, document2.id]
-        elif (document2.id, document1.id) in self._cache:
-            return -self._cache[document2.id, document1.id]
-        else:
-            preference = self.axiom.preference(
-                context,
-                query,
-                document1,
-                document2
-            )
-            self._cache[document1.id, document2.id] = preference
-            return preference
+        key, orientation = self._key(
+            self._prefix(query),
+            self._fingerprint(document1),
+            self._fingerprint(document2)
+        )
+        preferences = self._get_many({key: key})
+        if key in preferences:
+            return orientation * preferences[key]
+        preference = self.axiom.preference(
+            context,
+            query,
+            document1,
+            document2
+        )
+        self._set_many({key: orientation * preference})
+        return preference
+
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        prefix = self._prefix(query)
+        fingerprints = [
+            self._fingerprint(document)
+            for document in documents
+        ]
+        pairs = {
+            (i, j): self._key(prefix, fingerprints[i], fingerprints[j])
+            for i in range(len(documents))
+            for j in range(i + 1, len(documents))
+        }
+        preferences = self._get_many({key: key for key, _ in pairs.values()})
+        if len(preferences) < len(pairs):
+            matrix = self.axiom.preference_matrix(context, query, documents)
+            self._set_many({
+                key: orientation * float(matrix[i, j])
+                for (i, j), (key, orientation) in pairs.items()
+            })
+            return matrix
+        matrix = zeros((len(documents), len(documents)))
+        for (i, j), (key, orientation) in pairs.items():
+            matrix[i, j] = orientation * preferences[key]
+            matrix[j, i] = -matrix[i, j]
+        return matrix
 
 
 class OriginalAxiom(Axiom):
 
+    @property
+    def cost(self) -> float:
+        # Ranks are known already.
+        return 0
+
     def preference(
             self,
             context: RerankingContext,
@@ -145,3 +665,13 @@ class OriginalAxiom(Axiom):
             return -1
         else:
             return 0
+
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        ranks = array([document.rank for document in documents])
+        # Prefer lower ranks.
+        return sign(ranks[None, :] - ranks[:, None]).astype(float)
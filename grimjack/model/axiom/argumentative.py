@@ -1,31 +1,77 @@
+from abc import ABC
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from statistics import mean
-from typing import List
+from threading import Lock
+from typing import List, Optional, Dict, Iterator, Tuple
 
-from nltk import WordNetLemmatizer, sent_tokenize, word_tokenize
+from nltk import WordNetLemmatizer, word_tokenize
+from numpy import (
+    isin, count_nonzero, unique, cumsum, concatenate, ndarray, sign
+)
 from targer_api import ArgumentSentences, ArgumentLabel, ArgumentTag
 
 from grimjack.model import RankedDocument, Query
-from grimjack.model.arguments import ArgumentRankedDocument
-from grimjack.model.axiom import Axiom
+from grimjack.model.arguments import (
+    ArgumentRankedDocument, PackedArgumentSentences, ARGUMENT_LABEL_CODES,
+    ARGUMENT_LABELS
+)
+from grimjack.model.axiom import FeatureAxiom
 from grimjack.model.axiom.utils import (
-    approximately_same_length, strictly_greater
+    approximately_same_length, strictly_greater, strictly_less,
+    approximately_same_length_matrix
 )
 from grimjack.model.quality import ArgumentQualityRankedDocument
 from grimjack.modules import RerankingContext
 from grimjack.utils.nltk import download_nltk_dependencies
 
 
-def _lemmatize(word: str):
+@lru_cache(maxsize=None)
+def _lemmatizer() -> WordNetLemmatizer:
     download_nltk_dependencies("wordnet")
-    _word_net_lemmatizer = WordNetLemmatizer()
-    return _word_net_lemmatizer.lemmatize(word).lower()
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=None)
+def _lemmatize(word: str) -> str:
+    return _lemmatizer().lemmatize(word).lower()
 
 
 def _count_arguments(sentences: ArgumentSentences) -> int:
     return _count_claims(sentences) + _count_premises(sentences)
 
 
+_CLAIM_LABEL_CODES = [
+    ARGUMENT_LABEL_CODES[label]
+    for label in (
+        ArgumentLabel.C_B,
+        ArgumentLabel.C_I,
+        ArgumentLabel.MC_B,
+        ArgumentLabel.MC_I,
+    )
+]
+
+
+def _count_premises_packed(sentences: PackedArgumentSentences) -> int:
+    return count_nonzero(
+        (sentences.labels == ARGUMENT_LABEL_CODES[ArgumentLabel.P_B]) &
+        (sentences.probabilities > 0.5)
+    )
+
+
+def _count_claims_packed(sentences: PackedArgumentSentences) -> int:
+    # Count runs of consecutive claim tokens (across sentences)
+    # that contain at least one confident claim token.
+    is_claim = isin(sentences.labels, _CLAIM_LABEL_CODES)
+    run_starts = is_claim & ~concatenate(([False], is_claim[:-1]))
+    run_ids = cumsum(run_starts)
+    return len(unique(run_ids[is_claim & (sentences.probabilities > 0.5)]))
+
+
 def _count_premises(sentences: ArgumentSentences) -> int:
+    if isinstance(sentences, PackedArgumentSentences):
+        return _count_premises_packed(sentences)
     count: int = 0
     for sentence in sentences:
         for tag in sentence:
@@ -35,6 +81,8 @@ def _count_premises(sentences: ArgumentSentences) -> int:
 
 
 def _count_claims(sentences: ArgumentSentences) -> int:
+    if isinstance(sentences, PackedArgumentSentences):
+        return _count_claims_packed(sentences)
     last_tag_was_claim: bool = False
     count: int = 0
     for sentence in sentences:
@@ -60,35 +108,87 @@ def _is_claim(tag: ArgumentTag) -> bool:
     )
 
 
-def _is_premise(tag: ArgumentTag) -> bool:
+_CLAIM_OR_PREMISE_LABELS = {
+    ArgumentLabel.C_B,
+    ArgumentLabel.C_I,
+    ArgumentLabel.MC_B,
+    ArgumentLabel.MC_I,
+    ArgumentLabel.P_B,
+    ArgumentLabel.P_I,
+    ArgumentLabel.MP_B,
+    ArgumentLabel.MP_I,
+}
+
+
+def _tags(
+        sentences: ArgumentSentences
+) -> Iterator[Tuple[str, ArgumentLabel, float]]:
+    if isinstance(sentences, PackedArgumentSentences):
+        return zip(
+            sentences.tokens,
+            (ARGUMENT_LABELS[code] for code in sentences.labels.tolist()),
+            sentences.probabilities.tolist(),
+        )
     return (
-            tag.label == ArgumentLabel.P_B or
-            tag.label == ArgumentLabel.P_I or
-            tag.label == ArgumentLabel.MP_B or
-            tag.label == ArgumentLabel.MP_I
+        (tag.token, tag.label, tag.probability)
+        for sentence in sentences
+        for tag in sentence
     )
 
 
-def _is_claim_or_premise(tag: ArgumentTag) -> bool:
-    return _is_claim(tag) or _is_premise(tag)
+@dataclass
+class _LemmaIndex:
+    """
+    Confidently tagged argument tokens of a document, by lemma.
+    """
+    # Positions of tokens not labeled as "O", starting at 1.
+    positions: Dict[str, List[int]] = field(default_factory=dict)
+    # Number of claim or premise tokens.
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def _build_lemma_index(sentences: ArgumentSentences) -> _LemmaIndex:
+    index = _LemmaIndex()
+    for position, (token, label, probability) in enumerate(
+            _tags(sentences), start=1
+    ):
+        if label == ArgumentLabel.O or probability <= 0.5:
+            continue
+        lemma = _lemmatize(token)
+        index.positions.setdefault(lemma, []).append(position)
+        if label in _CLAIM_OR_PREMISE_LABELS:
+            index.counts[lemma] = index.counts.get(lemma, 0) + 1
+    return index
+
+
+# Lemma indices by the ID of the argument sentences.
+# Sentences are kept with their index, so that their ID is not reused.
+_LemmaIndexEntry = Tuple[ArgumentSentences, _LemmaIndex]
+_lemma_indices: "OrderedDict[int, _LemmaIndexEntry]" = OrderedDict()
+_lemma_indices_lock = Lock()
+_MAX_LEMMA_INDICES = 10_000
+
+
+def _lemma_index(sentences: ArgumentSentences) -> _LemmaIndex:
+    with _lemma_indices_lock:
+        entry = _lemma_indices.get(id(sentences))
+        if entry is not None and entry[0] is sentences:
+            _lemma_indices.move_to_end(id(sentences))
+            return entry[1]
+    index = _build_lemma_index(sentences)
+    with _lemma_indices_lock:
+        _lemma_indices[id(sentences)] = (sentences, index)
+        while len(_lemma_indices) > _MAX_LEMMA_INDICES:
+            _lemma_indices.popitem(last=False)
+    return index
 
 
 def _count_terms(
         sentences: ArgumentSentences,
         terms: List[str]
 ):
-    term_count = 0
-    for term in terms:
-        normalized_term = _lemmatize(term)
-        for sentence in sentences:
-            for tag in sentence:
-                if (
-                        _lemmatize(tag.token) == normalized_term and
-                        _is_claim_or_premise(tag) and
-                        tag.probability > 0.5
-                ):
-                    term_count += 1
-    return term_count
+    counts = _lemma_index(sentences).counts
+    return sum(counts.get(_lemmatize(term), 0) for term in terms)
 
 
 def _count_query_terms(
@@ -103,23 +203,13 @@ def _term_position_in_argument(
         sentences: ArgumentSentences,
         terms: List[str]
 ):
+    positions = _lemma_index(sentences).positions
     term_arg_pos: List[int] = []
-    tags = [tag for sentence in sentences for tag in sentence]
     for term in terms:
-        normalized_term = _lemmatize(term)
-        count: int = 1
-        flag: bool = False
-        for tag in tags:
-            if (
-                    normalized_term == _lemmatize(tag.token) and
-                    tag.label != ArgumentLabel.O and
-                    tag.probability > 0.5
-            ):
-                term_arg_pos.append(count)
-                flag = True
-                break
-            count += 1
-        if not flag:
+        term_positions = positions.get(_lemmatize(term))
+        if term_positions is not None:
+            term_arg_pos.append(term_positions[0])
+        else:
             # Add large penalty.
             term_arg_pos.append(10000000)
     return mean(term_arg_pos)
@@ -134,25 +224,30 @@ def _query_term_position_in_argument(
 
 
 def _sentence_length(document: RankedDocument) -> float:
-    download_nltk_dependencies("punkt")
-    sentences = sent_tokenize(document.content)
+    # Sentences are already segmented, so skip Punkt when tokenizing.
     return mean(
-        len(word_tokenize(sentence))
-        for sentence in sentences
+        len(word_tokenize(sentence, preserve_line=True))
+        for sentence in document.sentences
     )
 
 
-def _count_comparative_object_terms(
+def _comparative_object_terms(
         context: RerankingContext,
-        sentences: ArgumentSentences,
         query: Query
-):
-    terms = [
+) -> List[str]:
+    return [
         term
         for obj in query.comparative_objects
         for term in context.terms(obj)
     ]
-    return _count_terms(sentences, terms)
+
+
+def _count_comparative_object_terms(
+        context: RerankingContext,
+        sentences: ArgumentSentences,
+        query: Query
+):
+    return _count_terms(sentences, _comparative_object_terms(context, query))
 
 
 def _comparative_object_term_position_in_argument(
@@ -160,241 +255,194 @@ def _comparative_object_term_position_in_argument(
         sentences: ArgumentSentences,
         query: Query
 ):
-    terms = [
-        term
-        for obj in query.comparative_objects
-        for term in context.terms(obj)
-    ]
-    return _term_position_in_argument(sentences, terms)
+    return _term_position_in_argument(
+        sentences,
+        _comparative_object_terms(context, query)
+    )
+
 
+class _ArgumentativeFeatureAxiom(FeatureAxiom, ABC):
+    """
+    Compare only documents of approximately the same length.
+    """
 
-class ArgumentCountAxiom(Axiom):
-    def preference(
+    def applicable(
             self,
             context: RerankingContext,
             query: Query,
             document1: RankedDocument,
             document2: RankedDocument
-    ):
-        if not (
-                isinstance(document1, ArgumentRankedDocument) and
-                isinstance(document2, ArgumentRankedDocument)
-        ):
-            return 0
+    ) -> bool:
+        return approximately_same_length(context, document1, document2)
 
-        if not approximately_same_length(context, document1, document2):
-            return 0
+    def applicable_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        return approximately_same_length_matrix(context, documents)
 
-        count1 = sum(
-            _count_arguments(sentences)
-            for _, sentences in document1.arguments.items()
-        )
-        count2 = sum(
+
+class ArgumentCountAxiom(_ArgumentativeFeatureAxiom):
+    def feature(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentRankedDocument):
+            return None
+        return sum(
             _count_arguments(sentences)
-            for _, sentences in document2.arguments.items()
+            for _, sentences in document.arguments.items()
         )
 
-        if count1 > count2:
-            return 1
-        elif count1 < count2:
-            return -1
-        else:
-            return 0
 
+class QueryTermsInArgumentAxiom(_ArgumentativeFeatureAxiom):
+    @property
+    def cost(self) -> float:
+        # Lemmatizes each argument token.
+        return 10
 
-class QueryTermsInArgumentAxiom(Axiom):
-    def preference(
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not (
-                isinstance(document1, ArgumentRankedDocument) and
-                isinstance(document2, ArgumentRankedDocument)
-        ):
-            return 0
-
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        count1 = sum(
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentRankedDocument):
+            return None
+        return sum(
             _count_query_terms(context, sentences, query)
-            for _, sentences in document1.arguments.items()
-        )
-        count2 = sum(
-            _count_query_terms(context, sentences, query)
-            for _, sentences in document2.arguments.items()
+            for _, sentences in document.arguments.items()
         )
 
-        if count1 > count2:
-            return 1
-        elif count1 < count2:
-            return -1
-        else:
-            return 0
 
+class QueryTermPositionInArgumentAxiom(_ArgumentativeFeatureAxiom):
+    @property
+    def cost(self) -> float:
+        # Lemmatizes each argument token.
+        return 10
 
-class QueryTermPositionInArgumentAxiom(Axiom):
-    def preference(
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not (
-                isinstance(document1, ArgumentRankedDocument) and
-                isinstance(document2, ArgumentRankedDocument)
-        ):
-            return 0
-
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        position1 = mean(list(
-            _query_term_position_in_argument(context, sentences, query)
-            for _, sentences in document1.arguments.items()
-        ))
-        position2 = mean(list(
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentRankedDocument):
+            return None
+        if len(document.arguments) == 0:
+            return None
+        if len(context.terms(query.title)) == 0:
+            return None
+        return mean(list(
             _query_term_position_in_argument(context, sentences, query)
-            for _, sentences in document2.arguments.items()
+            for _, sentences in document.arguments.items()
         ))
 
-        if position1 < position2:
-            return 1
-        elif position1 > position2:
-            return -1
-        else:
-            return 0
+    def compare(self, feature1: float, feature2: float) -> float:
+        # Prefer earlier positions.
+        return strictly_less(feature1, feature2)
+
+    def compare_matrix(self, features: ndarray) -> ndarray:
+        return sign(features[None, :] - features[:, None])
 
 
-class AverageSentenceLengthAxiom(Axiom):
-    def preference(
+class AverageSentenceLengthAxiom(_ArgumentativeFeatureAxiom):
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        sentence_length1 = _sentence_length(document1)
-        sentence_length2 = _sentence_length(document2)
-
-        if (
-                12 <= sentence_length1 <= 20 and
-                (
-                        sentence_length2 < 12 or
-                        sentence_length2 > 20
-                )
-        ):
-            return 1
-        elif (
-                12 <= sentence_length2 <= 20 and
-                (
-                        sentence_length1 < 12 or
-                        sentence_length1 > 20
-                )
-        ):
-            return -1
-        else:
-            return 0
+            document: RankedDocument
+    ) -> Optional[float]:
+        if len(document.sentences) == 0:
+            return None
+        return _sentence_length(document)
+
+    def compare(self, feature1: float, feature2: float) -> float:
+        # Prefer sentences of 12 to 20 words.
+        return strictly_greater(
+            12 <= feature1 <= 20,
+            12 <= feature2 <= 20
+        )
+
+    def compare_matrix(self, features: ndarray) -> ndarray:
+        in_range = ((12 <= features) & (features <= 20)).astype(float)
+        return sign(in_range[:, None] - in_range[None, :])
+
 
+class ComparativeObjectTermsInArgumentAxiom(_ArgumentativeFeatureAxiom):
+    @property
+    def cost(self) -> float:
+        # Lemmatizes each argument token.
+        return 10
 
-class ComparativeObjectTermsInArgumentAxiom(Axiom):
-    def preference(
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not (
-                isinstance(document1, ArgumentRankedDocument) and
-                isinstance(document2, ArgumentRankedDocument)
-        ):
-            return 0
-
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        count1 = sum(
-            _count_comparative_object_terms(context, sentences, query)
-            for _, sentences in document1.arguments.items()
-        )
-        count2 = sum(
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentRankedDocument):
+            return None
+        if query.comparative_objects is None:
+            return None
+        return sum(
             _count_comparative_object_terms(context, sentences, query)
-            for _, sentences in document2.arguments.items()
+            for _, sentences in document.arguments.items()
         )
 
-        if count1 > count2:
-            return 1
-        elif count1 < count2:
-            return -1
-        else:
-            return 0
 
+class ComparativeObjectTermPositionInArgumentAxiom(
+    _ArgumentativeFeatureAxiom
+):
+    @property
+    def cost(self) -> float:
+        # Lemmatizes each argument token.
+        return 10
 
-class ComparativeObjectTermPositionInArgumentAxiom(Axiom):
-    def preference(
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not (
-                isinstance(document1, ArgumentRankedDocument) and
-                isinstance(document2, ArgumentRankedDocument)
-        ):
-            return 0
-
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        position1 = mean(list(
-            _comparative_object_term_position_in_argument(
-                context,
-                sentences,
-                query
-            )
-            for _, sentences in document1.arguments.items()
-        ))
-        position2 = mean(list(
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentRankedDocument):
+            return None
+        if query.comparative_objects is None:
+            return None
+        if len(document.arguments) == 0:
+            return None
+        if len(_comparative_object_terms(context, query)) == 0:
+            return None
+        return mean(list(
             _comparative_object_term_position_in_argument(
                 context,
                 sentences,
                 query
             )
-            for _, sentences in document2.arguments.items()
+            for _, sentences in document.arguments.items()
         ))
 
-        if position1 < position2:
-            return 1
-        elif position1 > position2:
-            return -1
-        else:
-            return 0
+    def compare(self, feature1: float, feature2: float) -> float:
+        # Prefer earlier positions.
+        return strictly_less(feature1, feature2)
 
+    def compare_matrix(self, features: ndarray) -> ndarray:
+        return sign(features[None, :] - features[:, None])
 
-class ArgumentQualityAxiom(Axiom):
-    def preference(
+
+class ArgumentQualityAxiom(_ArgumentativeFeatureAxiom):
+    def feature(
             self,
             context: RerankingContext,
             query: Query,
-            document1: RankedDocument,
-            document2: RankedDocument
-    ):
-        if not approximately_same_length(context, document1, document2):
-            return 0
-
-        if not (
-                isinstance(document1, ArgumentQualityRankedDocument) and
-                isinstance(document2, ArgumentQualityRankedDocument)
-        ):
-            return 0
-
-        return strictly_greater(document1.qualities, document2.qualities)
+            document: RankedDocument
+    ) -> Optional[float]:
+        if not isinstance(document, ArgumentQualityRankedDocument):
+            return None
+        if len(document.qualities) == 0:
+            return None
+        return document.average_quality
@@ -0,0 +1,273 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from heapq import merge
+from statistics import mean
+from typing import List, Set, Iterator, Tuple, Dict, Optional, Mapping
+
+from numpy import ndarray, sign
+
+from grimjack.model import Query, RankedDocument
+from grimjack.model.axiom import FeatureAxiom
+from grimjack.model.axiom.utils import strictly_less
+from grimjack.modules import RerankingContext
+
+Occurrence = Tuple[int, str]
+
+
+def query_term_occurrences(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> List[Occurrence]:
+    """
+    Positions and terms of all query term occurrences, in document order.
+    """
+    return [
+        (index, term)
+        for index, term in enumerate(document_terms)
+        if term in query_terms
+    ]
+
+
+def merge_positions(positions: Mapping[str, List[int]]) -> List[Occurrence]:
+    """
+    Merge the sorted positions of each query term into occurrences,
+    in document order.
+    """
+    return list(merge(*(
+        [(position, term) for position in term_positions]
+        for term, term_positions in positions.items()
+    )))
+
+
+def first_positions(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> Dict[str, int]:
+    positions: Dict[str, int] = {}
+    for index, term in query_term_occurrences(query_terms, document_terms):
+        if term not in positions:
+            positions[term] = index
+    return positions
+
+
+def average_between_query_terms(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> float:
+    """
+    Same as utils.average_between_query_terms(),
+    but finds the first positions of all query terms in a single pass.
+    """
+    terms = list(query_terms)
+    if len(terms) < 2:
+        # Single-term query.
+        return 0
+    positions = first_positions(query_terms, document_terms)
+    for term in terms:
+        if term not in positions:
+            raise ValueError(f"{term!r} is not in list")
+    number_words = 0
+    for i, term1 in enumerate(terms):
+        for term2 in terms[i + 1:]:
+            number_words += abs(positions[term1] - positions[term2] - 1)
+    return number_words / (len(terms) * (len(terms) - 1) / 2)
+
+
+def _closest(target: int, before: Optional[int], after: Optional[int]):
+    # If both are equally close, prefer the earlier position.
+    if before is None:
+        return after
+    if after is None or after - target >= target - before:
+        return before
+    return after
+
+
+def _group_spans(occurrences: List[Occurrence]) -> Iterator[Tuple[int, int]]:
+    occurring = {term for _, term in occurrences}
+    # Closest occurrences of each query term before and after each occurrence.
+    previous: List[Dict[str, int]] = []
+    last: Dict[str, int] = {}
+    for index, term in occurrences:
+        previous.append(dict(last))
+        last[term] = index
+    following: List[Dict[str, int]] = [{}] * len(occurrences)
+    last = {}
+    for occurrence in reversed(range(len(occurrences))):
+        index, term = occurrences[occurrence]
+        following[occurrence] = dict(last)
+        last[term] = index
+    for occurrence, (index, term) in enumerate(occurrences):
+        first = index
+        final = index
+        for other_term in occurring:
+            if other_term == term:
+                continue
+            closest = _closest(
+                index,
+                previous[occurrence].get(other_term),
+                following[occurrence].get(other_term),
+            )
+            first = min(first, closest)
+            final = max(final, closest)
+        yield first, final
+
+
+def closest_group_spans(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> Iterator[Tuple[int, int]]:
+    """
+    First and last position of the group around each query term occurrence,
+    with the closest occurrence of each other query term.
+    Same groups as utils.query_term_index_groups(), but found by
+    sweeping the merged query term positions forwards and backwards.
+    """
+    return _group_spans(query_term_occurrences(query_terms, document_terms))
+
+
+def closest_grouping_size_and_count(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> Tuple[int, int]:
+    """
+    Same as utils.closest_grouping_size_and_count(),
+    but counts non-query terms within groups from prefix sums.
+    """
+    # Number of non-query terms before each position.
+    non_query_terms = [0]
+    for term in document_terms:
+        non_query_terms.append(
+            non_query_terms[-1] + (term not in query_terms)
+        )
+    occurrences_counter = Counter(
+        max(0, non_query_terms[final] - non_query_terms[first + 1])
+        for first, final in closest_group_spans(query_terms, document_terms)
+    )
+    min_occurrences = min(occurrences_counter.keys())
+    return min_occurrences, occurrences_counter[min_occurrences]
+
+
+def average_smallest_span(
+        query_terms: Set[str],
+        document_terms: List[str]
+):
+    return mean(
+        final - first
+        for first, final in closest_group_spans(query_terms, document_terms)
+    )
+
+
+def _covering_span(occurrences: List[Occurrence]) -> Optional[int]:
+    required = len({term for _, term in occurrences})
+    counts: Dict[str, int] = {}
+    covered = 0
+    start = 0
+    smallest: Optional[int] = None
+    for index, term in occurrences:
+        counts[term] = counts.get(term, 0) + 1
+        if counts[term] == 1:
+            covered += 1
+        while covered == required:
+            start_index, start_term = occurrences[start]
+            span = index - start_index
+            if smallest is None or span < smallest:
+                smallest = span
+            counts[start_term] -= 1
+            if counts[start_term] == 0:
+                covered -= 1
+            start += 1
+    return smallest
+
+
+def smallest_covering_span(
+        query_terms: Set[str],
+        document_terms: List[str]
+) -> Optional[int]:
+    """
+    Length of the smallest window that contains all query terms
+    occurring in the document, found with a sliding window.
+    None if no query term occurs.
+    """
+    return _covering_span(
+        query_term_occurrences(query_terms, document_terms)
+    )
+
+
+class _ProximityFeatureAxiom(FeatureAxiom, ABC):
+    """
+    Prefer documents with closer query terms,
+    if both documents contain all query terms.
+    Query term positions are taken from the reranking context,
+    e.g., from the index, instead of analyzing the documents again.
+    """
+
+    @abstractmethod
+    def _proximity(self, occurrences: List[Occurrence]) -> float:
+        pass
+
+    def _positions_feature(
+            self,
+            query_terms: Set[str],
+            positions: Dict[str, List[int]]
+    ) -> Optional[float]:
+        if len(query_terms) < 2:
+            return None
+        # Only documents with positions for all query terms are compared.
+        if any(len(positions.get(term, [])) == 0 for term in query_terms):
+            return None
+        return self._proximity(merge_positions(positions))
+
+    def feature(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document: RankedDocument
+    ) -> Optional[float]:
+        positions = context.query_term_positions(query, [document])
+        return self._positions_feature(
+            context.term_set(query.title),
+            positions[document.id]
+        )
+
+    def compare(self, feature1: float, feature2: float) -> float:
+        return strictly_less(feature1, feature2)
+
+    def compare_matrix(self, features: ndarray) -> ndarray:
+        return sign(features[None, :] - features[:, None])
+
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        # Fetch the positions of all documents at once
+        # and extract the features from them.
+        features = self._query_features(query)
+        missing = [
+            document
+            for document in documents
+            if document.id not in features
+        ]
+        if len(missing) > 0:
+            query_terms = context.term_set(query.title)
+            positions = context.query_term_positions(query, missing)
+            for document in missing:
+                features[document.id] = self._positions_feature(
+                    query_terms,
+                    positions[document.id]
+                )
+        return super().preference_matrix(context, query, documents)
+
+
+class AverageSmallestSpanAxiom(_ProximityFeatureAxiom):
+    def _proximity(self, occurrences: List[Occurrence]) -> float:
+        return mean(
+            final - first
+            for first, final in _group_spans(occurrences)
+        )
+
+
+class SmallestCoveringSpanAxiom(_ProximityFeatureAxiom):
+    def _proximity(self, occurrences: List[Occurrence]) -> float:
+        return _covering_span(occurrences)
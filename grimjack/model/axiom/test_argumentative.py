@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from dataclasses import replace
+from itertools import combinations
+from random import Random
+from typing import Optional
+
+from pytest import mark, fixture, MonkeyPatch
+from targer_api import ArgumentLabel
+
+from grimjack.model import Query, RankedDocument
+from grimjack.model.arguments import PackedArgumentSentences
+from grimjack.model.axiom import argumentative
+from grimjack.model.axiom.argumentative import (
+    _count_claims, _count_premises, _count_arguments, ArgumentCountAxiom,
+    AverageSentenceLengthAxiom, ArgumentQualityAxiom,
+    _count_terms, _term_position_in_argument, QueryTermsInArgumentAxiom,
+    QueryTermPositionInArgumentAxiom, ComparativeObjectTermsInArgumentAxiom,
+    ComparativeObjectTermPositionInArgumentAxiom
+)
+from grimjack.model.axiom.testing import (
+    StandInRerankingContext, random_ranking, random_sentences, QUERY
+)
+from grimjack.model.axiom.utils import approximately_same_length
+from grimjack.modules import RerankingContext
+
+
+@mark.parametrize("seed", range(50))
+def test_packed_counts(seed: int) -> None:
+    sentences = random_sentences(Random(seed))
+    packed = PackedArgumentSentences.from_sentences(sentences)
+    assert _count_claims(packed) == _count_claims(sentences)
+    assert _count_premises(packed) == _count_premises(sentences)
+
+
+def _stand_in_lemmatize(word: str) -> str:
+    # Strip the plural "s", like the WordNet lemmatizer.
+    word = word.lower()
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+@fixture
+def stand_in_lemmatizer(monkeypatch: MonkeyPatch) -> None:
+    """
+    Lemmatize without WordNet, and without lemma indices from before.
+    """
+    monkeypatch.setattr(argumentative, "_lemmatize", _stand_in_lemmatize)
+    monkeypatch.setattr(argumentative, "_lemma_indices", OrderedDict())
+
+
+@mark.usefixtures("stand_in_lemmatizer")
+@mark.parametrize("seed", range(20))
+def test_lemma_index(seed: int) -> None:
+    lemmatize = argumentative._lemmatize
+    sentences = random_sentences(Random(seed))
+    packed = PackedArgumentSentences.from_sentences(sentences)
+    terms = ["laptops", "desktop", "better", "tablet", "laptop"]
+    tags = [tag for sentence in sentences for tag in sentence]
+    count = sum(
+        1
+        for term in terms
+        for tag in tags
+        if (
+                lemmatize(tag.token) == lemmatize(term) and
+                tag.label not in (
+                    ArgumentLabel.O, ArgumentLabel.B_B,
+                    ArgumentLabel.B_I, ArgumentLabel.X,
+                ) and
+                tag.probability > 0.5
+        )
+    )
+    positions = [
+        next(
+            (
+                position
+                for position, tag in enumerate(tags, start=1)
+                if (
+                    lemmatize(tag.token) == lemmatize(term) and
+                    tag.label != ArgumentLabel.O and
+                    tag.probability > 0.5
+                )
+            ),
+            10000000
+        )
+        for term in terms
+    ]
+    for argument_sentences in (sentences, packed):
+        assert _count_terms(argument_sentences, terms) == count
+        assert _term_position_in_argument(
+            argument_sentences, terms
+        ) == sum(positions) / len(positions)
+
+
+def test_argument_count_axiom() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 20)
+    axiom = ArgumentCountAxiom()
+    for document1, document2 in combinations(ranking, 2):
+        expected = 0
+        if approximately_same_length(context, document1, document2):
+            count1 = _count_arguments(document1.arguments["model"])
+            count2 = _count_arguments(document2.arguments["model"])
+            expected = int(count1 > count2) - int(count1 < count2)
+        assert axiom.preference(
+            context, QUERY, document1, document2
+        ) == expected
+
+
+class _CountingAxiom(ArgumentCountAxiom):
+    def __init__(self):
+        self.extracted = 0
+
+    def feature(
+            self,
+            context: RerankingContext,
+            query: Query,
+            document: RankedDocument
+    ) -> Optional[float]:
+        self.extracted += 1
+        return super().feature(context, query, document)
+
+
+def test_feature_extracted_once_per_query() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 10)
+    axiom = _CountingAxiom()
+    for _ in range(2):
+        for document1, document2 in combinations(ranking, 2):
+            axiom.preference(context, QUERY, document1, document2)
+    assert axiom.extracted == len(ranking)
+    other_query = Query(2, "laptop", ("laptop", "desktop"), "", "")
+    axiom.preference(context, other_query, ranking[0], ranking[1])
+    assert axiom.extracted == len(ranking) + 2
+
+
+@mark.usefixtures("stand_in_lemmatizer")
+def test_preference_matrix_empty_documents() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 10)
+    ranking[3] = replace(ranking[3], sentences=[], qualities=[], arguments={})
+    queries = [
+        QUERY,
+        Query(2, "Is a laptop better than a desktop?", None, "", ""),
+        Query(3, "?", ("laptop", "desktop"), "", ""),
+    ]
+    for axiom_type in (
+            ArgumentCountAxiom, QueryTermsInArgumentAxiom,
+            QueryTermPositionInArgumentAxiom, AverageSentenceLengthAxiom,
+            ComparativeObjectTermsInArgumentAxiom,
+            ComparativeObjectTermPositionInArgumentAxiom,
+            ArgumentQualityAxiom,
+    ):
+        for query in queries:
+            axiom = axiom_type()
+            matrix = axiom.preference_matrix(context, query, ranking)
+            assert (matrix == [
+                [
+                    axiom.preference(context, query, document1, document2)
+                    for document2 in ranking
+                ]
+                for document1 in ranking
+            ]).all()
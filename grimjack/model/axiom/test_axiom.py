@@ -0,0 +1,181 @@
+from dataclasses import replace
+from pathlib import Path
+from random import Random
+from subprocess import run
+from sys import executable
+from typing import List
+
+from numpy import array, ndarray, sign
+
+from grimjack.model import Query, RankedDocument
+from grimjack.model.axiom import (
+    AggregatedAxiom, OriginalAxiom, CachedAxiom, evaluation_statistics
+)
+from grimjack.model.axiom.argumentative import (
+    ArgumentCountAxiom, AverageSentenceLengthAxiom, ArgumentQualityAxiom
+)
+from grimjack.model.axiom.testing import (
+    StandInRerankingContext, random_ranking, QUERY
+)
+from grimjack.modules import RerankingContext
+from grimjack.modules.reranker import AxiomaticReranker
+
+_AXIOMS = [
+    ArgumentCountAxiom(),
+    AverageSentenceLengthAxiom(),
+    ArgumentQualityAxiom(),
+]
+
+
+def test_preference_matrix() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 30)
+    axiom = AggregatedAxiom([
+        OriginalAxiom() * 0.5,
+        *_AXIOMS,
+        ArgumentCountAxiom() * 2,
+    ]).normalized().cached()
+    matrix = axiom.preference_matrix(context, QUERY, ranking)
+    assert (matrix == array([
+        [
+            axiom.preference(context, QUERY, document1, document2)
+            if document1 is not document2 else 0
+            for document2 in ranking
+        ]
+        for document1 in ranking
+    ])).all()
+
+
+def test_short_circuit_evaluation() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 30)
+    aggregated = AggregatedAxiom([
+        *_AXIOMS,
+        OriginalAxiom() * len(_AXIOMS),
+    ])
+    expected = sign(aggregated.preference_matrix(context, QUERY, ranking))
+    before = evaluation_statistics()
+    matrix = aggregated.normalized().preference_matrix(context, QUERY, ranking)
+    after = evaluation_statistics()
+    # Skipping axioms doesn't change the preferences.
+    assert (matrix == expected).all()
+    assert after.evaluated + after.skipped == (
+            before.evaluated + before.skipped + 435 * 4
+    )
+    assert after.skipped > before.skipped
+    assert aggregated.normalized().preference(
+        context, QUERY, ranking[5], ranking[2]
+    ) == expected[5, 2]
+
+
+def test_axiomatic_reranker() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 100)
+    original = AxiomaticReranker(context, OriginalAxiom(), Random(0))
+    assert [
+        document.id for document in original.rerank(QUERY, ranking)
+    ] == [document.id for document in ranking]
+
+    axiom = AggregatedAxiom([
+        OriginalAxiom() * len(_AXIOMS),
+        *_AXIOMS,
+    ]).normalized().cached()
+    reranker = AxiomaticReranker(context, axiom, Random(0))
+    reranked = reranker.rerank(QUERY, ranking)
+    assert sorted(document.id for document in reranked) == sorted(
+        document.id for document in ranking
+    )
+    assert [document.rank for document in reranked] == list(range(1, 101))
+
+
+class _CountingAxiom(OriginalAxiom):
+    calls: int = 0
+
+    def preference_matrix(
+            self,
+            context: RerankingContext,
+            query: Query,
+            documents: List[RankedDocument]
+    ) -> ndarray:
+        self.calls += 1
+        return super().preference_matrix(context, query, documents)
+
+
+def test_cached_axiom(tmp_path: Path) -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 10)
+    other_query = replace(QUERY, id=2, title="Is a desktop better?")
+    counting = _CountingAxiom()
+    axiom = counting.cached(tmp_path)
+    matrix = axiom.preference_matrix(context, QUERY, ranking)
+    assert (axiom.preference_matrix(context, QUERY, ranking) == matrix).all()
+    assert counting.calls == 1
+    # Preferences are cached per query.
+    axiom.preference_matrix(context, other_query, ranking)
+    assert counting.calls == 2
+    # Preferences are read back from disk, e.g., in another run.
+    persistent = counting.cached(tmp_path)
+    assert (
+            persistent.preference_matrix(context, QUERY, ranking) == matrix
+    ).all()
+    assert counting.calls == 2
+    assert persistent.preference(
+        context, QUERY, ranking[3], ranking[1]
+    ) == matrix[3, 1]
+    # Only the most recently used preferences are kept in memory.
+    bounded = CachedAxiom(counting, max_size=50)
+    bounded.preference_matrix(context, QUERY, ranking)
+    assert len(bounded._memory) == 45
+    bounded.preference_matrix(context, other_query, ranking)
+    assert len(bounded._memory) == 50
+    bounded.preference_matrix(context, QUERY, ranking)
+    assert counting.calls == 5
+
+
+def test_fingerprint_stable_across_processes() -> None:
+    # Add other tokens to the shared vocabulary first,
+    # so that vocabulary IDs differ from the other process.
+    random_ranking(Random(1), 10)
+    ranking = random_ranking(Random(0), 10)
+    fingerprints = [
+        CachedAxiom._fingerprint(document)
+        for document in ranking
+    ]
+    assert len(set(fingerprints)) == len(ranking)
+    other_process = run(
+        [
+            executable, "-c",
+            "from random import Random\n"
+            "from grimjack.model.axiom import CachedAxiom\n"
+            "from grimjack.model.axiom.testing import "
+            "random_ranking\n"
+            "for document in random_ranking(Random(0), 10):\n"
+            "    print(CachedAxiom._fingerprint(document))\n",
+        ],
+        # Run from the repository root.
+        cwd=Path(__file__).parents[3],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert other_process.stdout.split() == fingerprints
+
+
+def test_fingerprint_keeps_tags_packed() -> None:
+    ranking = random_ranking(Random(0), 10)
+    CachedAxiom(_CountingAxiom()).preference_matrix(
+        StandInRerankingContext(), QUERY, ranking
+    )
+    assert all(
+        "sentences" not in document.arguments["model"].__dict__
+        for document in ranking
+    )
+    # Other tags give another fingerprint.
+    retagged = replace(
+        ranking[0],
+        arguments={"model": ranking[1].arguments["model"]}
+    )
+    assert CachedAxiom._fingerprint(retagged) not in {
+        CachedAxiom._fingerprint(ranking[0]),
+        CachedAxiom._fingerprint(ranking[1]),
+    }
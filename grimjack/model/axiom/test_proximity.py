@@ -0,0 +1,175 @@
+from random import Random
+from statistics import StatisticsError
+from typing import List, Set, Tuple, Dict, Sequence
+
+from numpy import array
+from pytest import mark, raises
+
+from grimjack.model import Query, Document
+from grimjack.model.axiom import proximity, utils
+from grimjack.model.axiom.proximity import (
+    AverageSmallestSpanAxiom, SmallestCoveringSpanAxiom, merge_positions
+)
+from grimjack.model.axiom.testing import (
+    StandInRerankingContext, random_ranking, QUERY
+)
+
+_WORDS = ["laptop", "desktop", "tablet", "is", "better", "than", "a"]
+
+
+def _random_terms(seed: int) -> Tuple[Set[str], List[str]]:
+    random = Random(seed)
+    query_terms = set(random.sample(_WORDS[:4], random.randint(1, 4)))
+    document_terms = [
+        random.choice(_WORDS)
+        for _ in range(random.randint(0, 40))
+    ]
+    return query_terms, document_terms
+
+
+@mark.parametrize("seed", range(200))
+def test_proximity_same_as_utils(seed: int) -> None:
+    query_terms, document_terms = _random_terms(seed)
+    for function in (
+            "average_between_query_terms",
+            "closest_grouping_size_and_count",
+            "average_smallest_span",
+    ):
+        try:
+            expected = getattr(utils, function)(query_terms, document_terms)
+        except (ValueError, StatisticsError) as error:
+            with raises(type(error)):
+                getattr(proximity, function)(query_terms, document_terms)
+        else:
+            assert getattr(proximity, function)(
+                query_terms, document_terms
+            ) == expected
+    assert sorted(
+        proximity.closest_group_spans(query_terms, document_terms)
+    ) == sorted(
+        (min(group), max(group))
+        for group in utils.query_term_index_groups(
+            query_terms, document_terms
+        )
+    )
+
+
+@mark.parametrize("seed", range(200))
+def test_smallest_covering_span(seed: int) -> None:
+    query_terms, document_terms = _random_terms(seed)
+    occurring = query_terms & set(document_terms)
+    spans = [
+        end - start
+        for start in range(len(document_terms))
+        for end in range(start, len(document_terms))
+        if occurring <= set(document_terms[start:end + 1])
+    ]
+    expected = min(spans) if len(occurring) > 0 else None
+    assert proximity.smallest_covering_span(
+        query_terms, document_terms
+    ) == expected
+
+
+def test_proximity_axioms() -> None:
+    context = StandInRerankingContext()
+    ranking = random_ranking(Random(0), 30)
+    query_terms = context.term_set(QUERY.title)
+    positions = context.query_term_positions(QUERY, ranking)
+    for document in ranking:
+        document_terms = context.terms(document.content)
+        assert merge_positions(positions[document.id]) == (
+            proximity.query_term_occurrences(query_terms, document_terms)
+        )
+        if query_terms <= set(document_terms):
+            assert SmallestCoveringSpanAxiom().feature(
+                context, QUERY, document
+            ) == proximity.smallest_covering_span(query_terms, document_terms)
+            assert AverageSmallestSpanAxiom().feature(
+                context, QUERY, document
+            ) == proximity.average_smallest_span(query_terms, document_terms)
+    for axiom in (AverageSmallestSpanAxiom(), SmallestCoveringSpanAxiom()):
+        matrix = axiom.preference_matrix(context, QUERY, ranking)
+        assert (matrix == array([
+            [
+                axiom.preference(context, QUERY, document1, document2)
+                if document1 is not document2 else 0
+                for document2 in ranking
+            ]
+            for document1 in ranking
+        ])).all()
+        assert (matrix != 0).any()
+
+
+class _CountingRerankingContext(StandInRerankingContext):
+    def __init__(self):
+        self.fetched: List[int] = []
+
+    def query_term_positions(self, query, documents):
+        self.fetched.append(len(documents))
+        return super().query_term_positions(query, documents)
+
+
+def test_proximity_positions_prefetched() -> None:
+    context = _CountingRerankingContext()
+    ranking = random_ranking(Random(0), 30)
+    axiom = SmallestCoveringSpanAxiom()
+    matrix = axiom.preference_matrix(context, QUERY, ranking)
+    # Features are extracted from the positions of all documents at once.
+    assert context.fetched == [len(ranking)]
+    assert (axiom.preference_matrix(context, QUERY, ranking) == matrix).all()
+    assert context.fetched == [len(ranking)]
+
+
+class _IndexPositionsContext(StandInRerankingContext):
+    """
+    Query term positions as from the index, including empty position lists,
+    without analyzing the documents' contents.
+    """
+
+    def __init__(self, positions: Dict[str, Dict[str, List[int]]]):
+        self.positions = positions
+        self.analyzed: List[str] = []
+
+    def terms(self, text: str) -> List[str]:
+        self.analyzed.append(text)
+        return super().terms(text)
+
+    def query_term_positions(
+            self,
+            query: Query,
+            documents: Sequence[Document]
+    ) -> Dict[str, Dict[str, List[int]]]:
+        return {
+            document.id: self.positions[document.id]
+            for document in documents
+        }
+
+
+def test_proximity_with_all_query_term_positions() -> None:
+    ranking = random_ranking(Random(0), 4)
+    terms = sorted(StandInRerankingContext().term_set(QUERY.title))
+    context = _IndexPositionsContext({
+        ranking[0].id: {term: [index] for index, term in enumerate(terms)},
+        ranking[1].id: {
+            term: [3 * index] for index, term in enumerate(terms)
+        },
+        # Documents without all query terms are not compared.
+        ranking[2].id: {
+            **{term: [index] for index, term in enumerate(terms)},
+            terms[0]: [],
+        },
+        ranking[3].id: {term: [index] for index, term in enumerate(terms[1:])},
+    })
+    for axiom in (AverageSmallestSpanAxiom(), SmallestCoveringSpanAxiom()):
+        matrix = axiom.preference_matrix(context, QUERY, ranking)
+        # Closer query terms are preferred.
+        assert matrix[0, 1] > 0 > matrix[1, 0]
+        assert (matrix[2:, :] == 0).all() and (matrix[:, 2:] == 0).all()
+        assert all(
+            axiom.preference(context, QUERY, document1, document2) ==
+            matrix[i, j]
+            for i, document1 in enumerate(ranking)
+            for j, document2 in enumerate(ranking)
+        )
+    # Only the query is analyzed, not the documents.
+    assert set(context.analyzed) == {QUERY.title}
@@ -0,0 +1,105 @@
+from random import Random
+from typing import List
+
+from numpy import array
+from pytest import mark, approx
+
+from grimjack.model import RankedDocument, Query
+from grimjack.model.axiom.testing import StandInRerankingContext
+from grimjack.model.axiom.utils import (
+    vocabulary_overlap, vocabulary_overlap_matrix,
+    all_query_terms_in_documents, all_query_terms_in_documents_matrix,
+    same_query_term_subset, same_query_term_subset_matrix,
+    approximately_same_length, approximately_same_length_matrix
+)
+
+_WORDS = ["laptop", "desktop", "tablet", "is", "better", "than", "a", "or"]
+_QUERIES = [
+    Query(1, "Is a laptop better than a desktop?", (), "", ""),
+    Query(2, "laptop or desktop or tablet", (), "", ""),
+    Query(3, "laptop", (), "", ""),
+    Query(4, "laptop or smartphone", (), "", ""),
+]
+
+
+def _random_documents(random: Random) -> List[RankedDocument]:
+    return [
+        RankedDocument(
+            id=f"doc-{rank}",
+            content=" ".join(
+                random.choice(_WORDS[:random.randint(1, len(_WORDS))])
+                for _ in range(random.randint(0, 12))
+            ),
+            fields={},
+            score=1 / rank,
+            rank=rank,
+            sentences=[],
+        )
+        for rank in range(1, random.randint(1, 20) + 1)
+    ]
+
+
+@mark.parametrize("seed", range(20))
+def test_matrices_same_as_pairwise(seed: int) -> None:
+    context = StandInRerankingContext()
+    documents = _random_documents(Random(seed))
+    assert vocabulary_overlap_matrix(context, documents) == approx(array([
+        [
+            vocabulary_overlap(
+                context.term_set(document1.content),
+                context.term_set(document2.content)
+            )
+            for document2 in documents
+        ]
+        for document1 in documents
+    ]))
+    assert (approximately_same_length_matrix(context, documents) == array([
+        [
+            approximately_same_length(context, document1, document2)
+            for document2 in documents
+        ]
+        for document1 in documents
+    ])).all()
+    for query in _QUERIES:
+        for matrix_function, function in (
+                (
+                        all_query_terms_in_documents_matrix,
+                        all_query_terms_in_documents
+                ),
+                (same_query_term_subset_matrix, same_query_term_subset),
+        ):
+            assert (matrix_function(context, query, documents) == array([
+                [
+                    function(context, query, document1, document2)
+                    for document2 in documents
+                ]
+                for document1 in documents
+            ])).all()
+
+
+def _document(content: str) -> RankedDocument:
+    return RankedDocument(
+        id=content,
+        content=content,
+        fields={},
+        score=1,
+        rank=1,
+        sentences=[],
+    )
+
+
+def test_approximately_same_length_margin() -> None:
+    context = StandInRerankingContext()
+    ten = _document(" ".join(["laptop"] * 10))
+    eleven = _document(" ".join(["laptop"] * 11))
+    fifteen = _document(" ".join(["laptop"] * 15))
+    # The margin is a fraction of the lengths, not a third length.
+    assert approximately_same_length(context, ten, ten)
+    assert approximately_same_length(context, ten, eleven)
+    assert not approximately_same_length(context, ten, fifteen)
+    assert approximately_same_length(
+        context, ten, fifteen, margin_fraction=0.5
+    )
+    assert not approximately_same_length(
+        context, ten, eleven, margin_fraction=0.01
+    )
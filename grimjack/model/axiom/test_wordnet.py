@@ -0,0 +1,219 @@
+from itertools import product
+from math import isnan
+from pathlib import Path
+from typing import Dict, List, Tuple
+from warnings import catch_warnings, simplefilter
+
+from nltk import data
+from nltk.corpus.reader import WordNetCorpusReader
+from pytest import fixture, approx, MonkeyPatch
+
+from grimjack.model.axiom import utils
+from grimjack.model.axiom.wordnet import WordNetTable
+
+# Synsets of a small WordNet by part of speech:
+# lemmas and hypernyms (with "i" for instance hypernyms).
+_SYNSETS: Dict[str, List[Tuple[List[str], List[str]]]] = {
+    "noun": [
+        (["entity"], []),
+        (["object"], ["entity"]),
+        (["device"], ["object"]),
+        (["portable"], ["object"]),
+        (["computer", "machine"], ["device"]),
+        (["laptop", "laptop_computer"], ["computer", "portable"]),
+        (["desktop"], ["computer"]),
+        (["tablet"], ["device"]),
+        (["mouse"], ["device"]),
+        (["fruit"], ["object"]),
+        (["apple"], ["fruit"]),
+        (["city"], ["object"]),
+        (["paris"], ["i:city"]),
+        (["run"], ["entity"]),
+        (["machine", "apparatus"], ["device"]),
+        (["abstraction"], []),
+        (["idea"], ["abstraction"]),
+    ],
+    "verb": [
+        (["move"], []),
+        (["change"], []),
+        (["run"], ["move"]),
+        (["walk"], ["move"]),
+        (["go"], ["move"]),
+        (["alter"], ["change"]),
+        (["run", "operate"], ["change"]),
+    ],
+    "adj": [
+        (["good"], []),
+        (["fast"], []),
+    ],
+    "adv": [
+        (["quickly"], []),
+    ],
+}
+_POS = {"noun": "n", "verb": "v", "adj": "a", "adv": "r"}
+_EXCEPTIONS = {
+    "noun": ["mice mouse"],
+    "verb": ["ran run", "went go"],
+    "adj": ["better good"],
+    "adv": [],
+}
+_LICENSE = "  1 WordNet 3.0 Copyright 2006 by Princeton University.\n"
+
+
+def _write_wordnet(root: Path) -> None:
+    (root / "lexnames").write_text(
+        "00 adj.all 3\n01 adv.all 4\n02 noun.Tops 1\n03 verb.body 2\n"
+    )
+    for name in ("cntlist.rev", "index.sense"):
+        (root / name).write_text("")
+    lexnames = {"adj": 0, "adv": 1, "noun": 2, "verb": 3}
+    for suffix, synsets in _SYNSETS.items():
+        pos = _POS[suffix]
+        # Offsets are byte positions, so lines must be laid out first.
+        # All lines have the same length, so offsets are known upfront.
+        width = 160
+        offsets = [
+            len(_LICENSE) + index * (width + 1)
+            for index in range(len(synsets))
+        ]
+        first_offset = {}
+        for (lemmas, _), offset in zip(synsets, offsets):
+            first_offset.setdefault(lemmas[0], offset)
+        lines = [_LICENSE]
+        index: Dict[str, List[int]] = {}
+        for (lemmas, hypernyms), offset in zip(synsets, offsets):
+            words = " ".join(f"{lemma} 0" for lemma in lemmas)
+            pointers = " ".join(
+                f"@i {first_offset[hypernym[2:]]:08d} {pos} 0000"
+                if hypernym.startswith("i:") else
+                f"@ {first_offset[hypernym]:08d} {pos} 0000"
+                for hypernym in hypernyms
+            )
+            line = (
+                f"{offset:08d} {lexnames[suffix]:02d} {pos} "
+                f"{len(lemmas):02x} {words} {len(hypernyms):03d} "
+                f"{pointers} | gloss"
+            )
+            lines.append(line.ljust(width) + "\n")
+            for lemma in lemmas:
+                index.setdefault(lemma, []).append(offset)
+        (root / f"data.{suffix}").write_text("".join(lines))
+        (root / f"index.{suffix}").write_text(_LICENSE + "".join(
+            f"{lemma} {pos} {len(offsets)} 0 {len(offsets)} 0 "
+            f"{' '.join(f'{offset:08d}' for offset in offsets)}\n"
+            for lemma, offsets in sorted(index.items())
+        ))
+        (root / f"{suffix}.exc").write_text(
+            "".join(f"{line}\n" for line in _EXCEPTIONS[suffix])
+        )
+
+
+@fixture
+def reader(
+        tmp_path: Path,
+        monkeypatch: MonkeyPatch
+) -> WordNetCorpusReader:
+    _write_wordnet(tmp_path)
+    monkeypatch.setattr(data, "path", [*data.path, str(tmp_path)])
+    # Don't map synsets from the (missing) default WordNet.
+    monkeypatch.setattr(WordNetCorpusReader, "map_wn", lambda *_: None)
+    with catch_warnings():
+        # No multilingual data.
+        simplefilter("ignore")
+        return WordNetCorpusReader(str(tmp_path), None)
+
+
+def test_synsets(reader: WordNetCorpusReader, tmp_path: Path) -> None:
+    table = WordNetTable.build(reader)
+    table.save(tmp_path / "table")
+    table = WordNetTable.load(tmp_path / "table")
+    synsets = sorted(reader.all_synsets())
+    for term in (
+            "laptop", "Laptops", "mice", "run", "ran", "running", "runs",
+            "machines", "better", "went", "quickly", "tablet", "unknown",
+    ):
+        assert [
+            synsets[synset].name() for synset in table.synsets(term)
+        ] == [synset.name() for synset in reader.synsets(term)]
+
+
+def test_wup_similarities(reader: WordNetCorpusReader) -> None:
+    table = WordNetTable.build(reader)
+    synsets = sorted(reader.all_synsets())
+    similarities = table.wup_similarities(
+        list(range(len(synsets))),
+        list(range(len(synsets)))
+    )
+    for (i, synset1), (j, synset2) in product(enumerate(synsets), repeat=2):
+        expected = reader.wup_similarity(synset1, synset2)
+        if expected is None:
+            assert isnan(similarities[i, j])
+        else:
+            assert similarities[i, j] == approx(expected)
+
+
+def _wup_similarity(
+        reader: WordNetCorpusReader,
+        term1: str,
+        term2: str,
+        smoothing: int
+) -> float:
+    # Reference similarity with NLTK, as before the table.
+    similarities = [
+        reader.wup_similarity(synset1, synset2)
+        for synset1, synset2 in product(
+            reader.synsets(term1)[:smoothing + 1],
+            reader.synsets(term2)[:smoothing + 1],
+        )
+    ]
+    similarities = [
+        similarity
+        for similarity in similarities
+        if similarity is not None
+    ]
+    if len(similarities) == 0:
+        return 0
+    return sum(similarities) / len(similarities)
+
+
+_TERMS = [
+    "laptop", "desktop", "run", "walk", "good", "apple", "paris", "idea",
+    "mice", "unknown",
+]
+
+
+def test_synonym_set_similarity(reader: WordNetCorpusReader) -> None:
+    table = WordNetTable.build(reader)
+    for term1, term2, smoothing in product(_TERMS, _TERMS, (0, 2)):
+        assert table.synonym_set_similarity(
+            term1, term2, smoothing
+        ) == approx(_wup_similarity(reader, term1, term2, smoothing))
+
+
+def test_utils_synonym_set_similarity(
+        reader: WordNetCorpusReader,
+        tmp_path: Path,
+        monkeypatch: MonkeyPatch
+) -> None:
+    table = WordNetTable.build(reader)
+    table.save(tmp_path / "table")
+    table = WordNetTable.load(tmp_path / "table")
+    monkeypatch.setattr(utils, "wordnet_table", lambda _: table)
+    for term1, term2, smoothing in product(_TERMS, _TERMS, (0, 2)):
+        assert utils.synonym_set_similarity(
+            term1, term2, smoothing
+        ) == approx(_wup_similarity(reader, term1, term2, smoothing))
+
+
+def test_bounded_memo(reader: WordNetCorpusReader) -> None:
+    table = WordNetTable.build(reader)
+    table.max_cache_size = 2
+    for term in _TERMS:
+        table.synonym_set_similarity("laptop", term)
+    assert len(table._synsets_cache) == 2
+    assert list(table._similarities_cache) == [
+        ("laptop", term, 0) for term in _TERMS[-2:]
+    ]
+    assert table.synonym_set_similarity("laptop", "desktop") == approx(
+        _wup_similarity(reader, "laptop", "desktop", 0)
+    )
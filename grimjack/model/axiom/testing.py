@@ -0,0 +1,129 @@
+from functools import cache
+from random import Random
+from re import findall
+from typing import List, Set
+
+from targer_api import ArgumentSentences, ArgumentTag, ArgumentLabel
+
+from grimjack.model import Query, Document
+from grimjack.model.arguments import PackedArgumentSentences
+from grimjack.model.quality import ArgumentQualitySentence
+from grimjack.model.stance import (
+    ArgumentQualityStanceRankedDocument, ArgumentStanceSentence
+)
+from grimjack.modules import RerankingContext
+
+
+def random_sentences(random: Random) -> ArgumentSentences:
+    tokens: List[str] = ["laptop", "desktop", "is", "better", "cheaper", "."]
+    labels: List[ArgumentLabel] = list(ArgumentLabel)
+    return [
+        [
+            ArgumentTag(
+                random.choice(labels),
+                random.choice([0.0, 0.25, 0.5, 0.75, 1.0]),
+                random.choice(tokens),
+            )
+            for _ in range(random.randint(0, 10))
+        ]
+        for _ in range(random.randint(0, 5))
+    ]
+
+
+class StandInRerankingContext(RerankingContext):
+    """
+    Reranking context with lower-cased word terms and no index statistics.
+    """
+
+    @property
+    def document_count(self) -> int:
+        return 1000
+
+    def document_frequency(self, term: str) -> int:
+        return len(term)
+
+    def inverse_document_frequency(self, term: str) -> float:
+        return 1 / len(term)
+
+    @cache
+    def terms(self, text: str) -> List[str]:
+        return findall(r"\w+", text.lower())
+
+    def term_set(self, text: str) -> Set[str]:
+        return set(self.terms(text))
+
+    def term_frequency(self, text: str, term: str) -> float:
+        terms = self.terms(text)
+        return terms.count(term) / len(terms)
+
+    def tf_idf_score(self, query: Query, document: Document) -> float:
+        return sum(
+            self.term_frequency(document.content, term) *
+            self.inverse_document_frequency(term)
+            for term in self.terms(query.title)
+        )
+
+    def bm25_score(
+            self,
+            query: Query,
+            document: Document,
+            k1: float = 1.2,
+            b: float = 0.75
+    ) -> float:
+        return self.tf_idf_score(query, document)
+
+    def pl2_score(
+            self,
+            query: Query,
+            document: Document,
+            c: float = 0.1
+    ) -> float:
+        return self.tf_idf_score(query, document)
+
+    def ql_score(
+            self,
+            query: Query,
+            document: Document,
+            mu: float = 1000
+    ) -> float:
+        return self.tf_idf_score(query, document)
+
+
+QUERY = Query(1, "Is a laptop better than a desktop?", ("laptop", "desktop"),
+              "", "")
+
+
+def random_ranking(
+        random: Random,
+        size: int
+) -> List[ArgumentQualityStanceRankedDocument]:
+    words = ["laptop", "desktop", "is", "better", "cheaper", "than", "a"]
+    ranking = []
+    for rank in range(1, size + 1):
+        # Documents of approximately the same length.
+        terms = [random.choice(words) for _ in range(random.randint(57, 63))]
+        splits = sorted(random.sample(range(1, len(terms)), 3))
+        sentences = [
+            " ".join(terms[start:end]) + "."
+            for start, end in zip([0, *splits], [*splits, len(terms)])
+        ]
+        ranking.append(ArgumentQualityStanceRankedDocument(
+            id=f"doc-{rank}",
+            content=" ".join(sentences),
+            fields={},
+            score=1 / rank,
+            rank=rank,
+            sentences=sentences,
+            arguments={"model": PackedArgumentSentences.from_sentences(
+                random_sentences(random)
+            )},
+            qualities=[
+                ArgumentQualitySentence(sentence, random.random())
+                for sentence in sentences
+            ],
+            stances=[
+                ArgumentStanceSentence(sentence, random.uniform(-1, 1))
+                for sentence in sentences
+            ],
+        ))
+    return ranking
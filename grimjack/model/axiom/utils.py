@@ -1,13 +1,20 @@
 from bisect import bisect_left
 from collections import Counter, defaultdict
+from dataclasses import dataclass
 from functools import lru_cache
-from itertools import product, combinations
+from itertools import combinations
 from statistics import mean
-from typing import List, Set, Iterator
+from pathlib import Path
+from typing import List, Set, Iterator, Dict, Tuple, Optional
 
 from nltk.corpus import wordnet
+from numpy import (
+    ndarray, maximum, minimum, zeros, full, unique, fromiter, int64,
+    where
+)
 
 from grimjack.model import RankedDocument, Query
+from grimjack.model.axiom.wordnet import wordnet_table
 from grimjack.modules import RerankingContext
 from grimjack.utils.nltk import download_nltk_dependencies
 
@@ -97,10 +104,123 @@ def approximately_same_length(
     return approximately_equal(
         len(context.terms(document1.content)),
         len(context.terms(document2.content)),
-        margin_fraction
+        margin_fraction=margin_fraction
     )
 
 
+def approximately_same_length_matrix(
+        context: RerankingContext,
+        documents: List[RankedDocument],
+        margin_fraction: float = 0.1
+) -> ndarray:
+    """
+    Pairwise approximately_same_length() for all pairs of documents.
+    """
+    lengths = term_matrix(context, documents).lengths.astype(float)
+    larger = maximum(lengths[:, None], lengths[None, :])
+    smaller = minimum(lengths[:, None], lengths[None, :])
+    # Lengths are never negative, so the larger length is within the margin.
+    return (larger == 0) | (smaller > larger * (1 - margin_fraction))
+
+
+@dataclass(frozen=True)
+class TermMatrix:
+    """
+    Which terms occur in which documents of a ranking,
+    as a boolean documents × vocabulary matrix.
+    """
+    vocabulary: Dict[str, int]
+    matrix: ndarray
+    # Number of terms (not unique) of each document.
+    lengths: ndarray
+
+    def query_term_matrix(self, query_terms: Set[str]) -> ndarray:
+        """
+        Which query terms occur in which documents.
+        Query terms that occur in no document are left out.
+        """
+        columns = [
+            self.vocabulary[term]
+            for term in query_terms
+            if term in self.vocabulary
+        ]
+        return self.matrix[:, columns]
+
+
+@lru_cache(16)
+def _term_matrix(
+        context: RerankingContext,
+        texts: Tuple[str, ...]
+) -> TermMatrix:
+    vocabulary: Dict[str, int] = {}
+    rows: List[int] = []
+    columns: List[int] = []
+    for row, text in enumerate(texts):
+        for term in context.term_set(text):
+            rows.append(row)
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+    matrix = zeros((len(texts), len(vocabulary)), dtype=bool)
+    matrix[rows, columns] = True
+    lengths = fromiter(
+        (len(context.terms(text)) for text in texts),
+        dtype=int64,
+        count=len(texts)
+    )
+    return TermMatrix(vocabulary, matrix, lengths)
+
+
+def term_matrix(
+        context: RerankingContext,
+        documents: List[RankedDocument]
+) -> TermMatrix:
+    """
+    Term matrix of the documents, built once and shared
+    by all axioms that compare the same ranking.
+    """
+    return _term_matrix(
+        context,
+        tuple(document.content for document in documents)
+    )
+
+
+def all_query_terms_in_documents_matrix(
+        context: RerankingContext,
+        query: Query,
+        documents: List[RankedDocument]
+) -> ndarray:
+    """
+    Pairwise all_query_terms_in_documents() for all pairs of documents.
+    """
+    query_terms = context.term_set(query.title)
+    if len(query_terms) <= 1:
+        return full((len(documents), len(documents)), False)
+    contains_all = term_matrix(context, documents).query_term_matrix(
+        query_terms
+    ).sum(axis=1) == len(query_terms)
+    return contains_all[:, None] & contains_all[None, :]
+
+
+def same_query_term_subset_matrix(
+        context: RerankingContext,
+        query: Query,
+        documents: List[RankedDocument]
+) -> ndarray:
+    """
+    Pairwise same_query_term_subset() for all pairs of documents.
+    """
+    query_terms = context.term_set(query.title)
+    if len(query_terms) <= 1:
+        return full((len(documents), len(documents)), False)
+    query_term_matrix = term_matrix(context, documents).query_term_matrix(
+        query_terms
+    )
+    # Documents with the same subset of query terms share the same ID.
+    _, subsets = unique(query_term_matrix, axis=0, return_inverse=True)
+    subsets = subsets.reshape(-1)
+    at_least_two = query_term_matrix.sum(axis=1) > 1
+    return (subsets[:, None] == subsets[None, :]) & at_least_two[:, None]
+
+
 @lru_cache(2048)
 def synonym_set(
         term: str,
@@ -114,24 +234,16 @@ def synonym_set(
 def synonym_set_similarity(
         term1: str,
         term2: str,
-        smoothing: int = 0
+        smoothing: int = 0,
+        cache_dir: Optional[Path] = None
 ) -> float:
-    synonyms_term1 = synonym_set(term1, smoothing)
-    synonyms_term2 = synonym_set(term2, smoothing)
-
-    n = 0
-    similarity_sum = 0
-
-    for synonym1, synonym2 in product(synonyms_term1, synonyms_term2):
-        similarity = wordnet.wup_similarity(synonym1, synonym2)
-        if similarity is not None:
-            similarity_sum += similarity
-            n += 1
-
-    if n == 0:
-        return 0
-
-    return similarity_sum / n
+    """
+    Average Wu-Palmer similarity of the terms' first synsets,
+    from the precomputed WordNet table instead of the NLTK corpus.
+    """
+    return wordnet_table(cache_dir).synonym_set_similarity(
+        term1, term2, smoothing
+    )
 
 
 def vocabulary_overlap(vocabulary1: Set[str], vocabulary2: Set[str]):
@@ -147,6 +259,28 @@ def vocabulary_overlap(vocabulary1: Set[str], vocabulary2: Set[str]):
     )
 
 
+def vocabulary_overlap_matrix(
+        context: RerankingContext,
+        documents: List[RankedDocument]
+) -> ndarray:
+    """
+    Pairwise vocabulary_overlap() of the documents' term sets
+    for all pairs of documents.
+    """
+    matrix = term_matrix(context, documents).matrix.astype(float)
+    intersection_lengths = matrix @ matrix.T
+    vocabulary_lengths = intersection_lengths.diagonal()
+    union_lengths = (
+            vocabulary_lengths[:, None] + vocabulary_lengths[None, :] -
+            intersection_lengths
+    )
+    return where(
+        intersection_lengths > 0,
+        intersection_lengths / maximum(union_lengths, 1),
+        0
+    )
+
+
 def average_between_query_terms(
         query_terms: Set[str],
         document_terms: List[str]
@@ -0,0 +1,359 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from threading import Lock
+from typing import Dict, List, Tuple, Optional, Any
+from zlib import compress, decompress
+
+from numpy import (
+    ndarray, array, asarray, full, inf, nan, isfinite, searchsorted, unique,
+    concatenate, where, take_along_axis, int16, int32, int64, nanmean, empty
+)
+
+from grimjack.utils.nltk import download_nltk_dependencies
+
+
+# Suffixes of the WordNet database files by part of speech.
+_FILE_SUFFIXES = {"n": "noun", "v": "verb", "a": "adj", "r": "adv"}
+
+
+@dataclass(eq=False)
+class WordNetTable:
+    """
+    Compact copy of the WordNet lemma index and hypernym hierarchy,
+    precomputed once from the WordNet database files.
+    Synsets are identified by their rank when sorted by name.
+    Synsets and Wu-Palmer similarities are computed like with NLTK,
+    without loading the WordNet corpus.
+    """
+    parts_of_speech: List[str]
+    # Synset IDs by lemma and part of speech.
+    lemmas: Dict[str, Dict[str, List[int]]]
+    # Base forms by part of speech and inflected form.
+    exceptions: Dict[str, Dict[str, List[str]]]
+    substitutions: Dict[str, List[Tuple[str, str]]]
+    # Hypernyms (including the synset itself) with their shortest distance,
+    # stored for synset i between offsets i and i + 1.
+    ancestor_offsets: ndarray
+    ancestors: ndarray
+    ancestor_distances: ndarray
+    min_depths: ndarray
+    max_depths: ndarray
+    # Distance to a simulated root, one more than to the farthest hypernym.
+    root_distances: ndarray
+    needs_root: ndarray
+    # Rank of the simulated root's name among the synset names.
+    root_rank: int
+
+    # Maximum number of terms and term pairs to keep in memory.
+    max_cache_size: int = 2 ** 16
+
+    _synsets_cache: "OrderedDict[str, ndarray]" = field(
+        default_factory=OrderedDict,
+        init=False,
+        repr=False
+    )
+    _similarities_cache: "OrderedDict[Tuple[str, str, int], float]" = field(
+        default_factory=OrderedDict,
+        init=False,
+        repr=False
+    )
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    @staticmethod
+    def build(reader: Any = None) -> "WordNetTable":
+        """
+        Precompute the table from a WordNet corpus reader,
+        by default from NLTK's WordNet corpus.
+        """
+        from nltk.corpus.reader.wordnet import POS_LIST
+        if reader is None:
+            from nltk.corpus import wordnet
+            download_nltk_dependencies("wordnet")
+            reader = wordnet
+        # Synsets are ordered by name.
+        synsets = sorted(reader.all_synsets())
+        names = [synset.name() for synset in synsets]
+        ids = {name: index for index, name in enumerate(names)}
+
+        hypernym_distances: Dict[int, Dict[int, int]] = {}
+
+        def shortest_distances(synset: Any) -> Dict[int, int]:
+            # Shortest distance to each hypernym, including the synset itself.
+            synset_id = ids[synset.name()]
+            if synset_id not in hypernym_distances:
+                distances = {synset_id: 0}
+                for hypernym in (
+                        synset.hypernyms() + synset.instance_hypernyms()
+                ):
+                    for ancestor, distance in shortest_distances(
+                            hypernym
+                    ).items():
+                        if distances.get(ancestor, inf) > distance + 1:
+                            distances[ancestor] = distance + 1
+                hypernym_distances[synset_id] = distances
+            return hypernym_distances[synset_id]
+
+        ancestor_offsets: List[int] = [0]
+        ancestors: List[int] = []
+        ancestor_distances: List[int] = []
+        for synset in synsets:
+            distances = sorted(shortest_distances(synset).items())
+            ancestors.extend(ancestor for ancestor, _ in distances)
+            ancestor_distances.extend(distance for _, distance in distances)
+            ancestor_offsets.append(len(ancestors))
+
+        lemmas: Dict[str, Dict[str, List[int]]] = {}
+        exceptions: Dict[str, Dict[str, List[str]]] = {}
+        for pos in POS_LIST:
+            suffix = _FILE_SUFFIXES[pos]
+            # Lemma index lines are: lemma, part of speech, synset count,
+            # pointer count, pointers, sense count, tagged sense count,
+            # synset offsets.
+            with reader.open(f"index.{suffix}") as file:
+                for line in file:
+                    if line.startswith(" "):
+                        continue
+                    fields = line.split()
+                    count = int(fields[2])
+                    start = 6 + int(fields[3])
+                    lemmas.setdefault(fields[0], {})[pos] = [
+                        ids[reader.synset_from_pos_and_offset(
+                            pos, int(offset)
+                        ).name()]
+                        for offset in fields[start:start + count]
+                    ]
+            # Exception lines are: inflected form, base forms.
+            with reader.open(f"{suffix}.exc") as file:
+                exceptions[pos] = {
+                    fields[0]: fields[1:]
+                    for fields in (line.split() for line in file)
+                    if len(fields) > 0
+                }
+
+        # Only nouns share a unique root, except in WordNet 1.6.
+        shared_root = reader.get_version() != "1.6"
+        return WordNetTable(
+            parts_of_speech=list(POS_LIST),
+            lemmas=lemmas,
+            exceptions=exceptions,
+            substitutions={
+                pos: list(reader.MORPHOLOGICAL_SUBSTITUTIONS[pos])
+                for pos in POS_LIST
+            },
+            ancestor_offsets=array(ancestor_offsets, dtype=int64),
+            ancestors=array(ancestors, dtype=int32),
+            ancestor_distances=array(ancestor_distances, dtype=int16),
+            min_depths=array(
+                [synset.min_depth() for synset in synsets],
+                dtype=int16
+            ),
+            max_depths=array(
+                [synset.max_depth() for synset in synsets],
+                dtype=int16
+            ),
+            root_distances=array(
+                [
+                    max(ancestor_distances[start:end]) + 1
+                    for start, end in zip(
+                        ancestor_offsets, ancestor_offsets[1:]
+                    )
+                ],
+                dtype=int16
+            ),
+            needs_root=array(
+                [
+                    synset.pos() != "n" or not shared_root
+                    for synset in synsets
+                ],
+                dtype=bool
+            ),
+            root_rank=bisect_left(names, "*ROOT*"),
+        )
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            name: value
+            for name, value in self.__dict__.items()
+            if not name.startswith("_")
+        }
+        path.write_bytes(compress(dumps(state, protocol=HIGHEST_PROTOCOL)))
+
+    @staticmethod
+    def load(path: Path) -> "WordNetTable":
+        return WordNetTable(**loads(decompress(path.read_bytes())))
+
+    def _morphy(self, form: str, pos: str) -> List[str]:
+        if form in self.exceptions[pos]:
+            forms = self.exceptions[pos][form]
+        else:
+            forms = [
+                form[:-len(old)] + new
+                for old, new in self.substitutions[pos]
+                if form.endswith(old)
+            ]
+        lemmas: List[str] = []
+        for lemma in [form, *forms]:
+            if pos in self.lemmas.get(lemma, {}) and lemma not in lemmas:
+                lemmas.append(lemma)
+        return lemmas
+
+    def _remember(self, cache: OrderedDict, key: Any, value: Any) -> None:
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self.max_cache_size:
+                cache.popitem(last=False)
+
+    def _recall(self, cache: OrderedDict, key: Any) -> Any:
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def synsets(self, term: str) -> ndarray:
+        """
+        IDs of the term's synsets, in the same order as from NLTK.
+        """
+        synsets = self._recall(self._synsets_cache, term)
+        if synsets is None:
+            lemma = term.lower()
+            synsets = array([
+                synset
+                for pos in self.parts_of_speech
+                for form in self._morphy(lemma, pos)
+                for synset in self.lemmas[form][pos]
+            ], dtype=int64)
+            self._remember(self._synsets_cache, term, synsets)
+        return synsets
+
+    def _distances(self, synsets: ndarray, universe: ndarray) -> ndarray:
+        # Distances from each synset to each synset of the (sorted) universe,
+        # or infinity if not a hypernym.
+        distances = full((len(synsets), len(universe)), inf)
+        for row, synset in enumerate(synsets.tolist()):
+            start = self.ancestor_offsets[synset]
+            end = self.ancestor_offsets[synset + 1]
+            columns = searchsorted(universe, self.ancestors[start:end])
+            distances[row, columns] = self.ancestor_distances[start:end]
+        return distances
+
+    def wup_similarities(
+            self,
+            synsets1: ndarray,
+            synsets2: ndarray
+    ) -> ndarray:
+        """
+        Wu-Palmer similarity of all pairs of synsets,
+        like wup_similarity() from NLTK with a simulated root.
+        NaN if the synsets have no common hypernym.
+        """
+        synsets1 = asarray(synsets1, dtype=int64)
+        synsets2 = asarray(synsets2, dtype=int64)
+        if len(synsets1) == 0 or len(synsets2) == 0:
+            return empty((len(synsets1), len(synsets2)))
+        universe = unique(concatenate([
+            self.ancestors[
+                self.ancestor_offsets[synset]:
+                self.ancestor_offsets[synset + 1]
+            ]
+            for synset in concatenate((synsets1, synsets2)).tolist()
+        ])).astype(int64)
+        distances1 = self._distances(synsets1, universe)
+        distances2 = self._distances(synsets2, universe)
+        common = (
+                isfinite(distances1)[:, None, :] &
+                isfinite(distances2)[None, :, :]
+        )
+
+        # Choose the common hypernym with the largest minimum depth,
+        # then the first synset itself, then the first by name.
+        # Ranks are doubled to fit the simulated root in between.
+        size = len(self.min_depths)
+        scores = (
+                self.min_depths[universe].astype(int64) * 8 * size +
+                (2 * size - 2 * universe)
+        )[None, None, :] + 4 * size * (
+                universe[None, None, :] == synsets1[:, None, None]
+        )
+        scores = where(common, scores, -1)
+        best = scores.argmax(axis=2)
+        best_scores = take_along_axis(scores, best[:, :, None], 2)[:, :, 0]
+        has_common = best_scores >= 0
+        # The simulated root has minimum depth 0.
+        root_score = 2 * size - (2 * self.root_rank - 1)
+        use_root = (
+                (
+                        self.needs_root[synsets1][:, None] |
+                        self.needs_root[synsets2][None, :]
+                ) &
+                (~has_common | (best_scores < root_score))
+        )
+
+        subsumers = universe[best]
+        depths = where(use_root, 1, self.max_depths[subsumers] + 1)
+        # Shortest paths from both synsets to the subsumer,
+        # via any common hypernym.
+        subsumer_distances = self._distances(universe, universe)[best]
+        lengths1 = (distances1[:, None, :] + subsumer_distances).min(axis=2)
+        lengths2 = (distances2[None, :, :] + subsumer_distances).min(axis=2)
+        lengths1 = where(
+            use_root,
+            self.root_distances[synsets1][:, None],
+            lengths1
+        )
+        lengths2 = where(
+            use_root,
+            self.root_distances[synsets2][None, :],
+            lengths2
+        )
+        similarities = 2 * depths / (lengths1 + lengths2 + 2 * depths)
+        return where(has_common | use_root, similarities, nan)
+
+    def synonym_set_similarity(
+            self,
+            term1: str,
+            term2: str,
+            smoothing: int = 0
+    ) -> float:
+        """
+        Average Wu-Palmer similarity of the terms' first synsets,
+        memoized by term pair.
+        """
+        key = (term1, term2, smoothing)
+        similarity = self._recall(self._similarities_cache, key)
+        if similarity is None:
+            cutoff = smoothing + 1
+            similarities = self.wup_similarities(
+                self.synsets(term1)[:cutoff],
+                self.synsets(term2)[:cutoff],
+            )
+            similarity = (
+                float(nanmean(similarities))
+                if isfinite(similarities).any() else 0.0
+            )
+            self._remember(self._similarities_cache, key, similarity)
+        return similarity
+
+
+_WORDNET_TABLE_FILE = "wordnet.pickle.zlib"
+
+
+@lru_cache(maxsize=None)
+def wordnet_table(cache_dir: Optional[Path] = None) -> WordNetTable:
+    """
+    Load the WordNet table from the cache directory,
+    or build it with NLTK on first use.
+    """
+    if cache_dir is None:
+        return WordNetTable.build()
+    path = cache_dir / _WORDNET_TABLE_FILE
+    if path.exists():
+        return WordNetTable.load(path)
+    table = WordNetTable.build()
+    table.save(path)
+    return table
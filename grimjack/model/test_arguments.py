@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+from pytest import fixture
+from targer_api import ArgumentSentences, ArgumentTag, ArgumentLabel
+
+from grimjack.model.arguments import (
+    PackedArgumentSentences, ArgumentVocabulary
+)
+from grimjack.model.axiom.testing import random_sentences
+
+
+@fixture
+def sentences() -> ArgumentSentences:
+    return random_sentences(Random(0))
+
+
+def test_packed_round_trip(sentences: ArgumentSentences) -> None:
+    vocabulary = ArgumentVocabulary()
+    packed = PackedArgumentSentences.from_sentences(sentences, vocabulary)
+    assert len(packed) == len(sentences)
+    assert list(packed) == sentences
+    assert packed == sentences
+    assert packed.sentences == sentences
+    assert packed[-1] == sentences[-1]
+    assert len(vocabulary) <= 6
+    assert packed.tokens == [
+        tag.token
+        for sentence in sentences
+        for tag in sentence
+    ]
+
+
+def test_packed_sentence_ids(sentences: ArgumentSentences) -> None:
+    packed = PackedArgumentSentences.from_sentences(sentences)
+    assert packed.sentence_ids.tolist() == [
+        i
+        for i, sentence in enumerate(sentences)
+        for _ in sentence
+    ]
+
+
+def test_packed_empty() -> None:
+    packed = PackedArgumentSentences.from_sentences([])
+    assert len(packed) == 0
+    assert list(packed) == []
+    assert packed.tokens == []
+
+
+def test_vocabulary_concurrent_ids() -> None:
+    vocabulary = ArgumentVocabulary()
+    tokens = [f"token-{i}" for i in range(1000)]
+    with ThreadPoolExecutor(8) as executor:
+        ids = list(executor.map(
+            lambda _: [vocabulary.id(token) for token in tokens],
+            range(8)
+        ))
+    assert all(thread_ids == ids[0] for thread_ids in ids)
+    assert len(vocabulary) == len(tokens)
+    assert [vocabulary.token(token_id) for token_id in ids[0]] == tokens
+
+
+def test_packed_probability_precision() -> None:
+    packed = PackedArgumentSentences.from_sentences(
+        [[ArgumentTag(ArgumentLabel.C_B, 0.5001, "laptop")]],
+        ArgumentVocabulary()
+    )
+    # Must stay above the 0.5 threshold for claims and premises.
+    assert packed.sentences[0][0].probability > 0.5
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Set, Dict
+from typing import List, Set, Dict, Iterator, Sequence
 
 from math import floor
 
@@ -18,6 +18,11 @@ class DocumentsStore(ABC):
     def documents_dir(self) -> Path:
         pass
 
+    @property
+    @abstractmethod
+    def documents(self) -> Iterator[Document]:
+        pass
+
 
 class TopicsStore(ABC):
     @property
@@ -75,6 +80,12 @@ class QueryTitleExpander(QueryExpander, ABC):
         pass
 
 
+class SentenceSegmenter(ABC):
+    @abstractmethod
+    def segment(self, text: str) -> List[str]:
+        pass
+
+
 class Searcher(ABC):
     @abstractmethod
     def search(self, query: Query) -> List[RankedDocument]:
@@ -119,6 +130,26 @@ class RerankingContext(ABC):
     def term_frequency(self, text: str, term: str) -> float:
         pass
 
+    def query_term_positions(
+            self,
+            query: Query,
+            documents: Sequence[Document]
+    ) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Sorted positions of each query term in each document,
+        by document ID and term.
+        Only query terms that occur in a document are included.
+        """
+        query_terms = self.term_set(query.title)
+        positions: Dict[str, Dict[str, List[int]]] = {}
+        for document in documents:
+            document_positions: Dict[str, List[int]] = {}
+            for index, term in enumerate(self.terms(document.content)):
+                if term in query_terms:
+                    document_positions.setdefault(term, []).append(index)
+            positions[document.id] = document_positions
+        return positions
+
     @abstractmethod
     def tf_idf_score(
             self,
@@ -3,33 +3,36 @@ from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from statistics import mean
-from typing import Optional, List
-
-from nltk import sent_tokenize
+from typing import Optional, List, Dict, Tuple, ContextManager, Union
 
 from grimjack.api.debater import CachedDebaterArgumentStanceScorer
-from grimjack.api.huggingface import CachedHuggingfaceTextGenerator
+from grimjack.api.huggingface import HuggingfaceTransport
+from grimjack.api.rate_limit import RateLimiter
+from grimjack.api.transformers import (
+    TextGenerator, text_generator, CachedTransformersArgumentStanceScorer
+)
 from grimjack.model import Query
 from grimjack.model.quality import ArgumentQualityRankedDocument
 from grimjack.model.stance import (
     ArgumentQualityStanceRankedDocument, ArgumentStanceSentence
 )
 from grimjack.modules import ArgumentQualityStanceTagger
-from grimjack.utils.nltk import download_nltk_dependencies
 
 
-@dataclass
-class DebaterArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
-    debater_api_token: str
-    cache_path: Optional[Path] = None
+_ArgumentStanceScorer = Union[
+    CachedDebaterArgumentStanceScorer,
+    CachedTransformersArgumentStanceScorer,
+]
 
-    @contextmanager
-    def _scorer(self) -> CachedDebaterArgumentStanceScorer:
-        with CachedDebaterArgumentStanceScorer(
-                self.debater_api_token,
-                self.cache_path
-        ) as scorer:
-            yield scorer
+
+class ScoredArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
+    """
+    Tag stance by comparing scores for claims about each comparative object.
+    """
+
+    @abstractmethod
+    def _scorer(self) -> ContextManager[_ArgumentStanceScorer]:
+        pass
 
     def _comparative_objects_claims(self, query: Query) -> List[str]:
         if query.comparative_objects is None:
@@ -42,45 +45,42 @@ class DebaterArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
             query: Query,
             ranking: List[ArgumentQualityRankedDocument]
     ) -> List[ArgumentQualityStanceRankedDocument]:
-        download_nltk_dependencies("punkt")
+        sentences = [
+            sentence
+            for document in ranking
+            for sentence in document.sentences
+        ]
+        claims = self._comparative_objects_claims(query)
         with self._scorer() as scorer:
-            sentences = [
-                sentence
-                for document in ranking
-                for sentence in sent_tokenize(document.content)
-            ]
-            claims = self._comparative_objects_claims(query)
-            scorer.preload(claims, sentences)
-            return [
-                self._tag_document(scorer, query, document)
-                for document in ranking
-            ]
+            scores = scorer.scores(claims, sentences)
+        return [
+            self._tag_document(scores, query, document)
+            for document in ranking
+        ]
 
     def _tag_document(
             self,
-            scorer: CachedDebaterArgumentStanceScorer,
+            scores: Dict[Tuple[str, str], float],
             query: Query,
             document: ArgumentQualityRankedDocument
     ) -> ArgumentQualityStanceRankedDocument:
-        sentences = sent_tokenize(document.content)
-
         stances: List[ArgumentStanceSentence]
         if query.comparative_objects is None:
             stances = [
                 ArgumentStanceSentence(sentence, 0)
-                for sentence in sentences
+                for sentence in document.sentences
             ]
         else:
             stances = [
                 ArgumentStanceSentence(
                     sentence,
                     self.stance(
-                        scorer,
+                        scores,
                         query,
                         sentence
                     )
                 )
-                for sentence in sentences
+                for sentence in document.sentences
             ]
 
         return ArgumentQualityStanceRankedDocument(
@@ -89,6 +89,7 @@ class DebaterArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=document.qualities,
             stances=stances
@@ -99,23 +100,24 @@ class DebaterArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
             query: Query,
             document: ArgumentQualityRankedDocument
     ) -> ArgumentQualityStanceRankedDocument:
-        download_nltk_dependencies("punkt")
+        claims = self._comparative_objects_claims(query)
         with self._scorer() as scorer:
-            return self._tag_document(scorer, query, document)
+            scores = scorer.scores(claims, document.sentences)
+        return self._tag_document(scores, query, document)
 
     def stance(
             self,
-            scorer: CachedDebaterArgumentStanceScorer,
+            scores: Dict[Tuple[str, str], float],
             query: Query,
             sentence: str
     ) -> float:
         object_a, object_b = query.comparative_objects
         stance_a = mean(
-            scorer.score(claim_a, sentence)
+            scores[claim_a, sentence]
             for claim_a in self.claims(object_a)
         )
         stance_b = mean(
-            scorer.score(claim_b, sentence)
+            scores[claim_b, sentence]
             for claim_b in self.claims(object_b)
         )
         return stance_a - stance_b
@@ -125,6 +127,28 @@ class DebaterArgumentQualityStanceTagger(ArgumentQualityStanceTagger, ABC):
         pass
 
 
+@dataclass
+class DebaterArgumentQualityStanceTagger(
+    ScoredArgumentQualityStanceTagger, ABC
+):
+    debater_api_token: str
+    cache_path: Optional[Path] = None
+    chunk_size: int = 500
+    max_workers: int = 4
+    rate_limiter: Optional[RateLimiter] = None
+
+    @contextmanager
+    def _scorer(self) -> CachedDebaterArgumentStanceScorer:
+        with CachedDebaterArgumentStanceScorer(
+                self.debater_api_token,
+                self.cache_path,
+                self.chunk_size,
+                self.max_workers,
+                self.rate_limiter,
+        ) as scorer:
+            yield scorer
+
+
 class DebaterArgumentQualityObjectStanceTagger(
     DebaterArgumentQualityStanceTagger
 ):
@@ -143,18 +167,53 @@ class DebaterArgumentQualitySentimentStanceTagger(
         ]
 
 
+@dataclass
+class TransformersArgumentQualityStanceTagger(
+    ScoredArgumentQualityStanceTagger
+):
+    model: str
+    cache_path: Optional[Path] = None
+    batch_size: int = 64
+    quantize: bool = True
+
+    @contextmanager
+    def _scorer(self) -> CachedTransformersArgumentStanceScorer:
+        with CachedTransformersArgumentStanceScorer(
+                self.model,
+                self.cache_path,
+                self.batch_size,
+                self.quantize,
+        ) as scorer:
+            yield scorer
+
+    def claims(self, comparative_object: str) -> List[str]:
+        return [
+            f"{comparative_object} is good",
+            f"{comparative_object} is better",
+        ]
+
+
 @dataclass
 class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
     model: str
     api_key: str
     cache_path: Optional[Path] = None
+    transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST
+    max_in_flight: int = 8
+    rate_limiter: Optional[RateLimiter] = None
+    # Number of texts to generate at once with the local transport.
+    batch_size: int = 16
 
     @contextmanager
-    def _generator(self) -> CachedHuggingfaceTextGenerator:
-        with CachedHuggingfaceTextGenerator(
-                model=self.model,
-                api_key=self.api_key,
-                cache_dir=self.cache_path,
+    def _generator(self) -> TextGenerator:
+        with text_generator(
+                self.model,
+                self.api_key,
+                self.cache_path,
+                self.transport,
+                self.max_in_flight,
+                self.rate_limiter,
+                self.batch_size,
         ) as generator:
             yield generator
 
@@ -174,14 +233,14 @@ class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
 
     def _stance_single_target(
             self,
-            generator: CachedHuggingfaceTextGenerator,
+            answers: Dict[str, str],
             comparative_object: str,
             sentence: str
     ) -> float:
         task_pro = self._task_pro(comparative_object, sentence)
-        answer_pro = generator.generate(task_pro).strip().lower()
+        answer_pro = answers[task_pro].strip().lower()
         task_con = self._task_con(comparative_object, sentence)
-        answer_con = generator.generate(task_con).strip().lower()
+        answer_con = answers[task_con].strip().lower()
         is_pro = (
                 ("yes" in answer_pro or "pro" in answer_pro) and
                 "no" not in answer_pro
@@ -199,18 +258,18 @@ class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
 
     def _stance_multi_target(
             self,
-            generator: CachedHuggingfaceTextGenerator,
+            answers: Dict[str, str],
             query: Query,
             sentence: str
     ) -> float:
         object_a, object_b = query.comparative_objects
-        stance_a = self._stance_single_target(generator, object_a, sentence)
-        stance_b = self._stance_single_target(generator, object_b, sentence)
+        stance_a = self._stance_single_target(answers, object_a, sentence)
+        stance_b = self._stance_single_target(answers, object_b, sentence)
         return stance_a - stance_b
 
     def _tag_document(
             self,
-            generator: CachedHuggingfaceTextGenerator,
+            answers: Dict[str, str],
             query: Query,
             document: ArgumentQualityRankedDocument
     ) -> ArgumentQualityStanceRankedDocument:
@@ -222,7 +281,7 @@ class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
             stances = [ArgumentStanceSentence(
                 document.content,
                 self._stance_multi_target(
-                    generator,
+                    answers,
                     query,
                     document.content
                 )
@@ -234,35 +293,42 @@ class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=document.qualities,
             stances=stances
         )
 
+    def _tasks(
+            self,
+            query: Query,
+            ranking: List[ArgumentQualityRankedDocument]
+    ) -> List[str]:
+        if query.comparative_objects is None:
+            return []
+        tasks_pro = [
+            self._task_pro(comparative_object, document.content)
+            for comparative_object in query.comparative_objects
+            for document in ranking
+        ]
+        tasks_con = [
+            self._task_con(comparative_object, document.content)
+            for comparative_object in query.comparative_objects
+            for document in ranking
+        ]
+        return [*tasks_pro, *tasks_con]
+
     def tag_ranking(
             self,
             query: Query,
             ranking: List[ArgumentQualityRankedDocument]
     ) -> List[ArgumentQualityStanceRankedDocument]:
-        tasks = []
-        if query.comparative_objects is not None:
-            tasks_pro = [
-                self._task_pro(comparative_object, document.content)
-                for comparative_object in query.comparative_objects
-                for document in ranking
-            ]
-            tasks_con = [
-                self._task_con(comparative_object, document.content)
-                for comparative_object in query.comparative_objects
-                for document in ranking
-            ]
-            tasks = [*tasks_pro, *tasks_con]
         with self._generator() as generator:
-            generator.preload(tasks)
-            return [
-                self._tag_document(generator, query, document)
-                for document in ranking
-            ]
+            answers = generator.generate_many(self._tasks(query, ranking))
+        return [
+            self._tag_document(answers, query, document)
+            for document in ranking
+        ]
 
     def tag_document(
             self,
@@ -270,7 +336,8 @@ class HuggingfaceArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
             document: ArgumentQualityRankedDocument
     ) -> ArgumentQualityStanceRankedDocument:
         with self._generator() as generator:
-            return self._tag_document(generator, query, document)
+            answers = generator.generate_many(self._tasks(query, [document]))
+        return self._tag_document(answers, query, document)
 
 
 @dataclass
@@ -302,6 +369,7 @@ class ThresholdArgumentQualityStanceTagger(ArgumentQualityStanceTagger):
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=document.qualities,
             stances=[
@@ -1,65 +1,59 @@
+from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List
-
-from nltk import sent_tokenize
+from typing import Optional, List, Dict, ContextManager, Union
 
 from grimjack.api.debater import CachedDebaterArgumentQualityScorer
-from grimjack.api.huggingface import CachedHuggingfaceTextGenerator
+from grimjack.api.huggingface import HuggingfaceTransport
+from grimjack.api.rate_limit import RateLimiter
+from grimjack.api.transformers import (
+    TextGenerator, text_generator, CachedTransformersArgumentQualityScorer
+)
 from grimjack.model import Query
 from grimjack.model.arguments import ArgumentRankedDocument
 from grimjack.model.quality import (
     ArgumentQualityRankedDocument, ArgumentQualitySentence
 )
 from grimjack.modules import ArgumentQualityTagger
-from grimjack.utils.nltk import download_nltk_dependencies
 
 
-@dataclass
-class DebaterArgumentQualityTagger(ArgumentQualityTagger):
-    debater_api_token: str
-    cache_path: Optional[Path] = None
+_ArgumentQualityScorer = Union[
+    CachedDebaterArgumentQualityScorer,
+    CachedTransformersArgumentQualityScorer,
+]
 
-    @contextmanager
-    def _scorer(self) -> CachedDebaterArgumentQualityScorer:
-        with CachedDebaterArgumentQualityScorer(
-                self.debater_api_token,
-                self.cache_path
-        ) as scorer:
-            yield scorer
+
+class ScoredArgumentQualityTagger(ArgumentQualityTagger, ABC):
+    @abstractmethod
+    def _scorer(self) -> ContextManager[_ArgumentQualityScorer]:
+        pass
 
     def tag_ranking(
             self,
             query: Query,
             ranking: List[ArgumentRankedDocument]
     ) -> List[ArgumentQualityRankedDocument]:
-        download_nltk_dependencies("punkt")
         sentences = [
             sentence
             for document in ranking
-            for sentence in sent_tokenize(document.content)
+            for sentence in document.sentences
         ]
         with self._scorer() as scorer:
-            scorer.preload(query.title, sentences)
-            return [
-                self._tag_document(scorer, query, document)
-                for document in ranking
-            ]
+            scores = scorer.scores(query.title, sentences)
+        return [
+            self._tag_document(scores, document)
+            for document in ranking
+        ]
 
+    @staticmethod
     def _tag_document(
-            self,
-            scorer: CachedDebaterArgumentQualityScorer,
-            query: Query,
+            scores: Dict[str, float],
             document: ArgumentRankedDocument
     ) -> ArgumentQualityRankedDocument:
-        sentences = sent_tokenize(document.content)
         qualities = [
-            ArgumentQualitySentence(
-                sentence,
-                scorer.score(query.title, sentence)
-            )
-            for sentence in sentences
+            ArgumentQualitySentence(sentence, scores[sentence])
+            for sentence in document.sentences
         ]
         return ArgumentQualityRankedDocument(
             id=document.id,
@@ -67,6 +61,7 @@ class DebaterArgumentQualityTagger(ArgumentQualityTagger):
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=qualities
         )
@@ -76,9 +71,52 @@ class DebaterArgumentQualityTagger(ArgumentQualityTagger):
             query: Query,
             document: ArgumentRankedDocument
     ) -> ArgumentQualityRankedDocument:
-        download_nltk_dependencies("punkt")
         with self._scorer() as scorer:
-            return self._tag_document(scorer, query, document)
+            scores = scorer.scores(query.title, document.sentences)
+        return self._tag_document(scores, document)
+
+
+@dataclass
+class DebaterArgumentQualityTagger(ScoredArgumentQualityTagger):
+    debater_api_token: str
+    cache_path: Optional[Path] = None
+    chunk_size: int = 500
+    max_workers: int = 4
+    rate_limiter: Optional[RateLimiter] = None
+    # Quality of sentences that are not cached in cache-only mode.
+    fallback_quality: float = 0.5
+
+    @contextmanager
+    def _scorer(self) -> CachedDebaterArgumentQualityScorer:
+        with CachedDebaterArgumentQualityScorer(
+                self.debater_api_token,
+                self.cache_path,
+                self.chunk_size,
+                self.max_workers,
+                self.rate_limiter,
+                self.fallback_quality,
+        ) as scorer:
+            yield scorer
+
+
+@dataclass
+class TransformersArgumentQualityTagger(ScoredArgumentQualityTagger):
+    model: str
+    label: str
+    cache_path: Optional[Path] = None
+    batch_size: int = 64
+    quantize: bool = True
+
+    @contextmanager
+    def _scorer(self) -> CachedTransformersArgumentQualityScorer:
+        with CachedTransformersArgumentQualityScorer(
+                self.model,
+                self.cache_path,
+                self.batch_size,
+                self.quantize,
+                label=self.label,
+        ) as scorer:
+            yield scorer
 
 
 @dataclass
@@ -86,13 +124,22 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
     model: str
     api_key: str
     cache_path: Optional[Path] = None
+    transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST
+    max_in_flight: int = 8
+    rate_limiter: Optional[RateLimiter] = None
+    # Number of texts to generate at once with the local transport.
+    batch_size: int = 16
 
     @contextmanager
-    def _generator(self) -> CachedHuggingfaceTextGenerator:
-        with CachedHuggingfaceTextGenerator(
-                model=self.model,
-                api_key=self.api_key,
-                cache_dir=self.cache_path,
+    def _generator(self) -> TextGenerator:
+        with text_generator(
+                self.model,
+                self.api_key,
+                self.cache_path,
+                self.transport,
+                self.max_in_flight,
+                self.rate_limiter,
+                self.batch_size,
         ) as generator:
             yield generator
 
@@ -105,13 +152,9 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
             f"very good, good, bad, very bad"
         )
 
-    def _quality(
-            self,
-            generator: CachedHuggingfaceTextGenerator,
-            sentence: str
-    ) -> float:
+    def _quality(self, answers: Dict[str, str], sentence: str) -> float:
         task = self._task(sentence)
-        answer = generator.generate(task).strip().lower()
+        answer = answers[task].strip().lower()
         if "very good" in answer:
             return 1
         elif "very bad" in answer:
@@ -125,7 +168,7 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
 
     def _tag_document(
             self,
-            generator: CachedHuggingfaceTextGenerator,
+            answers: Dict[str, str],
             query: Query,
             document: ArgumentRankedDocument
     ) -> ArgumentQualityRankedDocument:
@@ -136,7 +179,7 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
             qualities = [ArgumentQualitySentence(
                 document.content,
                 self._quality(
-                    generator,
+                    answers,
                     document.content
                 )
             )]
@@ -147,6 +190,7 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=qualities,
         )
@@ -156,21 +200,27 @@ class HuggingfaceArgumentQualityTagger(ArgumentQualityTagger):
             query: Query,
             ranking: List[ArgumentRankedDocument]
     ) -> List[ArgumentQualityRankedDocument]:
-        tasks = [
-            self._task(document.content)
-            for document in ranking
-        ]
-        with self._generator() as generator:
-            generator.preload(tasks)
-            return [
-                self._tag_document(generator, query, document)
+        tasks = []
+        if query.comparative_objects is not None:
+            tasks = [
+                self._task(document.content)
                 for document in ranking
             ]
+        with self._generator() as generator:
+            answers = generator.generate_many(tasks)
+        return [
+            self._tag_document(answers, query, document)
+            for document in ranking
+        ]
 
     def tag_document(
             self,
             query: Query,
             document: ArgumentRankedDocument
     ) -> ArgumentQualityRankedDocument:
+        tasks = []
+        if query.comparative_objects is not None:
+            tasks = [self._task(document.content)]
         with self._generator() as generator:
-            return self._tag_document(generator, query, document)
+            answers = generator.generate_many(tasks)
+        return self._tag_document(answers, query, document)
@@ -1,13 +1,24 @@
+from concurrent.futures import (
+    ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+)
+from contextlib import contextmanager
 from dataclasses import dataclass
-from functools import cached_property
+from itertools import islice
 from pathlib import Path
-from typing import Optional, Set
+from typing import Optional, Set, List, Iterable, Dict
 
-from targer_api import analyze_text
+from tqdm import tqdm
 
 from grimjack import logger
-from grimjack.model import RankedDocument
-from grimjack.model.arguments import ArgumentRankedDocument
+from grimjack.api.cache import is_cache_only
+from grimjack.api.rate_limit import RateLimiter
+from grimjack.api.targer import (
+    CachedTargerArgumentAnalyzer, TargerArgumentStore
+)
+from grimjack.model import RankedDocument, Document
+from grimjack.model.arguments import (
+    ArgumentRankedDocument, PackedArgumentModelSentences, pack_arguments
+)
 from grimjack.modules import ArgumentTagger
 
 
@@ -16,34 +27,193 @@ class TargerArgumentTagger(ArgumentTagger):
     targer_api_url: str
     models: Set[str]
     cache_path: Optional[Path] = None
+    max_batch_length: Optional[int] = None
+    # Store of arguments tagged offline, looked up before the API.
+    pretagged_path: Optional[Path] = None
+    rate_limiter: Optional[RateLimiter] = None
 
-    @cached_property
-    def _targer_cache_path(self) -> Optional[Path]:
-        if self.cache_path is None:
-            return None
+    @contextmanager
+    def _analyzer(
+            self,
+            pool_size: int = 10
+    ) -> CachedTargerArgumentAnalyzer:
+        with CachedTargerArgumentAnalyzer(
+                self.targer_api_url,
+                self.models,
+                self.cache_path,
+                self.max_batch_length,
+                pool_size,
+                self.rate_limiter,
+        ) as analyzer:
+            yield analyzer
 
-        path = self.cache_path / "targer"
-        path.mkdir(exist_ok=True)
-        return path
+    @contextmanager
+    def _store(self) -> Optional[TargerArgumentStore]:
+        if self.pretagged_path is None:
+            yield None
+            return
+        with TargerArgumentStore(self.pretagged_path, self.models) as store:
+            yield store
 
-    def tag_document(
+    def tag_ranking(
             self,
-            document: RankedDocument
+            ranking: List[RankedDocument]
+    ) -> List[ArgumentRankedDocument]:
+        with self._analyzer() as analyzer, self._store() as store:
+            pretagged = {}
+            if store is not None:
+                for document in ranking:
+                    arguments = store.get(document.id)
+                    if arguments is not None:
+                        pretagged[document.id] = arguments
+                logger.debug(
+                    f"Found {len(pretagged)} of {len(ranking)} documents "
+                    f"in the pre-tagged argument store."
+                )
+            analyzer.preload([
+                document.content
+                for document in ranking
+                if document.id not in pretagged
+            ])
+            return [
+                self._tag_document(analyzer, store, document)
+                if document.id not in pretagged
+                else self._document(document, pretagged[document.id])
+                for document in ranking
+            ]
+
+    @staticmethod
+    def _document(
+            document: RankedDocument,
+            arguments: PackedArgumentModelSentences
     ) -> ArgumentRankedDocument:
-        logger.debug(
-            f"Fetching arguments for document {document.id} from TARGER API."
-        )
-        arguments = analyze_text(
-            document.content,
-            self.models,
-            self.targer_api_url,
-            self._targer_cache_path,
-        )
         return ArgumentRankedDocument(
             id=document.id,
             content=document.content,
             fields=document.fields,
             score=document.score,
             rank=document.rank,
+            sentences=document.sentences,
             arguments=arguments,
         )
+
+    def _tag_document(
+            self,
+            analyzer: CachedTargerArgumentAnalyzer,
+            store: Optional[TargerArgumentStore],
+            document: RankedDocument
+    ) -> ArgumentRankedDocument:
+        logger.debug(
+            f"Fetching arguments for document {document.id} from TARGER API."
+        )
+        arguments = pack_arguments(analyzer.analyze(document.content))
+        # Don't store fallback arguments from cache-only mode.
+        if store is not None and not is_cache_only():
+            for model, sentences in arguments.items():
+                store.put(document.id, model, sentences)
+        return self._document(document, arguments)
+
+    def tag_document(
+            self,
+            document: RankedDocument
+    ) -> ArgumentRankedDocument:
+        with self._analyzer() as analyzer, self._store() as store:
+            if store is not None:
+                arguments = store.get(document.id)
+                if arguments is not None:
+                    return self._document(document, arguments)
+            return self._tag_document(analyzer, store, document)
+
+    def pretag(
+            self,
+            documents: Iterable[Document],
+            workers: int = 16,
+            chunk_size: int = 1000,
+    ) -> None:
+        """
+        Tag arguments of all documents and write them to the pre-tagged
+        argument store. Every finished batch is written immediately,
+        so that an interrupted run resumes with the missing documents.
+        """
+        if self.pretagged_path is None:
+            raise ValueError("No pre-tagged argument store configured.")
+
+        documents = iter(documents)
+        progress = tqdm(desc="Pre-tagging arguments", unit="passages")
+        with self._analyzer(workers) as analyzer, \
+                self._store() as store, \
+                ThreadPoolExecutor(workers) as executor:
+
+            def tag_batch(
+                    model: str,
+                    batch: List[str],
+                    documents_by_content: Dict[str, List[Document]]
+            ) -> List[Document]:
+                sentences = analyzer.fetch_batch(model, batch)
+                tagged: List[Document] = []
+                for text, text_sentences in zip(batch, sentences):
+                    for document in documents_by_content[text]:
+                        store.put(document.id, model, text_sentences)
+                        tagged.append(document)
+                return tagged
+
+            # Number of models each document still needs to be tagged with.
+            remaining: Dict[str, int] = {}
+
+            def complete(done: Iterable[Future]) -> None:
+                # Documents count as tagged once all their models are done.
+                for future in done:
+                    for document in future.result():
+                        remaining[document.id] -= 1
+                        if remaining[document.id] == 0:
+                            del remaining[document.id]
+                            progress.update()
+
+            pending: Set[Future] = set()
+            while True:
+                chunk = list(islice(documents, chunk_size))
+                if len(chunk) == 0:
+                    break
+
+                missing: Dict[str, List[Document]] = {
+                    model: [] for model in self.models
+                }
+                tagged = 0
+                for document in chunk:
+                    missing_models = store.missing_models(document.id)
+                    if len(missing_models) == 0:
+                        # Tagged before, e.g., in an interrupted run.
+                        tagged += 1
+                        continue
+                    remaining[document.id] = (
+                        remaining.get(document.id, 0) + len(missing_models)
+                    )
+                    for model in missing_models:
+                        missing[model].append(document)
+                progress.update(tagged)
+
+                for model, model_documents in missing.items():
+                    # Tag duplicate passages only once.
+                    documents_by_content: Dict[str, List[Document]] = {}
+                    for document in model_documents:
+                        documents_by_content.setdefault(
+                            document.content, []
+                        ).append(document)
+                    contents = list(documents_by_content.keys())
+                    for batch in analyzer.batches(contents):
+                        # Limit the number of queued batches.
+                        while len(pending) >= 2 * workers:
+                            done, pending = wait(
+                                pending,
+                                return_when=FIRST_COMPLETED
+                            )
+                            complete(done)
+                        pending.add(executor.submit(
+                            tag_batch,
+                            model,
+                            batch,
+                            documents_by_content,
+                        ))
+
+            complete(wait(pending).done)
+        progress.close()
@@ -39,9 +39,11 @@ class Metric(Enum):
 class QualityTaggerType(Enum):
     DEBATER = 1
     HUGGINGFACE_T0PP = 2
+    ROBERTA_ARGUMENT = 3
 
 
 class StanceTaggerType(Enum):
     DEBATER_OBJECT = 1
     DEBATER_SENTIMENT = 2
     T0PP = 3
+    DISTILROBERTA_NLI = 4
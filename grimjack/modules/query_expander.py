@@ -9,7 +9,9 @@ from typing import List, Collection, Set, Tuple, Optional
 from nltk import word_tokenize, pos_tag
 
 from grimjack import logger
-from grimjack.api.huggingface import CachedHuggingfaceTextGenerator
+from grimjack.api.huggingface import HuggingfaceTransport
+from grimjack.api.rate_limit import RateLimiter
+from grimjack.api.transformers import TextGenerator, text_generator
 from grimjack.model import Query
 from grimjack.modules import QueryExpander, QueryTitleExpander
 from grimjack.utils.nltk import download_nltk_dependencies
@@ -149,13 +151,22 @@ class HuggingfaceComparativeSynonymsQueryExpander(
     api_key: str
     num_synonyms: int = 1
     cache_dir: Optional[Path] = None
+    transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST
+    max_in_flight: int = 8
+    rate_limiter: Optional[RateLimiter] = None
+    # Number of texts to generate at once with the local transport.
+    batch_size: int = 16
 
     @contextmanager
-    def _generator(self) -> CachedHuggingfaceTextGenerator:
-        with CachedHuggingfaceTextGenerator(
-                model=self.model,
-                api_key=self.api_key,
-                cache_dir=self.cache_dir,
+    def _generator(self) -> TextGenerator:
+        with text_generator(
+                self.model,
+                self.api_key,
+                self.cache_dir,
+                self.transport,
+                self.max_in_flight,
+                self.rate_limiter,
+                self.batch_size,
         ) as generator:
             yield generator
 
@@ -175,7 +186,7 @@ class HuggingfaceComparativeSynonymsQueryExpander(
         input_text = self._input(token)
         with self._generator() as generator:
             output_text: str = generator.generate(input_text)
-        if input_text == output_text:
+        if input_text == output_text or len(output_text) == 0:
             return set()
         synonyms = output_text.split(",")
         synonyms = [synonym for synonym in synonyms if synonym != token]
@@ -187,13 +198,22 @@ class HuggingfaceDescriptionNarrativeQueryExpander(QueryTitleExpander):
     model: str
     api_key: str
     cache_dir: Optional[Path] = None
+    transport: HuggingfaceTransport = HuggingfaceTransport.REQUEST
+    max_in_flight: int = 8
+    rate_limiter: Optional[RateLimiter] = None
+    # Number of texts to generate at once with the local transport.
+    batch_size: int = 16
 
     @contextmanager
-    def _generator(self) -> CachedHuggingfaceTextGenerator:
-        with CachedHuggingfaceTextGenerator(
-                model=self.model,
-                api_key=self.api_key,
-                cache_dir=self.cache_dir,
+    def _generator(self) -> TextGenerator:
+        with text_generator(
+                self.model,
+                self.api_key,
+                self.cache_dir,
+                self.transport,
+                self.max_in_flight,
+                self.rate_limiter,
+                self.batch_size,
         ) as generator:
             yield generator
 
@@ -214,7 +234,11 @@ class HuggingfaceDescriptionNarrativeQueryExpander(QueryTitleExpander):
                 generator.generate(text)
                 for text in inputs
             }
-        return list(outputs - inputs)
+        return [
+            output
+            for output in outputs - inputs
+            if len(output) > 0
+        ]
 
 
 @dataclass
@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from random import Random
 from typing import List
 
+from numpy import ndarray
+
 from grimjack import logger
 from grimjack.model import RankedDocument, Query
 from grimjack.model.axiom import Axiom
@@ -31,6 +33,7 @@ def _reset_score(
             fields=document.fields,
             score=length - i,
             rank=i + 1,
+            sentences=document.sentences,
             arguments=document.arguments,
             qualities=document.qualities,
             stances=document.stances,
@@ -47,10 +50,10 @@ class AxiomaticReranker(Reranker):
 
     def kwiksort(
             self,
-            context: RerankingContext,
-            query: Query,
-            vertices: List[ArgumentQualityStanceRankedDocument]
-    ) -> List[ArgumentQualityStanceRankedDocument]:
+            preferences: ndarray,
+            ranking: List[ArgumentQualityStanceRankedDocument],
+            vertices: List[int]
+    ) -> List[int]:
         if len(vertices) == 0:
             return []
 
@@ -65,32 +68,24 @@ class AxiomaticReranker(Reranker):
             if vertex == pivot:
                 continue
 
-            preference = self.axiom.preference(context, query, vertex, pivot)
+            preference = preferences[vertex, pivot]
             if preference > 0:
                 vertices_left.append(vertex)
             elif preference < 0:
                 vertices_right.append(vertex)
-            elif vertex.rank < pivot.rank:
+            elif ranking[vertex].rank < ranking[pivot].rank:
                 vertices_left.append(vertex)
-            elif vertex.rank > pivot.rank:
+            elif ranking[vertex].rank > ranking[pivot].rank:
                 vertices_right.append(vertex)
             else:
                 raise RuntimeError(
                     f"Tie during reranking. "
-                    f"Document {vertex} has same preference "
-                    f"and rank as pivot document {pivot}."
+                    f"Document {ranking[vertex]} has same preference "
+                    f"and rank as pivot document {ranking[pivot]}."
                 )
 
-        vertices_left = self.kwiksort(
-            context,
-            query,
-            vertices_left
-        )
-        vertices_right = self.kwiksort(
-            context,
-            query,
-            vertices_right
-        )
+        vertices_left = self.kwiksort(preferences, ranking, vertices_left)
+        vertices_right = self.kwiksort(preferences, ranking, vertices_right)
 
         return [*vertices_left, pivot, *vertices_right]
 
@@ -99,10 +94,14 @@ class AxiomaticReranker(Reranker):
             query: Query,
             ranking: List[ArgumentQualityStanceRankedDocument]
     ) -> List[ArgumentQualityStanceRankedDocument]:
-        ranking = ranking.copy()
-        ranking = self.kwiksort(self.context, query, ranking)
-        ranking = _reset_score(ranking)
-        return ranking
+        # Compute all pairwise preferences at once.
+        preferences = self.axiom.preference_matrix(
+            self.context,
+            query,
+            ranking
+        )
+        order = self.kwiksort(preferences, ranking, list(range(len(ranking))))
+        return _reset_score([ranking[index] for index in order])
 
 
 @dataclass
@@ -131,6 +130,7 @@ class TopReranker(Reranker):
                 # stay above non-reranked documents.
                 score=document.score + max_score,
                 rank=document.rank,
+                sentences=document.sentences,
                 arguments=document.arguments,
                 qualities=document.qualities,
                 stances=document.stances,
@@ -1,7 +1,9 @@
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from functools import cached_property, cache
 from math import log
-from typing import List, Set
+from threading import Lock
+from typing import List, Set, Dict, Sequence
 
 from pyserini.index import IndexReader
 
@@ -13,10 +15,22 @@ from grimjack.utils.jvm import (
 )
 
 
+# Number of documents' term positions to keep per reranking context.
+_MAX_TERM_POSITIONS = 10_000
+
+
 @dataclass(unsafe_hash=True)
 class IndexRerankingContext(RerankingContext):
     index: Index
 
+    # Term positions by document ID, least recently used first.
+    _term_positions: "OrderedDict[str, Dict[str, List[int]]]" = field(
+        init=False, repr=False, compare=False, default_factory=OrderedDict
+    )
+    _term_positions_lock: Lock = field(
+        init=False, repr=False, compare=False, default_factory=Lock
+    )
+
     @cached_property
     def _index_reader(self) -> IndexReader:
         return IndexReader(str(self.index.index_dir.absolute()))
@@ -48,6 +62,58 @@ class IndexRerankingContext(RerankingContext):
         term_count = sum(1 for other in terms if other == term)
         return term_count / len(terms)
 
+    def _document_term_positions(
+            self,
+            document_ids: Sequence[str]
+    ) -> Dict[str, Dict[str, List[int]]]:
+        # Term vectors are read once per document for all queries.
+        positions: Dict[str, Dict[str, List[int]]] = {}
+        with self._term_positions_lock:
+            for document_id in document_ids:
+                document_positions = self._term_positions.get(document_id)
+                if document_positions is not None:
+                    self._term_positions.move_to_end(document_id)
+                    positions[document_id] = document_positions
+        fetched: Dict[str, Dict[str, List[int]]] = {}
+        for document_id in document_ids:
+            if document_id in positions:
+                continue
+            document_positions = self._index_reader.get_term_positions(
+                document_id
+            )
+            fetched[document_id] = (
+                document_positions if document_positions is not None else {}
+            )
+        with self._term_positions_lock:
+            self._term_positions.update(fetched)
+            while len(self._term_positions) > _MAX_TERM_POSITIONS:
+                self._term_positions.popitem(last=False)
+        positions.update(fetched)
+        return positions
+
+    def query_term_positions(
+            self,
+            query: Query,
+            documents: Sequence[Document]
+    ) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Positions of the query terms from the index, without analyzing
+        the documents' contents again. Positions count removed stopwords.
+        """
+        query_terms = self.term_set(query.title)
+        positions = self._document_term_positions(list(dict.fromkeys(
+            document.id
+            for document in documents
+        )))
+        return {
+            document.id: {
+                term: sorted(term_positions)
+                for term, term_positions in positions[document.id].items()
+                if term in query_terms
+            }
+            for document in documents
+        }
+
     @staticmethod
     @cache
     def _tf_idf_similarity() -> JSimilarity:
@@ -9,14 +9,18 @@ from pyserini.search.querybuilder import (
 )
 
 from grimjack.model import RankedDocument, Query
-from grimjack.modules import Searcher, Index
+from grimjack.modules import Searcher, Index, SentenceSegmenter
 from grimjack.modules.options import RetrievalModel
 from grimjack.utils.jvm import (
     JBagOfWordsQueryGenerator, JIndexArgs, JIndexCollection, JResult
 )
 
 
-def _parse_document(hit: JResult, rank: int) -> RankedDocument:
+def _parse_document(
+        hit: JResult,
+        rank: int,
+        sentence_segmenter: SentenceSegmenter
+) -> RankedDocument:
     # Load JSON from Anserini.
     json_document = loads(hit.raw)
     # Check if document ID matches.
@@ -33,7 +37,8 @@ def _parse_document(hit: JResult, rank: int) -> RankedDocument:
         content=content,
         fields=json_document,
         score=hit.score,
-        rank=rank
+        rank=rank,
+        sentences=sentence_segmenter.segment(content),
     )
 
 
@@ -42,6 +47,7 @@ class AnseriniSearcher(Searcher):
     index: Index
     retrieval_model: Optional[RetrievalModel]
     num_hits: int
+    sentence_segmenter: SentenceSegmenter
 
     _bow_query_generator = JBagOfWordsQueryGenerator()
 
@@ -84,7 +90,7 @@ class AnseriniSearcher(Searcher):
     ) -> List[RankedDocument]:
         hits = self._searcher.search(anserini_query, self.num_hits)
         return [
-            _parse_document(hit, i + 1)
+            _parse_document(hit, i + 1, self.sentence_segmenter)
             for i, hit in enumerate(hits)
         ]
 
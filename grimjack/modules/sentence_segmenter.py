@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Optional, List, Dict
+
+from diskcache import Cache
+from nltk import sent_tokenize
+
+from grimjack.api.cache import open_cache, md5_hash
+from grimjack.modules import SentenceSegmenter
+from grimjack.utils.nltk import download_nltk_dependencies
+
+
+@dataclass
+class NltkSentenceSegmenter(SentenceSegmenter):
+    """
+    Segment sentences with NLTK's Punkt tokenizer at most once per text
+    and pipeline run, or once per corpus if a cache path is given.
+    """
+    cache_path: Optional[Path] = None
+
+    _sentences: Dict[str, List[str]] = field(
+        default_factory=lambda: {},
+        init=False,
+        repr=False
+    )
+
+    @cached_property
+    def _cache(self) -> Optional[Cache]:
+        if self.cache_path is None:
+            return None
+        return open_cache(self.cache_path / "sentences")
+
+    def segment(self, text: str) -> List[str]:
+        key = md5_hash(text)
+        if key in self._sentences:
+            return self._sentences[key]
+
+        sentences: Optional[List[str]] = None
+        if self._cache is not None:
+            sentences = self._cache.get(key)
+        if sentences is None:
+            download_nltk_dependencies("punkt")
+            sentences = sent_tokenize(text)
+            if self._cache is not None:
+                self._cache[key] = sentences
+        self._sentences[key] = sentences
+        return sentences
@@ -1,9 +1,10 @@
 from dataclasses import dataclass
 from gzip import GzipFile
 from hashlib import md5
+from json import loads
 from os.path import basename
 from pathlib import Path
-from typing import List, Union, Tuple, Optional
+from typing import List, Union, Tuple, Optional, Iterator
 from urllib.request import urlopen
 from xml.etree.ElementTree import parse, ElementTree, Element
 
@@ -12,7 +13,7 @@ from trectools import TrecQrel
 
 from grimjack import logger
 from grimjack.constants import DOCUMENTS_DIR, TOPICS_DIR, QRELS_DIR
-from grimjack.model import Query
+from grimjack.model import Query, Document
 from grimjack.modules import DocumentsStore, TopicsStore, QrelsStore
 
 
@@ -97,6 +98,23 @@ class SimpleDocumentsStore(DocumentsStore):
         )
         return download_dir
 
+    @property
+    def documents(self) -> Iterator[Document]:
+        """
+        Stream all documents from the downloaded JSONL files.
+        """
+        for path in sorted(self.documents_dir.iterdir()):
+            with path.open("r") as file:
+                for line in file:
+                    json_document = loads(line)
+                    document_id = json_document.pop("id")
+                    content = json_document.pop("contents")
+                    yield Document(
+                        id=document_id,
+                        content=content,
+                        fields=json_document,
+                    )
+
 
 def _parse_objects(xml: Element) -> Tuple[str, str]:
     objects = xml.text.split(",")
@@ -0,0 +1,85 @@
+from pathlib import Path
+from typing import List
+
+from pytest import MonkeyPatch
+
+from grimjack.api.cache import close_caches
+from grimjack.api.targer import TargerArgumentStore
+from grimjack.api.test_targer import (  # noqa: F401
+    targer_api_url, _StandInTargerHandler, _PASSAGES
+)
+from grimjack.model import Document
+from grimjack.modules import argument_tagger
+from grimjack.modules.argument_tagger import TargerArgumentTagger
+
+_MODELS = {"tag-ibm-fasttext", "tag-combined-fasttext"}
+_DOCUMENTS = [
+    Document(f"doc-{index}", passage, {})
+    for index, passage in enumerate(_PASSAGES + _PASSAGES[:2])
+]
+
+
+class _StandInProgress:
+    """
+    Check that documents are counted only once they are stored.
+    """
+
+    def __init__(self, store: TargerArgumentStore):
+        self.store = store
+        self.n = 0
+
+    def update(self, n: int = 1) -> None:
+        self.n += n
+        stored = sum(
+            1
+            for document in _DOCUMENTS
+            if len(self.store.missing_models(document.id)) == 0
+        )
+        assert self.n <= stored
+
+    def close(self) -> None:
+        pass
+
+
+def test_pretag_resume(
+        targer_api_url: str,  # noqa: F811
+        tmp_path: Path,
+        monkeypatch: MonkeyPatch
+) -> None:
+    tagger = TargerArgumentTagger(
+        targer_api_url,
+        _MODELS,
+        tmp_path / "cache",
+        pretagged_path=tmp_path / "store",
+    )
+    store = TargerArgumentStore(tmp_path / "store", _MODELS)
+    progresses: List[_StandInProgress] = []
+
+    def progress(*_, **__) -> _StandInProgress:
+        progresses.append(_StandInProgress(store))
+        return progresses[-1]
+
+    monkeypatch.setattr(argument_tagger, "tqdm", progress)
+
+    # An interrupted run tagged only some documents.
+    tagger.pretag(_DOCUMENTS[:2], workers=2, chunk_size=2)
+    assert len(_StandInTargerHandler.requests) == 2 * len(_MODELS)
+
+    _StandInTargerHandler.requests = []
+    tagger.pretag(_DOCUMENTS, workers=2, chunk_size=3)
+    # Only the missing documents are tagged.
+    assert sorted(_StandInTargerHandler.requests) == sorted(
+        document.content
+        for document in _DOCUMENTS[2:]
+        for _ in _MODELS
+    )
+    assert [progress.n for progress in progresses] == [2, len(_DOCUMENTS)]
+    with tagger._analyzer() as analyzer:
+        for document in _DOCUMENTS:
+            assert store.get(document.id) == {
+                model: sentences
+                for model, sentences in analyzer.analyze(
+                    document.content
+                ).items()
+            }
+    close_caches()
@@ -0,0 +1,74 @@
+from re import findall
+from typing import Dict, List, Optional
+
+from pytest import importorskip
+
+from grimjack.model import Query, Document
+from grimjack.modules import RerankingContext
+
+# The index is read with Pyserini.
+importorskip("pyserini")
+from grimjack.modules.reranking_context import (  # noqa: E402
+    IndexRerankingContext
+)
+
+
+class _StandInIndexReader:
+    """
+    Index reader with lower-cased word terms and unsorted term positions.
+    """
+
+    def __init__(self, documents: Dict[str, str]):
+        self.documents = documents
+        self.fetched: List[str] = []
+
+    def analyze(self, text: str) -> List[str]:
+        return findall(r"\w+", text.lower())
+
+    def get_term_positions(
+            self,
+            document_id: str
+    ) -> Optional[Dict[str, List[int]]]:
+        self.fetched.append(document_id)
+        if document_id not in self.documents:
+            return None
+        positions: Dict[str, List[int]] = {}
+        terms = self.analyze(self.documents[document_id])
+        for index, term in reversed(list(enumerate(terms))):
+            positions.setdefault(term, []).append(index)
+        return positions
+
+
+def test_query_term_positions() -> None:
+    contents = {
+        "a": "laptop desktop laptop",
+        "b": "tablet",
+        "c": "A desktop is better than a laptop.",
+    }
+    reader = _StandInIndexReader(contents)
+    context = IndexRerankingContext(None)
+    context.__dict__["_index_reader"] = reader
+    documents = [
+        Document(document_id, content, {})
+        for document_id, content in contents.items()
+    ]
+    query = Query(1, "laptop or desktop", ("laptop", "desktop"), "", "")
+    positions = context.query_term_positions(query, documents + documents)
+    assert positions == {
+        "a": {"laptop": [0, 2], "desktop": [1]},
+        "b": {},
+        "c": {"desktop": [1], "laptop": [6]},
+    }
+    # Same positions as from analyzing the documents' contents.
+    assert positions == RerankingContext.query_term_positions(
+        context, query, documents
+    )
+    assert reader.fetched == ["a", "b", "c"]
+
+    # Term positions are read once per document for all queries.
+    other_query = Query(2, "tablet", None, "", "")
+    missing = Document("d", "tablet", {})
+    assert context.query_term_positions(
+        other_query, [documents[1], missing]
+    ) == {"b": {"tablet": [0]}, "d": {}}
+    assert reader.fetched == ["a", "b", "c", "d"]
@@ -0,0 +1,37 @@
+from typing import List
+
+from pytest import MonkeyPatch
+
+from grimjack.modules import sentence_segmenter
+from grimjack.modules.sentence_segmenter import NltkSentenceSegmenter
+from grimjack.utils import nltk
+
+
+class _StandInDownloader:
+    DEFAULT_URL = "https://nltk.test"
+
+    def is_installed(self, dependency: str) -> bool:
+        return True
+
+
+def test_dependencies_checked_once(monkeypatch: MonkeyPatch) -> None:
+    requests: List[str] = []
+    monkeypatch.setattr(nltk, "head", lambda url, **_: requests.append(url))
+    monkeypatch.setattr(nltk, "Downloader", _StandInDownloader)
+    monkeypatch.setattr(
+        sentence_segmenter, "sent_tokenize", lambda text: text.split(". ")
+    )
+    nltk._can_connect.cache_clear()
+    nltk.download_nltk_dependencies.cache_clear()
+
+    segmenter = NltkSentenceSegmenter()
+    for index in range(10):
+        assert segmenter.segment(f"Sentence {index}. Another one") == [
+            f"Sentence {index}", "Another one"
+        ]
+    other_segmenter = NltkSentenceSegmenter()
+    other_segmenter.segment("More text")
+    assert len(requests) == 1
+
+    nltk._can_connect.cache_clear()
+    nltk.download_nltk_dependencies.cache_clear()
@@ -1,27 +1,44 @@
+from datetime import timedelta
+from json import dump
 from pathlib import Path
 from random import Random
+from statistics import mean
 from tempfile import TemporaryDirectory
-from typing import Optional, List, Set, Union
+from typing import Optional, List, Set, Union, ContextManager
 
+from torch import set_num_threads
 from tqdm import tqdm
 
 from grimjack import logger
+from grimjack.api.cache import (
+    close_caches, open_result_cache, cache_statistics, set_cache_only,
+    cache_misses, planning
+)
+from grimjack.api.huggingface import HuggingfaceTransport
+from grimjack.api.plan import estimate_requests, RequestEstimate
+from grimjack.api.rate_limit import (
+    RateLimiter, FileRateLimiter, ThreadRateLimiter
+)
 from grimjack.model import Query
-from grimjack.model.axiom import OriginalAxiom, AggregatedAxiom, Axiom
+from grimjack.model.axiom import (
+    OriginalAxiom, AggregatedAxiom, Axiom, evaluation_statistics
+)
 from grimjack.model.stance import ArgumentQualityStanceRankedDocument
 from grimjack.modules import (
     ArgumentQualityStanceTagger, DocumentsStore, TopicsStore,
     Index, QueryExpander, Searcher, Reranker,
-    ArgumentTagger, ArgumentQualityTagger,
+    ArgumentQualityTagger,
 )
 from grimjack.modules.argument_quality_stance_tagger import (
     ThresholdArgumentQualityStanceTagger,
     DebaterArgumentQualityObjectStanceTagger,
     DebaterArgumentQualitySentimentStanceTagger,
     HuggingfaceArgumentQualityStanceTagger,
+    TransformersArgumentQualityStanceTagger,
 )
 from grimjack.modules.argument_quality_tagger import (
-    DebaterArgumentQualityTagger, HuggingfaceArgumentQualityTagger
+    DebaterArgumentQualityTagger, HuggingfaceArgumentQualityTagger,
+    TransformersArgumentQualityTagger
 )
 from grimjack.modules.argument_tagger import TargerArgumentTagger
 from grimjack.modules.evaluation import TrecEvaluation
@@ -44,14 +61,36 @@ from grimjack.modules.reranker import (
 )
 from grimjack.modules.reranking_context import IndexRerankingContext
 from grimjack.modules.searcher import AnseriniSearcher
+from grimjack.modules.sentence_segmenter import NltkSentenceSegmenter
 from grimjack.modules.store import (
     SimpleDocumentsStore, TrecTopicsStore, TrecQrelsStore
 )
 
 
+def _rate_limiter(
+        service: str,
+        requests_per_second: Optional[float],
+        cache_path: Optional[Path],
+) -> Optional[RateLimiter]:
+    if requests_per_second is None:
+        return None
+    if cache_path is None:
+        return ThreadRateLimiter(requests_per_second)
+    # Share the rate limit with other processes using the same cache.
+    return FileRateLimiter(
+        cache_path / "rate-limits",
+        service,
+        requests_per_second,
+    )
+
+
 def _query_expander(
         query_expander_types: Set[QueryExpanderType],
         huggingface_api_token: Optional[str],
+        huggingface_transport: HuggingfaceTransport,
+        huggingface_in_flight: int,
+        huggingface_rate_limiter: Optional[RateLimiter],
+        huggingface_batch_size: int,
         cache_path: Optional[Path],
 ) -> QueryExpander:
     query_expanders = [OriginalQueryExpander()]
@@ -80,6 +119,10 @@ def _query_expander(
                     "bigscience/T0pp",
                     huggingface_api_token,
                     cache_dir=cache_path,
+                    transport=huggingface_transport,
+                    max_in_flight=huggingface_in_flight,
+                    rate_limiter=huggingface_rate_limiter,
+                    batch_size=huggingface_batch_size,
                 )
             )
         elif (
@@ -91,6 +134,10 @@ def _query_expander(
                     "bigscience/T0pp",
                     huggingface_api_token,
                     cache_dir=cache_path,
+                    transport=huggingface_transport,
+                    max_in_flight=huggingface_in_flight,
+                    rate_limiter=huggingface_rate_limiter,
+                    batch_size=huggingface_batch_size,
                 )
             )
         elif query_expander == QueryExpanderType.COMPARATIVE_QUESTIONS:
@@ -107,6 +154,7 @@ def _reranker(
         rerank_hits: int,
         index: Index,
         axioms: List[Axiom],
+        cache_path: Optional[Path],
         random: Random = Random(),
 ) -> Reranker:
     reranking_context = IndexRerankingContext(index)
@@ -119,7 +167,7 @@ def _reranker(
                     AggregatedAxiom([
                         OriginalAxiom() * len(axioms),
                         *axioms,
-                    ]).normalized().cached(),
+                    ]).normalized().cached(cache_path),
                     random,
                 )
             )
@@ -142,19 +190,41 @@ def _reranker(
 def _quality_tagger(
         quality_tagger: QualityTaggerType,
         huggingface_api_token: Optional[str],
+        huggingface_transport: HuggingfaceTransport,
+        huggingface_in_flight: int,
+        huggingface_rate_limiter: Optional[RateLimiter],
+        huggingface_batch_size: int,
         debater_api_token: str,
+        debater_chunk_size: int,
+        debater_workers: int,
+        debater_rate_limiter: Optional[RateLimiter],
+        fallback_quality: float,
         cache_path: Optional[Path],
 ) -> ArgumentQualityTagger:
     if quality_tagger == QualityTaggerType.DEBATER:
         return DebaterArgumentQualityTagger(
             debater_api_token,
             cache_path,
+            debater_chunk_size,
+            debater_workers,
+            debater_rate_limiter,
+            fallback_quality,
         )
     elif quality_tagger == QualityTaggerType.HUGGINGFACE_T0PP:
         return HuggingfaceArgumentQualityTagger(
             "bigscience/T0pp",
             huggingface_api_token,
             cache_path,
+            huggingface_transport,
+            huggingface_in_flight,
+            huggingface_rate_limiter,
+            huggingface_batch_size,
+        )
+    elif quality_tagger == QualityTaggerType.ROBERTA_ARGUMENT:
+        return TransformersArgumentQualityTagger(
+            "chkla/roberta-argument",
+            "argument",
+            cache_path,
         )
     else:
         raise ValueError(f"Unknown quality tagger: {quality_tagger}")
@@ -164,7 +234,14 @@ def _stance_tagger(
         stance_tagger_type: StanceTaggerType,
         stance_threshold: Optional[float],
         huggingface_api_token: Optional[str],
+        huggingface_transport: HuggingfaceTransport,
+        huggingface_in_flight: int,
+        huggingface_rate_limiter: Optional[RateLimiter],
+        huggingface_batch_size: int,
         debater_api_token: str,
+        debater_chunk_size: int,
+        debater_workers: int,
+        debater_rate_limiter: Optional[RateLimiter],
         cache_path: Optional[Path],
 ) -> ArgumentQualityStanceTagger:
     stance_tagger: ArgumentQualityStanceTagger
@@ -172,17 +249,32 @@ def _stance_tagger(
         stance_tagger = DebaterArgumentQualityObjectStanceTagger(
             debater_api_token,
             cache_path,
+            debater_chunk_size,
+            debater_workers,
+            debater_rate_limiter,
         )
     elif stance_tagger_type == StanceTaggerType.DEBATER_SENTIMENT:
         stance_tagger = DebaterArgumentQualitySentimentStanceTagger(
             debater_api_token,
             cache_path,
+            debater_chunk_size,
+            debater_workers,
+            debater_rate_limiter,
         )
     elif stance_tagger_type == StanceTaggerType.T0PP:
         stance_tagger = HuggingfaceArgumentQualityStanceTagger(
             "bigscience/T0pp",
             huggingface_api_token,
             cache_path,
+            huggingface_transport,
+            huggingface_in_flight,
+            huggingface_rate_limiter,
+            huggingface_batch_size,
+        )
+    elif stance_tagger_type == StanceTaggerType.DISTILROBERTA_NLI:
+        stance_tagger = TransformersArgumentQualityStanceTagger(
+            "cross-encoder/nli-distilroberta-base",
+            cache_path,
         )
     else:
         raise ValueError(f"Unknown stance tagger: {stance_tagger_type}")
@@ -194,16 +286,23 @@ def _stance_tagger(
     return stance_tagger
 
 
-class Pipeline:
+class Pipeline(ContextManager):
     documents_store: DocumentsStore
     topics_store: TopicsStore
     index: Index
     query_expander: QueryExpander
     searcher: Searcher
     reranker: Reranker
-    argument_tagger: ArgumentTagger
+    argument_tagger: TargerArgumentTagger
     quality_tagger: ArgumentQualityTagger
     stance_tagger: ArgumentQualityStanceTagger
+    cache_path: Optional[Path]
+    targer_max_batch_length: Optional[int]
+    debater_chunk_size: int
+    debater_workers: int
+    debater_rate_limit: Optional[float]
+    targer_rate_limit: Optional[float]
+    huggingface_rate_limit: Optional[float]
 
     def __init__(
             self,
@@ -219,17 +318,52 @@ class Pipeline:
             axioms: List[Axiom],
             targer_api_url: str,
             targer_models: Set[str],
+            targer_max_batch_length: Optional[int],
+            targer_rate_limit: Optional[float],
             cache_path: Optional[Path],
+            cache_size_limit: Optional[int],
+            cache_only: bool,
+            fallback_quality: float,
             huggingface_api_token: Optional[str],
+            huggingface_transport: HuggingfaceTransport,
+            huggingface_in_flight: int,
+            huggingface_rate_limit: Optional[float],
+            huggingface_batch_size: int,
             debater_api_token: str,
+            debater_chunk_size: int,
+            debater_workers: int,
+            debater_rate_limit: Optional[float],
             quality_tagger: QualityTaggerType,
             stance_tagger: StanceTaggerType,
             stance_threshold: Optional[float],
             num_hits: int,
+            torch_threads: Optional[int] = None,
             random: Random = Random(),
     ):
         if cache_path is not None:
             cache_path.mkdir(exist_ok=True)
+        open_result_cache(cache_path, cache_size_limit)
+        set_cache_only(cache_only)
+        if torch_threads is not None:
+            set_num_threads(torch_threads)
+        self.cache_path = cache_path
+        self.targer_max_batch_length = targer_max_batch_length
+        self.debater_chunk_size = debater_chunk_size
+        self.debater_workers = debater_workers
+        self.debater_rate_limit = debater_rate_limit
+        self.targer_rate_limit = targer_rate_limit
+        self.huggingface_rate_limit = huggingface_rate_limit
+        self.huggingface_in_flight = huggingface_in_flight
+        # Share rate limits between all modules using the same service.
+        targer_rate_limiter = _rate_limiter(
+            "targer", targer_rate_limit, cache_path
+        )
+        huggingface_rate_limiter = _rate_limiter(
+            "huggingface", huggingface_rate_limit, cache_path
+        )
+        debater_rate_limiter = _rate_limiter(
+            "debater", debater_rate_limit, cache_path
+        )
 
         self.documents_store = SimpleDocumentsStore(documents_source)
         self.topics_store = TrecTopicsStore(topics_source)
@@ -242,32 +376,64 @@ class Pipeline:
         self.query_expander = _query_expander(
             query_expanders,
             huggingface_api_token,
+            huggingface_transport,
+            huggingface_in_flight,
+            huggingface_rate_limiter,
+            huggingface_batch_size,
             cache_path
         )
-        self.searcher = AnseriniSearcher(self.index, retrieval_model, num_hits)
+        self.searcher = AnseriniSearcher(
+            self.index,
+            retrieval_model,
+            num_hits,
+            NltkSentenceSegmenter(cache_path),
+        )
         self.reranker = _reranker(
             rerankers,
             rerank_hits,
             self.index,
             axioms,
+            cache_path,
             random,
                                   )
         self.argument_tagger = TargerArgumentTagger(
             targer_api_url,
             targer_models,
             cache_path,
+            targer_max_batch_length,
+            (
+                cache_path / "targer-pretagged"
+                if cache_path is not None
+                else None
+            ),
+            targer_rate_limiter,
         )
         self.quality_tagger = _quality_tagger(
             quality_tagger,
             huggingface_api_token,
+            huggingface_transport,
+            huggingface_in_flight,
+            huggingface_rate_limiter,
+            huggingface_batch_size,
             debater_api_token,
+            debater_chunk_size,
+            debater_workers,
+            debater_rate_limiter,
+            fallback_quality,
             cache_path
         )
         self.stance_tagger = _stance_tagger(
             stance_tagger,
             stance_threshold,
             huggingface_api_token,
+            huggingface_transport,
+            huggingface_in_flight,
+            huggingface_rate_limiter,
+            huggingface_batch_size,
             debater_api_token,
+            debater_chunk_size,
+            debater_workers,
+            debater_rate_limiter,
             cache_path
         )
 
@@ -322,6 +488,74 @@ class Pipeline:
                     for document in results
                 )
 
+    def pretag_all(self, workers: int):
+        self.argument_tagger.pretag(
+            self.documents_store.documents,
+            workers,
+        )
+
+    def plan_all(self):
+        # Enumerate requests without calling any external API.
+        with planning():
+            estimates = self._estimate_requests()
+        if len(estimates) == 0:
+            print("All results are cached.")
+        for estimate in estimates:
+            print(
+                f"{estimate.namespace}: "
+                f"{estimate.uncached} uncached, "
+                f"{estimate.requests} requests, "
+                f"~{timedelta(seconds=round(estimate.seconds))}"
+            )
+        total = sum(estimate.seconds for estimate in estimates)
+        print(f"Total: ~{timedelta(seconds=round(total))}")
+        if any(
+                estimate.namespace.startswith((
+                    "huggingface/", "transformers/"
+                ))
+                for estimate in estimates
+        ):
+            print(
+                "Queries with uncached expansions were searched "
+                "without them, so actual counts may be higher."
+            )
+
+    def _estimate_requests(self) -> List[RequestEstimate]:
+        passage_lengths: List[int] = []
+        topics = tqdm(
+            self.topics_store.topics,
+            desc="Planning",
+            unit="query",
+        )
+        for topic in topics:
+            queries = self.query_expander.expand_query(topic)
+            ranking = self.searcher.search_boolean(queries)
+            passage_lengths.extend(
+                len(document.content) for document in ranking
+            )
+            ranking = self.argument_tagger.tag_ranking(ranking)
+            ranking = self.quality_tagger.tag_ranking(topic, ranking)
+            self.stance_tagger.tag_ranking(topic, ranking)
+
+        targer_passages_per_request = 1
+        if self.targer_max_batch_length is not None and \
+                len(passage_lengths) > 0:
+            targer_passages_per_request = max(
+                1,
+                self.targer_max_batch_length //
+                max(1, round(mean(passage_lengths)))
+            )
+        return estimate_requests(
+            cache_misses(),
+            targer_passages_per_request,
+            self.debater_chunk_size,
+            self.debater_workers,
+            self.debater_rate_limit,
+            self.targer_rate_limit,
+            self.huggingface_rate_limit,
+            self.huggingface_in_flight,
+        )
+
     def evaluate_all(
             self,
             metric: Metric,
@@ -347,3 +581,46 @@ class Pipeline:
                     f"{metric.name}@{depth}: "
                     f"{evaluation.evaluate(run_file, depth)}"
                 )
+
+    def _report_cache_misses(self):
+        misses = cache_misses()
+        if len(misses) == 0:
+            return
+        for namespace, keys in misses.items():
+            logger.warning(
+                f"Missed {len(keys)} uncached results for {namespace} "
+                f"in cache-only mode."
+            )
+        if self.cache_path is not None:
+            path = self.cache_path / "cache-misses.json"
+            with path.open("w") as file:
+                dump(
+                    {
+                        namespace: sorted(keys)
+                        for namespace, keys in misses.items()
+                    },
+                    file,
+                    indent=2,
+                )
+            logger.warning(f"Missed cache keys were written to {path}.")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for namespace, statistics in cache_statistics().items():
+            logger.info(
+                f"Cache statistics for {namespace}: "
+                f"{statistics.hits} hits, {statistics.misses} misses, "
+                f"{statistics.bytes_read} bytes read, "
+                f"{statistics.bytes_written} bytes written, "
+                f"{statistics.coalesced} coalesced."
+            )
+        axiom_statistics = evaluation_statistics()
+        if axiom_statistics.evaluated > 0:
+            logger.info(
+                f"Axiom statistics: "
+                f"{axiom_statistics.evaluated} preferences evaluated, "
+                f"{axiom_statistics.skipped} skipped."
+            )
+        self._report_cache_misses()
+        # Close cache handles that were shared by all pipeline modules.
+        close_caches()
+        return None
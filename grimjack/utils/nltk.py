@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from nltk.downloader import Downloader
 from requests import head
 from requests.exceptions import ConnectionError
@@ -7,20 +9,27 @@ from grimjack import logger
 SKIPPED_NLTK_DOWNLOAD = False
 
 
-def download_nltk_dependencies(*dependencies: str):
+@lru_cache(maxsize=None)
+def _can_connect() -> bool:
     global SKIPPED_NLTK_DOWNLOAD
-    if SKIPPED_NLTK_DOWNLOAD:
-        return
-
     try:
         head(Downloader.DEFAULT_URL, timeout=1)
     except ConnectionError:
-        if not SKIPPED_NLTK_DOWNLOAD:
-            SKIPPED_NLTK_DOWNLOAD = True
-            logger.warning(
-                "Could not connect to NLTK servers. "
-                "Skipping NLTK download."
-            )
+        SKIPPED_NLTK_DOWNLOAD = True
+        logger.warning(
+            "Could not connect to NLTK servers. "
+            "Skipping NLTK download."
+        )
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def download_nltk_dependencies(*dependencies: str):
+    """
+    Download missing NLTK dependencies, checked only once per process.
+    """
+    if not _can_connect():
         return
 
     downloader = Downloader()